@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from hatchling.builders.hooks.plugin.interface import BuildHookInterface
+
+METADATA_PATH = "src/ai_cli/_metadata.py"
+
+
+class MetadataBuildHook(BuildHookInterface):
+    """Write the project name and version into the package, so the CLI never parses pyproject.toml."""
+
+    PLUGIN_NAME = "custom"
+
+    def initialize(self, version, build_data):
+        path = Path(self.root) / METADATA_PATH
+        path.write_text(f"NAME = {self.metadata.name!r}\nVERSION = {self.metadata.version!r}\n")
+        build_data["artifacts"].append(METADATA_PATH)
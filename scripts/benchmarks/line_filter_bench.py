@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import bz2
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import io
+import lzma
+import os
+from pathlib import Path
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import aiofiles
+
+from ai_cli.commands.log.compressed import filter_compressed
+from ai_cli.commands.log.engine import LineFilter, iter_blocks, read_blocks
+from ai_cli.commands.log.index import filter_indexed, index_path
+from ai_cli.commands.log.mapped import filter_mapped
+from ai_cli.commands.log.matcher import ALL, ANY
+from ai_cli.commands.log.query import Line, compile_query
+from ai_cli.commands.log.shards import filter_sharded
+
+LEVELS = ["INFO", "INFO", "INFO", "DEBUG", "DEBUG", "WARNING", "ERROR"]
+COMPONENTS = ["http", "db", "auth", "cache", "worker", "scheduler"]
+WORDS = ["request", "completed", "timeout", "user", "session", "retry", "connection", "query", "token", "payload"]
+
+
+def generate_log(path, size_mb, seed=0):
+    """Write a deterministic synthetic log of roughly ``size_mb`` megabytes."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w") as f:
+        while written < target:
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16)))
+            line = f"2025-04-20 10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d},{rng.randint(0, 999):03d} {rng.choice(LEVELS)} [{rng.choice(COMPONENTS)}] {words} id={rng.randint(0, 99999)}\n"
+            written += f.write(line)
+
+
+async def legacy_filter(file, substrings, output):
+    """The original per-line aiofiles implementation, kept as the baseline."""
+    async with aiofiles.open(file, mode="r") as input_file, aiofiles.open(output, mode="w") as output_file:
+        async for line in input_file:
+            line_lower = line.lower()
+            if all(sub.lower() in line_lower for sub in substrings):
+                await output_file.write(line)
+
+
+async def block_filter(file, substrings, output):
+    line_filter = LineFilter(substrings)
+    async with aiofiles.open(file, mode="rb") as input_file, aiofiles.open(output, mode="wb") as output_file:
+        async for block in read_blocks(input_file):
+            if matched := line_filter(block):
+                await output_file.write(matched)
+
+
+async def sharded_filter(file, substrings, output):
+    with await asyncio.to_thread(open, output, "wb") as output_file:
+        await filter_sharded(file, output_file, LineFilter(substrings), os.cpu_count() or 1, shard_dir=Path(output).parent)
+
+
+async def mapped_filter(file, substrings, output):
+    with await asyncio.to_thread(open, output, "wb") as output_file:
+        filter_mapped(file, output_file, LineFilter(substrings))
+
+
+ENGINES = {"legacy": legacy_filter, "block": block_filter, "sharded": sharded_filter, "mmap": mapped_filter}
+
+
+def run(engine, file, substrings, output):
+    start = time.perf_counter()
+    asyncio.run(ENGINES[engine](file, substrings, output))
+    return time.perf_counter() - start
+
+
+def naive_filter(data, substrings, mode):
+    """The original per-line check: one scan and one ``lower`` per substring and line."""
+    test = any if mode == ANY else all
+    return [line for line in data.decode().splitlines(keepends=True) if test(sub.lower() in line.lower() for sub in substrings)]
+
+
+def drop_cache(path):
+    """Evict the file's pages from the page cache, for cold-cache runs."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def measure(engine, file, substrings, output, cold):
+    """Run one engine in the calling (fresh) process and report time and peak RSS in MB."""
+    if cold:
+        drop_cache(file)
+    elapsed = run(engine, file, substrings, output)
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_engines(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        log = tmp / "bench.log"
+        generate_log(log, args.size)
+        size_mb = log.stat().st_size / (1024 * 1024)
+
+        outputs = {}
+        for engine in ENGINES:
+            outputs[engine] = tmp / f"{engine}.out"
+            elapsed = run(engine, log, args.substrings, outputs[engine])
+            print(f"{engine:>8}: {elapsed:7.3f}s  {size_mb / elapsed:8.1f} MB/s")
+
+        baseline = outputs["legacy"].read_bytes()
+        for engine, output in outputs.items():
+            if output.read_bytes() != baseline:
+                raise SystemExit(f"Output of engine {engine!r} differs from the legacy output")
+
+
+def bench_needles(args):
+    """Time the naive loop against the compiled matcher for growing needle counts."""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "bench.log"
+        generate_log(log, args.size)
+        data = log.read_bytes()
+    size_mb = len(data) / (1024 * 1024)
+    rng = random.Random(1)
+    present = WORDS + COMPONENTS
+
+    print(f"{'mode':>4} {'needles':>8} {'naive MB/s':>11} {'matcher MB/s':>13}")
+    for mode in (ALL, ANY):
+        for count in (1, 2, 4, 8, 20, 50, 100, 200):
+            # Tokens that never occur force the naive loop through every substring
+            absent = ["".join(rng.choice("bcdfghjklmnpqrstvwxz") for _ in range(6)) for _ in range(count)]
+            if mode == ALL:
+                substrings = (present[:count] + absent)[:count]
+            else:
+                substrings = absent[: count - 1] + ["timeout"]
+
+            start = time.perf_counter()
+            expected = naive_filter(data, substrings, mode)
+            naive = time.perf_counter() - start
+
+            line_filter = LineFilter(substrings, mode)
+            start = time.perf_counter()
+            matched = line_filter(data)
+            compiled = time.perf_counter() - start
+
+            if matched != "".join(expected).encode():
+                raise SystemExit(f"Matcher output differs from the naive loop for {count} needles in {mode} mode")
+            print(f"{mode:>4} {count:>8} {size_mb / naive:>11.1f} {size_mb / compiled:>13.1f}")
+
+
+def bench_mmap(args):
+    """Cold and warm cache throughput and peak RSS of the streaming and mmap engines."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        log = tmp / "bench.log"
+        generate_log(log, args.size)
+        size_mb = log.stat().st_size / (1024 * 1024)
+
+        print(f"{'query':>16} {'engine':>7} {'cache':>5} {'MB/s':>8} {'peak RSS MB':>12}")
+        for substrings in (["timeout", "user"], ["id=123"]):
+            for engine in ("block", "mmap"):
+                for cold in (True, False):
+                    # A fresh process per run, so peak RSS belongs to that run only
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        elapsed, rss = pool.submit(measure, engine, log, substrings, tmp / f"{engine}.out", cold).result()
+                    print(f"{' '.join(substrings):>16} {engine:>7} {'cold' if cold else 'warm':>5} {size_mb / elapsed:8.1f} {rss:12.1f}")
+            if (tmp / "block.out").read_bytes() != (tmp / "mmap.out").read_bytes():
+                raise SystemExit(f"mmap output differs from the block engine for {substrings}")
+
+
+def compressors():
+    formats = {"gzip": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}
+    try:
+        import zstandard
+
+        formats["zstd"] = zstandard.ZstdCompressor().compress
+    except ImportError:
+        pass
+    return formats
+
+
+async def compressed_filter(file, compression, substrings, output, jobs):
+    with await asyncio.to_thread(open, output, "wb") as output_file:
+        await filter_compressed(file, compression, output_file, LineFilter(substrings), jobs, Path(output).parent)
+
+
+def bench_compressed(args):
+    """Decompress-and-filter throughput per format, and sequential vs parallel multi-member gzip."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        log = tmp / "bench.log"
+        generate_log(log, args.size)
+        data = log.read_bytes()
+        size_mb = len(data) / (1024 * 1024)
+        substrings = ["error", "timeout"]
+        run("block", log, substrings, tmp / "plain.out")
+        expected = (tmp / "plain.out").read_bytes()
+
+        inputs = {compression: compress(data) for compression, compress in compressors().items()}
+        # One member per MB, as `pigz` or concatenated rotated logs produce
+        step = 1024 * 1024
+        inputs["gzip multi"] = b"".join(gzip.compress(data[i : i + step]) for i in range(0, len(data), step))
+
+        jobs = os.cpu_count() or 1
+        print(f"{'format':>10} {'jobs':>4} {'ratio':>6} {'MB/s':>8}")
+        for name, compressed in inputs.items():
+            path = tmp / f"bench.log.{name.replace(' ', '-')}"
+            path.write_bytes(compressed)
+            for n in (1, jobs) if name.startswith("gzip") and jobs > 1 else (1,):
+                start = time.perf_counter()
+                asyncio.run(compressed_filter(path, name.split()[0], substrings, tmp / "compressed.out", n))
+                elapsed = time.perf_counter() - start
+                if (tmp / "compressed.out").read_bytes() != expected:
+                    raise SystemExit(f"Output for {name} with {n} jobs differs from the plain file output")
+                print(f"{name:>10} {n:>4} {len(data) / len(compressed):6.1f} {size_mb / elapsed:8.1f}")
+
+
+def bench_index(args):
+    """First (index building) and repeated query times with the block index, against plain scans."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        log = tmp / "bench.log"
+        generate_log(log, args.size)
+        size_mb = log.stat().st_size / (1024 * 1024)
+
+        print(f"{'query':>22} {'run':>7} {'seconds':>8} {'MB/s':>8}")
+        for substrings in (["id=12345"], ["error", "id=777"], ["timeout"]):
+            run("block", log, substrings, tmp / "plain.out")
+            index_path(log, tmp / "index").unlink(missing_ok=True)
+            for name in ("build", "query"):
+                start = time.perf_counter()
+                with open(tmp / "indexed.out", "wb") as output_file:
+                    filter_indexed(log, output_file, LineFilter(substrings), tmp / "index")
+                elapsed = time.perf_counter() - start
+                if (tmp / "indexed.out").read_bytes() != (tmp / "plain.out").read_bytes():
+                    raise SystemExit(f"Indexed output differs from the block engine for {substrings}")
+                print(f"{' '.join(substrings):>22} {name:>7} {elapsed:8.3f} {size_mb / elapsed:8.1f}")
+        print(f"index size: {index_path(log, tmp / 'index').stat().st_size / (1024 * 1024):.2f} MB for {size_mb:.0f} MB of log")
+
+
+QUERIES = [
+    "error timeout",
+    "error /timeout.*id=\\d{3}$/",
+    "[db] NOT retry NOT timeout",
+    "(warning OR error) [auth] id=4242",
+    "id>=99990",
+    "@time>=2025-04-20T10:30 @time<2025-04-20T10:31 error",
+]
+
+
+def bench_query(args):
+    """Compiled query plans against checking every line with the full predicate."""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "bench.log"
+        generate_log(log, args.size)
+        data = log.read_bytes()
+        size_mb = len(data) / (1024 * 1024)
+
+        baseline = time.perf_counter()
+        LineFilter(["error", "timeout"])(data)
+        baseline = size_mb / (time.perf_counter() - baseline)
+        print(f"substrings 'error timeout': {baseline:.1f} MB/s")
+        print(f"{'query':>52} {'plan MB/s':>10} {'naive MB/s':>11} {'matches':>8}")
+        for query in QUERIES:
+            plan = compile_query(query)
+            start = time.perf_counter()
+            matched = plan(data)
+            planned = size_mb / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            naive = b"".join(line for line in data.splitlines(keepends=True) if plan.node.matches(Line(line)))
+            naive_speed = size_mb / (time.perf_counter() - start)
+            if matched != naive:
+                raise SystemExit(f"Plan output differs from the naive evaluation for {query!r}")
+            matches = matched.count(b"\n")
+            print(f"{query:>52} {planned:10.1f} {naive_speed:11.1f} {matches:8}")
+
+
+def per_line_filter(data, substrings):
+    """Lowercase every line as text, the way the engine used to for blocks holding any non-ASCII byte."""
+    substrings = [sub.lower() for sub in substrings]
+    return b"".join(line for line in data.splitlines(keepends=True) if all(sub in line.decode().lower() for sub in substrings))
+
+
+def measure_blocks(function, blocks):
+    """Return the MB/s of ``function`` over ``blocks`` and the peak bytes it allocates on top of them, per MB of input."""
+    size_mb = sum(map(len, blocks)) / (1024 * 1024)
+    start = time.perf_counter()
+    for block in blocks:
+        function(block)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    for block in blocks:
+        function(block)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size_mb / elapsed, peak / size_mb
+
+
+def bench_fold(args):
+    """Case folding per line against folding whole blocks, on ASCII and mixed-script logs."""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "bench.log"
+        generate_log(log, args.size)
+        lines = log.read_bytes().splitlines(keepends=True)
+    # One line in a hundred gets text that bytes.lower leaves alone, or folds differently
+    samples = {
+        "ascii": lines,
+        "1% non-ascii": [line[:-1] + " naïve café MÜLLER\n".encode() if i % 100 == 0 else line for i, line in enumerate(lines)],
+        "1% dotted I": [line[:-1] + " İSTANBUL TİMEOUT\n".encode() if i % 100 == 0 else line for i, line in enumerate(lines)],
+    }
+    print(f"{'log':>13} {'needles':>16} {'engine':>15} {'MB/s':>8} {'peak B/MB':>10}")
+    for name, sample in samples.items():
+        blocks = list(iter_blocks(io.BytesIO(b"".join(sample))))
+        for substrings in (["timeout", "db"], ["müller"]):
+            engines = {
+                "per-line": lambda block, substrings=substrings: per_line_filter(block, substrings),
+                "folded blocks": LineFilter(substrings),
+                "case-sensitive": LineFilter(substrings, case_sensitive=True),
+            }
+            if [engines["folded blocks"](block) for block in blocks] != [per_line_filter(block, substrings) for block in blocks]:
+                raise SystemExit(f"Folded output differs from the per-line output on the {name} log")
+            for engine, function in engines.items():
+                speed, peak = measure_blocks(function, blocks)
+                print(f"{name:>13} {' '.join(substrings):>16} {engine:>15} {speed:8.1f} {peak:10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for `log line-filter`")
+    parser.add_argument("--size", type=int, default=16, help="Synthetic log size in MB")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    engines = benchmarks.add_parser("engines", help="End-to-end throughput of the legacy and block engines")
+    engines.add_argument("substrings", nargs="*", default=["error", "timeout"])
+    engines.set_defaults(func=bench_engines)
+
+    needles = benchmarks.add_parser("needles", help="Naive loop vs compiled matcher as the needle count grows")
+    needles.set_defaults(func=bench_needles)
+
+    mapped = benchmarks.add_parser("mmap", help="Cold and warm cache throughput and peak RSS of the mmap engine")
+    mapped.set_defaults(func=bench_mmap)
+
+    compressed = benchmarks.add_parser("compressed", help="Throughput of compressed inputs, sequential and parallel gzip")
+    compressed.set_defaults(func=bench_compressed)
+
+    indexed = benchmarks.add_parser("index", help="Index building and repeated query times with the block index")
+    indexed.set_defaults(func=bench_index)
+
+    fold = benchmarks.add_parser("fold", help="Per-line case folding against whole-block folding, with throughput and peak allocations")
+    fold.set_defaults(func=bench_fold)
+
+    query = benchmarks.add_parser("query", help="Compiled query plans against per-line predicate evaluation")
+    query.set_defaults(func=bench_query)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+from importlib.metadata import PackageNotFoundError, version
+import importlib.util
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMAND = [sys.executable, "-m", "ai_cli.main", "log", "line-filter"]
+NEEDLE = "deadlock"
+LEVELS = ["INFO", "INFO", "INFO", "DEBUG", "DEBUG", "WARNING", "ERROR"]
+COMPONENTS = ["http", "db", "auth", "cache", "worker", "scheduler"]
+WORDS = ["request", "completed", "timeout", "user", "session", "retry", "connection", "query", "token", "payload"]
+NON_ASCII_WORDS = ["müller", "straße", "naïve", "café", "日本語", "ошибка", "İstanbul"]
+START_TIME = datetime(2025, 4, 20, 10)
+# Lines are written this many at a time
+CHUNK_LINES = 10000
+
+
+def generate(path, size_mb, line_length=120, selectivity=0.01, non_ascii=0.0, invalid=0.0, seed=0):
+    """Write a deterministic, time-ordered synthetic log of about ``size_mb`` megabytes.
+
+    Lines are about ``line_length`` bytes long. ``selectivity`` of them hold
+    ``NEEDLE``, ``non_ascii`` of them a word outside ASCII and ``invalid`` of them
+    bytes that are not UTF-8. The same arguments always write the same bytes.
+    Returns the number of lines written.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = lines = 0
+    with open(path, "wb") as f:
+        while written < target:
+            chunk = []
+            for _ in range(CHUNK_LINES):
+                stamp = START_TIME + timedelta(milliseconds=(lines + len(chunk)) * 7)
+                words = []
+                length = rng.randint(line_length // 2, line_length * 3 // 2) - 50
+                while length > 0:
+                    word = rng.choice(WORDS)
+                    words.append(word)
+                    length -= len(word) + 1
+                if rng.random() < selectivity:
+                    words.insert(rng.randrange(len(words) + 1), NEEDLE)
+                if rng.random() < non_ascii:
+                    words.insert(rng.randrange(len(words) + 1), rng.choice(NON_ASCII_WORDS))
+                line = f"{stamp:%Y-%m-%d %H:%M:%S},{stamp.microsecond // 1000:03d} {rng.choice(LEVELS)} [{rng.choice(COMPONENTS)}] {' '.join(words)} id={rng.randint(0, 99999)}\n".encode()
+                if rng.random() < invalid:
+                    line = b"\xff\xfe " + line
+                chunk.append(line)
+            data = b"".join(chunk)[: target - written]
+            if len(data) == target - written and not data.endswith(b"\n"):
+                # End the line cut short at the target size like the others
+                data += b"\n"
+            written += f.write(data)
+            lines += data.count(b"\n")
+    return lines
+
+
+def cases(log, lines):
+    """The runs of the suite: ``(name, group, input, args)``, with an input of ``None`` meaning the log on stdin.
+
+    Runs sharing a ``group`` must write the same bytes.
+    """
+    middle = (START_TIME + timedelta(milliseconds=lines * 7 // 2)).strftime("%Y-%m-%dT%H:%M:%S")
+    compressed = log.with_suffix(".log.gz")
+    return [
+        ("block", "same", str(log), [NEEDLE]),
+        ("stdin", "same", None, [NEEDLE]),
+        ("mmap", "same", str(log), [NEEDLE, "--mmap"]),
+        ("jobs", "same", str(log), [NEEDLE, "-j", "0"]),
+        ("index-build", "same", str(log), [NEEDLE, "--index"]),
+        ("index-warm", "same", str(log), [NEEDLE, "--index"]),
+        ("cache-build", "same", str(log), [NEEDLE, "--cache"]),
+        ("cache-warm", "same", str(log), [NEEDLE, "--cache"]),
+        ("gzip", "same", str(compressed), [NEEDLE]),
+        ("query", "same", str(log), ["-q", f"/{NEEDLE}/i"]),
+        ("two-needles", None, str(log), [NEEDLE, "request"]),
+        ("any", "any", str(log), [NEEDLE, "müller", "--any"]),
+        ("dense", "dense", str(log), ["user", "timeout"]),
+        *(
+            [
+                ("numpy", "same", str(log), [NEEDLE, "--numpy"]),
+                ("numpy-any", "any", str(log), [NEEDLE, "müller", "--any", "--numpy"]),
+                ("numpy-dense", "dense", str(log), ["user", "timeout", "--numpy"]),
+            ]
+            if importlib.util.find_spec("numpy")
+            else []
+        ),
+        ("case-sensitive", None, str(log), [NEEDLE, "-s"]),
+        ("regex-query", None, str(log), ["-q", f"{NEEDLE} /id=\\d+5\\b/"]),
+        ("field-query", None, str(log), ["-q", f"{NEEDLE} id>=50000"]),
+        ("since", None, str(log), [NEEDLE, "--since", middle]),
+        ("count", None, str(log), [NEEDLE, "--count"]),
+        ("first", None, str(log), [NEEDLE, "--first"]),
+        ("context", None, str(log), [NEEDLE, "-C", "2"]),
+        ("context-jobs", "context", str(log), [NEEDLE, "-C", "2", "-j", "0"]),
+        ("replace", None, str(log), [NEEDLE, "--errors", "replace"]),
+    ]
+
+
+def run_once(input_path, args, output, env):
+    """Run the command in a fresh interpreter. Returns elapsed seconds and the child's peak RSS in MB."""
+    with ExitStack() as files:
+        stdin = files.enter_context(open(input_path, "rb")) if args[0] == "-" else subprocess.DEVNULL
+        # Counts go to stdout only
+        stdout = files.enter_context(open(output, "wb")) if "--count" in args else subprocess.DEVNULL
+        start = time.perf_counter()
+        process = subprocess.Popen([*COMMAND, *args] if "--count" in args else [*COMMAND, *args, "-o", str(output)], stdin=stdin, stdout=stdout, stderr=subprocess.PIPE, env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode:
+            raise SystemExit(f"`{' '.join([*COMMAND, *args])}` failed: {process.stderr.read().decode(errors='replace')}")
+        process.stderr.close()
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def digest(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+
+def run_suite(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        log = tmp / "bench.log"
+        started = time.perf_counter()
+        lines = generate(log, args.size, args.line_length, args.selectivity, args.non_ascii, args.invalid, args.seed)
+        generation = time.perf_counter() - started
+        with open(log, "rb") as f, gzip.open(log.with_suffix(".log.gz"), "wb", compresslevel=6) as g:
+            while chunk := f.read(1 << 20):
+                g.write(chunk)
+        size_mb = log.stat().st_size / (1024 * 1024)
+        env = {**os.environ, "CACHE_DIR": str(tmp / "cache")}
+
+        empty = tmp / "empty.log"
+        empty.write_bytes(b"")
+        startup = statistics.median(run_once(str(empty), [str(empty), NEEDLE], tmp / "startup.out", env)[0] for _ in range(args.runs))
+
+        results, digests, failures = {}, {}, []
+        for name, group, input_path, case_args in cases(log, lines):
+            if args.only and name not in args.only:
+                continue
+            output = tmp / f"{name}.out"
+            command = ["-", *case_args] if input_path is None else [input_path, *case_args]
+            runs = [run_once(str(log) if input_path is None else input_path, command, output, env) for _ in range(1 if name.endswith("-build") else args.runs)]
+            elapsed = statistics.median(run[0] for run in runs)
+            results[name] = {
+                "args": case_args,
+                "seconds": round(elapsed, 4),
+                "mb_per_s": round(size_mb / elapsed, 1),
+                "lines_per_s": round(lines / elapsed),
+                "scan_mb_per_s": round(size_mb / max(elapsed - startup, 1e-6), 1),
+                "peak_rss_mb": round(max(run[1] for run in runs), 1),
+                "output_bytes": output.stat().st_size,
+            }
+            if group:
+                digests.setdefault(group, {})[name] = digest(output)
+            print(f"{name:>15} {elapsed:8.3f}s {results[name]['mb_per_s']:9.1f} MB/s {results[name]['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+        for group, by_case in digests.items():
+            if len(set(by_case.values())) > 1:
+                failures.append(f"outputs differ in group {group!r}: {by_case}")
+
+    try:
+        package_version = version("ai-cli")
+    except PackageNotFoundError:
+        package_version = None
+    report = {
+        "version": package_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "log": {
+            "size_mb": round(size_mb, 1),
+            "lines": lines,
+            "line_length": args.line_length,
+            "selectivity": args.selectivity,
+            "non_ascii": args.non_ascii,
+            "invalid": args.invalid,
+            "seed": args.seed,
+            "generation_seconds": round(generation, 2),
+        },
+        "runs": args.runs,
+        "startup_seconds": round(startup, 4),
+        "results": results,
+        "failures": failures,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if failures:
+        raise SystemExit("\n".join(failures))
+
+
+def compare(args):
+    """Print the throughput and peak RSS changes between two reports, failing past the tolerance."""
+    base, new = (json.loads(Path(path).read_text()) for path in (args.base, args.new))
+    regressions = []
+    print(f"{'case':>15} {'MB/s':>9} {'was':>9} {'change':>8} {'RSS MB':>8} {'was':>8}")
+    for name, result in new["results"].items():
+        old = base["results"].get(name)
+        if old is None:
+            continue
+        change = result["mb_per_s"] / old["mb_per_s"] - 1
+        print(f"{name:>15} {result['mb_per_s']:9.1f} {old['mb_per_s']:9.1f} {change:+8.1%} {result['peak_rss_mb']:8.1f} {old['peak_rss_mb']:8.1f}")
+        if change < -args.tolerance:
+            regressions.append(f"{name}: {change:+.1%} MB/s")
+        if result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + args.tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']} MB, was {old['peak_rss_mb']} MB")
+    startup = new["startup_seconds"] / base["startup_seconds"] - 1
+    print(f"startup {new['startup_seconds'] * 1000:.0f} ms, was {base['startup_seconds'] * 1000:.0f} ms ({startup:+.1%})")
+    if startup > args.tolerance:
+        regressions.append(f"startup: {startup:+.1%}")
+    if regressions:
+        raise SystemExit("Regressions:\n" + "\n".join(regressions))
+
+
+def generate_command(args):
+    lines = generate(args.path, args.size, args.line_length, args.selectivity, args.non_ascii, args.invalid, args.seed)
+    print(f"Wrote {lines} lines to {args.path}", file=sys.stderr)
+
+
+def log_options(parser):
+    parser.add_argument("--size", type=float, default=64, help="Synthetic log size in MB")
+    parser.add_argument("--line-length", type=int, default=120, help="Average line length in bytes")
+    parser.add_argument("--selectivity", type=float, default=0.01, help=f"Fraction of the lines holding {NEEDLE!r}, the searched word")
+    parser.add_argument("--non-ascii", type=float, default=0.01, help="Fraction of the lines holding a word outside ASCII")
+    parser.add_argument("--invalid", type=float, default=0.0, help="Fraction of the lines holding bytes that are not UTF-8")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite running every `log line-filter` engine and mode on a synthetic log, reported as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Generate a log, run every case in fresh interpreters and print the JSON report")
+    log_options(run)
+    run.add_argument("--runs", type=int, default=3, help="Runs per case, the median is reported")
+    run.add_argument("--only", nargs="+", help="Cases to run, all of them by default")
+    run.add_argument("--output", "-o", help="Write the report to this file instead of stdout")
+    run.set_defaults(func=run_suite)
+
+    generate_parser = commands.add_parser("generate", help="Only write the synthetic log")
+    generate_parser.add_argument("path")
+    log_options(generate_parser)
+    generate_parser.set_defaults(func=generate_command)
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports, failing on regressions")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="Slowdown or RSS growth tolerated, as a fraction")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Cumulative import time budgets in ms, checked against the median of the runs
+BUDGETS = {"ai_cli.main": 120, "ai_cli.commands.log.line_filter": 300}
+
+
+def import_times(module):
+    """Import ``module`` in a fresh interpreter and return ``{module: (self_us, cumulative_us)}`` from ``-X importtime``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def wall_time(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "ai_cli.main", *args], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time budget of the `ai-cli` startup path")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list, by self time")
+    args = parser.parse_args()
+
+    over = []
+    for module, budget in BUDGETS.items():
+        runs = [import_times(module) for _ in range(args.runs)]
+        median = statistics.median(times[module][1] for times in runs) / 1000
+        print(f"{module}: {median:.1f} ms (budget {budget} ms)")
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[: args.top]
+        for name, (self_us, _) in slowest:
+            print(f"  {self_us / 1000:7.1f} ms  {name}")
+        if median > budget:
+            over.append(module)
+
+    version = statistics.median(wall_time(["--version"]) for _ in range(args.runs)) * 1000
+    print(f"`ai-cli --version` wall time: {version:.0f} ms")
+
+    if over:
+        raise SystemExit(f"Import time over budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
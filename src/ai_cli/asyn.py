@@ -1,28 +1,89 @@
-import asyncio
+from contextvars import ContextVar, copy_context
 import functools
+import importlib
 import inspect
 
 import rich_click as click
-from rich_click.rich_command import RichMultiCommand
-from rich_click.rich_help_rendering import get_rich_commands
+
+# Event loop runner of an `ai-cli serve` worker, reused across the commands it runs
+loop_runner = ContextVar("loop_runner", default=None)
+
+
+def instrumentation_options():
+    """Options every command gets to report where its time and memory go."""
+    return [
+        click.Option(["--stats", "stats"], flag_value="text", help="Print per-phase timings, bytes, lines and matches processed, syscalls and peak RSS to stderr once done"),
+        click.Option(["--stats-json", "stats"], flag_value="json", help="Like --stats, as a line of JSON"),
+        click.Option(["--profile"], type=click.Path(dir_okay=False), help="Profile the run with cProfile: write the pstats dump to this file and the top functions to stderr"),
+    ]
 
 
 class AsyncCommand(click.RichCommand):
-    """Async-aware Command class."""
+    """Async-aware Command class, with the instrumentation options added."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = {param.name for param in self.params}
+        options = [option for option in instrumentation_options() if option.name not in names]
+        self.instrumentation = {option.name for option in options}
+        self.params += options
 
     def invoke(self, ctx):
-        if inspect.iscoroutinefunction(self.callback):
-            return asyncio.run(self.callback(**ctx.params))
-        return super().invoke(ctx)
+        stats_format = ctx.params.pop("stats", None) if "stats" in self.instrumentation else None
+        profile_path = ctx.params.pop("profile", None) if "profile" in self.instrumentation else None
+        if stats_format is None and profile_path is None:
+            return self._invoke(ctx)
+        # Not imported unless asked for
+        from ai_cli.stats import instrumented, process_age
+
+        # A command run by the daemon started up long before
+        startup = None if loop_runner.get() else process_age()
+        return instrumented(functools.partial(self._invoke, ctx), stats_format, profile_path, startup)
+
+    def _invoke(self, ctx):
+        # Coroutines also come from async callbacks wrapped by pass_context or pass_obj
+        rv = super().invoke(ctx)
+        if not inspect.iscoroutine(rv):
+            return rv
+        import asyncio  # Not needed to start up, show help or the version
+
+        if runner := loop_runner.get():
+            # The runner's loop outlives this command, whose context vars still apply
+            return runner.run(rv, context=copy_context())
+        return asyncio.run(rv)
 
 
 class AsyncGroup(click.RichGroup):
-    """Group that uses AsyncCommand for subcommands and itself for nested groups."""
+    """Group that uses AsyncCommand for subcommands and itself for nested groups.
+
+    ``lazy_commands`` maps command names to ``"module:attribute"`` import paths,
+    so a subcommand's module is only imported when that subcommand is used.
+    """
 
     command_class = AsyncCommand
 
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def add_lazy_command(self, name, import_path):
+        self.lazy_commands[name] = import_path
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[name].split(":")
+            self.add_command(getattr(importlib.import_module(module_name), attribute), name)
+        return super().get_command(ctx, name)
+
     def format_commands(self, ctx, formatter):
         """Modified to show subcommands with prefix of the group."""
+        # Help rendering is heavy to import and only needed here
+        from rich_click.rich_command import RichMultiCommand
+        from rich_click.rich_help_rendering import get_rich_commands
+
         commands = []
 
         # Collect direct commands
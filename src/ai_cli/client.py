@@ -0,0 +1,121 @@
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+
+SOCKET_ENV = "AI_CLI_SOCKET"
+# Largest request the daemon accepts: the JSON-encoded argv and working directory
+MAX_REQUEST = 1024 * 1024
+
+
+def socket_path():
+    """Return where the daemon listens: $AI_CLI_SOCKET, else a per-user socket in the runtime dir, else in a private directory of /tmp."""
+    if path := os.environ.get(SOCKET_ENV):
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "ai-cli.sock")
+    return os.path.join(private_dir(), "ai-cli.sock")
+
+
+def private_dir():
+    return os.path.join("/tmp", f"ai-cli-{os.getuid()}")
+
+
+def check_private_dir(path, create=False):
+    """Make sure ``path`` is a directory only the current user can access, creating it if asked, or raise ``PermissionError``.
+
+    Anyone can create a path in /tmp first, so a directory there is only trusted
+    when it is not a symlink, belongs to the user and is closed to everyone else.
+    """
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a directory private to the current user")
+
+
+def peer_uid(sock):
+    """Return the user id of the process listening on the other end of ``sock``."""
+    if hasattr(socket, "SO_PEERCRED"):
+        pid_uid_gid = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", pid_uid_gid)[1]
+    # Only the process that bound the socket can own its file, where peer credentials are not available (macOS)
+    return os.stat(sock.getpeername()).st_uid
+
+
+def connect(path=None):
+    """Connect to the daemon, or return ``None`` when none is listening.
+
+    Raises ``PermissionError`` when the socket is served by another user, who
+    must not get the client's standard streams, arguments and directory.
+    """
+    path = path or socket_path()
+    if os.path.dirname(path) == private_dir():
+        try:
+            check_private_dir(os.path.dirname(path))
+        except FileNotFoundError:
+            return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if peer_uid(sock) != os.getuid():
+            raise PermissionError(f"{path} is served by another user")
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def run(sock, argv):
+    """Run ``argv`` on the daemon and return its exit code.
+
+    The client's stdin, stdout and stderr are passed along with the request, so
+    the daemon reads and writes them directly and nothing is relayed here.
+    """
+    request = json.dumps({"argv": argv, "cwd": os.getcwd()}).encode() + b"\n"
+    socket.send_fds(sock, [request], [0, 1, 2])
+    reply = b""
+    while chunk := sock.recv(4096):
+        reply += chunk
+    if not reply:
+        print("Error: ai-cli daemon closed the connection", file=sys.stderr)
+        return 1
+    return json.loads(reply)["exit"]
+
+
+def main():
+    """Entry point of ``ai-cli-client``, taking the same arguments as ``ai-cli``.
+
+    Only the socket layer is imported, so commands start in a few milliseconds
+    when a daemon is running, and run in-process when none is.
+    """
+    try:
+        sock = connect()
+    except PermissionError as e:
+        print(f"Warning: not using the ai-cli daemon: {e}", file=sys.stderr)
+        sock = None
+    if sock is None:
+        from ai_cli.main import main as run_locally
+
+        return run_locally()
+    try:
+        code = run(sock, sys.argv[1:])
+    except KeyboardInterrupt:
+        # Closing the connection cancels the command on the daemon
+        code = 130
+    finally:
+        sock.close()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +0,0 @@
-from ai_cli.commands.log.line_filter import log_line_filter  # noqa: F401
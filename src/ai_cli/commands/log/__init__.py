@@ -1,11 +1,16 @@
 from ai_cli.asyn import async_click as click
-from ai_cli.commands.log.line_filter import log_line_filter
 
 
-@click.group(name="log")
+@click.group(
+    name="log",
+    lazy_commands={
+        "line-filter": "ai_cli.commands.log.line_filter:log_line_filter",
+        "head": "ai_cli.commands.log.slicing:log_head",
+        "tail": "ai_cli.commands.log.slicing:log_tail",
+        "slice": "ai_cli.commands.log.slicing:log_slice",
+        "summarize": "ai_cli.commands.log.summarize:log_summarize",
+    },
+)
 def log():
     """Commands for working with log files."""
     pass
-
-
-log.add_command(log_line_filter)
@@ -0,0 +1,59 @@
+import glob
+import os
+from pathlib import Path
+import sys
+
+from ai_cli.asyn import click
+
+STDIO = "-"
+GLOB_CHARS = "*?["
+
+
+def silence_stdout():
+    """Point stdout at /dev/null after the reader went away, like ``grep | head`` does."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, sys.stdout.fileno())
+    except (AttributeError, OSError, ValueError):
+        pass
+    finally:
+        os.close(devnull)
+
+
+def report_failure(file, error):
+    reason = "is not a text file" if isinstance(error, UnicodeDecodeError) else f"could not be read: {error}"
+    click.echo(f"Error: {file} {reason}", err=True)
+
+
+def expand_inputs(paths):
+    """Expand files, directories (recursively) and glob patterns into a de-duplicated list of files.
+
+    Directory contents and glob matches are sorted, so the order is stable across runs.
+    Raises ``FileNotFoundError`` for a path that does not exist or a pattern matching no file.
+    """
+    files, seen = [], set()
+    for path in paths:
+        if Path(path).is_dir():
+            found = sorted(child for child in Path(path).rglob("*") if child.is_file())
+            if not found:
+                raise FileNotFoundError(f"Directory {path} holds no file")
+        elif Path(path).exists():
+            found = [Path(path)]
+        elif any(char in path for char in GLOB_CHARS):
+            found = sorted(Path(match) for match in glob.glob(os.path.expanduser(path), recursive=True) if os.path.isfile(match))
+            if not found:
+                raise FileNotFoundError(f"No file matches {path}")
+        else:
+            raise FileNotFoundError(f"File {path} does not exist")
+        for file in found:
+            if (key := file.resolve()) not in seen:
+                seen.add(key)
+                files.append(file)
+    return files
+
+
+def expand_file_inputs(paths):
+    try:
+        return expand_inputs(paths)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="FILE") from None
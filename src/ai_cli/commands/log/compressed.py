@@ -0,0 +1,227 @@
+import asyncio
+import bz2
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+from itertools import pairwise
+import lzma
+import mmap
+import os
+from pathlib import Path
+import tempfile
+import zlib
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, LineBlocks, filter_blocks, normalize_newlines, write_block
+from ai_cli.commands.log.shards import append_file
+
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+MAGIC_SIZE = max(len(magic) for magic in MAGIC)
+SUFFIXES = {".gz", ".bz2", ".xz", ".zst"}
+
+# Gzip member header: magic, deflate method, then a flags byte with the reserved bits clear
+GZIP_HEADER = b"\x1f\x8b\x08"
+GZIP_FLAGS_RESERVED = 0xE0
+# Bytes decompressed from a candidate member start to make sure it really is one
+PROBE_SIZE = 64 * 1024
+MIN_MEMBER_SHARD = 1024 * 1024
+
+
+class UnsupportedCompression(Exception):
+    pass
+
+
+# What the decompressors raise on corrupt or truncated input (bz2 raises a bare OSError)
+DECOMPRESSION_ERRORS = (EOFError, OSError, zlib.error, lzma.LZMAError)
+
+
+def detect_compression(header):
+    """Return the compression format announced by the first bytes of a file, if any."""
+    for magic, compression in MAGIC.items():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def detect_file_compression(path):
+    with open(path, "rb") as f:
+        return detect_compression(f.read(MAGIC_SIZE))
+
+
+def open_zstd(file):
+    try:
+        from compression import zstd  # Python 3.14+
+    except ImportError:
+        try:
+            import zstandard as zstd
+        except ImportError:
+            raise UnsupportedCompression("Reading zstd files needs Python 3.14+ or the 'zstandard' package") from None
+    return zstd.open(file, "rb")
+
+
+def open_decompressed(file, compression):
+    """Open a path or binary file object for reading through the given decompressor."""
+    if compression == "gzip":
+        return gzip.open(file, "rb")
+    if compression == "bz2":
+        return bz2.open(file, "rb")
+    if compression == "xz":
+        return lzma.open(file, "rb")
+    if compression == "zstd":
+        return open_zstd(file)
+    raise UnsupportedCompression(f"Unsupported compression: {compression}")
+
+
+async def read_decompressed_blocks(file, block_size=BLOCK_SIZE):
+    """Yield blocks of whole lines from a decompressing reader.
+
+    The next chunk is decompressed in a worker thread while the current block is
+    being filtered: zlib, bz2, lzma and zstd all release the GIL while they work.
+    """
+    blocks = LineBlocks()
+    pending = asyncio.ensure_future(asyncio.to_thread(stats.read, file.read, block_size))
+    try:
+        while chunk := await pending:
+            pending = asyncio.ensure_future(asyncio.to_thread(stats.read, file.read, block_size))
+            if block := blocks.feed(chunk):
+                yield block
+        if block := blocks.flush():
+            yield block
+    finally:
+        pending.cancel()
+
+
+def is_gzip_member(mm, pos):
+    """Tell whether a gzip member plausibly starts at ``pos``, by decompressing a bit of it."""
+    if mm[pos + 3] & GZIP_FLAGS_RESERVED:
+        return False
+    try:
+        zlib.decompressobj(31).decompress(mm[pos : pos + PROBE_SIZE], PROBE_SIZE)
+    except zlib.error:
+        return False
+    return True
+
+
+def gzip_member_ranges(path, jobs, min_size=MIN_MEMBER_SHARD):
+    """Split a multi-member gzip file into at most ``jobs`` ranges starting on member headers.
+
+    Returns a single range for single-member files. Candidate headers are probed
+    by decompressing a little of them; workers later confirm each boundary by
+    checking that the previous range's last member ends exactly there.
+    """
+    size = os.path.getsize(path)
+    jobs = max(1, min(jobs, size // max(min_size, 1)))
+    bounds = [0]
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, jobs):
+            pos = mm.find(GZIP_HEADER, max(size * i // jobs, bounds[-1] + 1))
+            while pos != -1 and pos + 3 < size and not is_gzip_member(mm, pos):
+                pos = mm.find(GZIP_HEADER, pos + 1)
+            if pos == -1 or pos + 3 >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+
+    bounds.append(size)
+    return list(pairwise(bounds))
+
+
+def filter_gzip_range(path, start, end, line_filter, shard_path, first):
+    """Decompress the gzip members in ``[start, end)`` and filter their whole lines into ``shard_path``.
+
+    Runs in a worker process. Unless this is the first range, the bytes up to the
+    first newline belong to a line started in an earlier range: they are returned
+    as ``head`` instead of being filtered, along with the unterminated ``tail``.
+    Returns ``(head, complete, tail, aligned)`` where ``complete`` tells whether
+    ``head`` reached a newline and ``aligned`` whether a member ended exactly at
+    ``end``.
+    """
+    blocks = LineBlocks()
+    head, complete = b"", first
+    decompressor, in_member = zlib.decompressobj(31), False
+
+    with open(path, "rb") as input_file, open(shard_path, "wb") as output_file:
+        input_file.seek(start)
+        remaining = end - start
+        while remaining:
+            data = input_file.read(min(BLOCK_SIZE, remaining))
+            remaining -= len(data)
+            out = []
+            while data := data if in_member else data.lstrip(b"\0"):  # gzip tolerates zero padding between members
+                out.append(decompressor.decompress(data))
+                in_member = not decompressor.eof
+                if in_member:
+                    break
+                data, decompressor = decompressor.unused_data, zlib.decompressobj(31)
+            out = b"".join(out)
+
+            if not complete:
+                newline = out.find(b"\n")
+                if newline == -1:
+                    head += out
+                    continue
+                head, out, complete = head + out[: newline + 1], out[newline + 1 :], True
+            if matched := line_filter(blocks.feed(out)):
+                output_file.write(matched)
+
+    return head, complete, blocks.carry, not in_member
+
+
+async def filter_gzip_parallel(file, output_file, line_filter, jobs, shard_dir=None, min_size=MIN_MEMBER_SHARD):
+    """Filter a multi-member gzip file with ``jobs`` worker processes.
+
+    Members are split into ranges decompressed and filtered in parallel. Lines
+    crossing a range boundary are stitched back together and filtered here.
+    Returns ``False``, having written nothing, when the file has a single member or
+    a probed boundary turned out not to be one, so the caller can stream it instead.
+    """
+    ranges = gzip_member_ranges(file, jobs, min_size)
+    if len(ranges) < 2:
+        return False
+    loop = asyncio.get_running_loop()
+
+    with (
+        tempfile.TemporaryDirectory(dir=shard_dir, prefix=".line-filter.") as tmp_dir,
+        ProcessPoolExecutor(max_workers=len(ranges)) as pool,
+    ):
+        shard_paths = [Path(tmp_dir) / f"{i}.shard" for i in range(len(ranges))]
+        shards = [loop.run_in_executor(pool, filter_gzip_range, file, start, end, line_filter, shard_path, i == 0) for i, ((start, end), shard_path) in enumerate(zip(ranges, shard_paths))]
+        results = []
+        for result in await asyncio.gather(*shards, return_exceptions=True):
+            # A range is only meaningful if the previous one ended exactly on a member boundary
+            if results and not results[-1][-1]:
+                return False
+            if isinstance(result, BaseException):
+                raise result
+            results.append(result)
+        if not results[-1][-1]:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+        pending = b""
+        for (head, complete, tail, _), shard_path in zip(results, shard_paths):
+            pending += head
+            if not complete:
+                continue
+            if pending and (matched := line_filter(normalize_newlines(pending))):
+                await write_block(output_file, matched)
+            await asyncio.to_thread(append_file, output_file, shard_path)
+            pending = tail
+        if pending and (matched := line_filter(normalize_newlines(pending))):
+            await write_block(output_file, matched)
+    return True
+
+
+async def filter_compressed(file, compression, output_file, line_filter, jobs=1, shard_dir=None):
+    """Filter a compressed path or binary stream, streaming it through its decompressor.
+
+    Multi-member gzip files are decompressed in parallel when ``jobs > 1``.
+    """
+    if compression == "gzip" and jobs > 1 and isinstance(file, (str, os.PathLike)) and await filter_gzip_parallel(file, output_file, line_filter, jobs, shard_dir):
+        return
+    with open_decompressed(file, compression) as decompressed:
+        await filter_blocks(read_decompressed_blocks(decompressed), output_file, line_filter)
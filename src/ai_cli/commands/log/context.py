@@ -0,0 +1,246 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import tempfile
+
+from ai_cli.commands.log.counts import LimitReached
+from ai_cli.commands.log.engine import BLOCK_SIZE, clean_lines, iter_blocks, normalize_newlines, number_lines, prefix_lines, write_block
+from ai_cli.commands.log.shards import SYNC_SIZE, RangeReader, append_file, shard_ranges
+
+SEPARATOR = b"--\n"
+
+
+def match_spans(block, matched):
+    """Yield the ``(start, end)`` offsets in ``block`` of the lines of ``matched``, which a filter selected from it.
+
+    Filters select a line for its bytes alone, so the first line of ``block`` at
+    or after the previous match holding the same bytes is the one selected.
+    """
+    pos = 0
+    for line in matched.splitlines(keepends=True):
+        if line.endswith(b"\n"):
+            start = block.find(line, pos)
+            while start > 0 and block[start - 1] != 0x0A:
+                start = block.find(line, start + 1)
+        else:
+            start = len(block) - len(line)
+        pos = start + len(line)
+        yield start, pos
+
+
+def lines_after(block, pos, end, count):
+    """Return the offset right after up to ``count`` lines starting at ``pos`` and before ``end``, and how many lines that is."""
+    taken = 0
+    while taken < count and pos < end:
+        pos = block.find(b"\n", pos, end) + 1 or end
+        taken += 1
+    return pos, taken
+
+
+def lines_before(block, pos, start, count):
+    """Return the offset of up to ``count`` lines ending at ``pos`` and starting at or after ``start``, and how many lines that is."""
+    taken = 0
+    while taken < count and pos > start:
+        pos = block.rfind(b"\n", start, pos - 1) + 1 or start
+        taken += 1
+    return pos, taken
+
+
+class ContextFilter:
+    """Block filter adding grep-style context around the lines ``line_filter`` selects.
+
+    State is kept from one block to the next: the last ``before`` lines not
+    written yet, in a ring buffer, and how many of the ``after`` lines following
+    the last match are still to come, so memory stays bounded whatever the input.
+    Groups of lines that do not follow each other are told apart by a
+    ``separator`` line, ``--`` unless it is None. Once ``limit`` lines matched
+    and their trailing context is out, the next block raises ``LimitReached``.
+    With ``prefix``, written lines are prefixed with it, separators are not.
+    With ``numbered``, lines are numbered from ``first_line`` on, the number
+    followed by ``:`` on matching lines and by ``-`` on context lines, like
+    grep does.
+
+    Matches are found back in the block by their bytes, so ``line_filter`` must
+    not replace undecodable bytes: lines are cleaned in the ``errors`` mode once
+    written instead, context included.
+    """
+
+    def __init__(self, line_filter, before=0, after=0, limit=None, prefix=None, errors="strict", numbered=False, first_line=1, separator=SEPARATOR):
+        self.line_filter = line_filter
+        self.before = before
+        self.after = after
+        self.limit = limit
+        self.prefix = prefix
+        self.errors = errors
+        self.numbered = numbered
+        self.separator = separator
+        # Number of the first line of the next block
+        self.line = first_line
+        self.ring = deque(maxlen=before)
+        self.offset = 0
+        self.after_left = 0
+        self.matches = 0
+        self.last_end = None
+
+    @property
+    def limited(self):
+        return self.limit is not None and self.matches >= self.limit
+
+    def __call__(self, block):
+        if self.limited and not self.after_left:
+            raise LimitReached
+        out = []
+        for offset, lines, number, matched in self.segments(block):
+            if self.separator is not None and self.last_end is not None and offset != self.last_end:
+                out.append(self.separator)
+            self.last_end = offset + len(lines)
+            lines = clean_lines(lines, self.line_filter.encoding, self.errors)
+            if number is not None:
+                lines = number_lines(lines, number, b":" if matched else b"-")
+            out.append(lines if self.prefix is None else prefix_lines(lines, self.prefix))
+        return b"".join(out)
+
+    def segments(self, block):
+        """Yield ``(offset, lines, number, matched)`` for the runs of lines to write.
+
+        Offsets count from the start of the first block. ``number`` is the
+        number of the first of ``lines`` when ``numbered``, None otherwise.
+        Matching lines come one per run, with ``matched`` set.
+        """
+        base = self.offset
+        self.offset += len(block)
+        # Lines are counted from the start of the block up to each run, in order
+        counted, line = 0, self.line
+
+        def number(pos):
+            nonlocal counted, line
+            if not self.numbered:
+                return None
+            line += block.count(b"\n", counted, pos)
+            counted = pos
+            return line
+
+        pos = 0
+        for start, end in () if self.limited else match_spans(block, self.line_filter(block)):
+            if self.after_left:
+                stop, taken = lines_after(block, pos, start, self.after_left)
+                if stop > pos:
+                    yield base + pos, block[pos:stop], number(pos), False
+                self.after_left -= taken
+                pos = stop
+            first, taken = lines_before(block, start, pos, self.before)
+            if first == 0 and taken < self.before:
+                # The ring holds the lines right before this block
+                ring = list(self.ring)[max(0, len(self.ring) - self.before + taken) :]
+                for i, (offset, lines) in enumerate(ring):
+                    yield offset, lines, self.line - len(ring) + i if self.numbered else None, False
+            self.ring.clear()
+            if first < start:
+                yield base + first, block[first:start], number(first), False
+            yield base + start, block[start:end], number(start), True
+            pos = end
+            self.after_left = self.after
+            self.matches += 1
+            if self.limited:
+                break
+        if self.after_left:
+            stop, taken = lines_after(block, pos, len(block), self.after_left)
+            if stop > pos:
+                yield base + pos, block[pos:stop], number(pos), False
+            self.after_left -= taken
+            pos = stop
+        if self.numbered:
+            self.line += block.count(b"\n")
+        # The lines not written yet that the next match may need
+        first, _ = lines_before(block, len(block), pos, self.before)
+        while first < len(block):
+            end = block.find(b"\n", first) + 1 or len(block)
+            self.ring.append((base + first, block[first:end]))
+            first = end
+
+
+def read_lines_before(input_file, pos, count):
+    """Return the up to ``count`` lines ending right before ``pos``, the start of a line."""
+    data = b""
+    while pos > 0 and data.count(b"\n") <= count:
+        step = min(SYNC_SIZE, pos)
+        pos -= step
+        input_file.seek(pos)
+        data = input_file.read(step) + data
+    first, _ = lines_before(data, len(data), 0, count)
+    return data[first:]
+
+
+def context_range(path, start, end, line_filter, before, after, shard_path, errors="strict"):
+    """Write the lines of the ``[start, end)`` byte range of ``path`` to show with context into ``shard_path``. Runs in a worker process.
+
+    The ``after`` lines before the range and the ``before`` lines after it are
+    filtered too, for their matches' context reaching into the range, but are not
+    written. Returns whether any line was written, and whether the first and the
+    last line of the range were, so shards are joined with a separator only where
+    lines were left out.
+    """
+    context = ContextFilter(line_filter, before, after)
+    first_start = last_end = high = None
+
+    with open(path, "rb") as input_file, open(shard_path, "wb") as output_file:
+        head = normalize_newlines(read_lines_before(input_file, start, after))
+        low = len(head)
+
+        def write(block):
+            # Lines out of the range are written by the shards they belong to
+            nonlocal first_start, last_end
+            for offset, lines, _, _ in context.segments(block):
+                begin, stop = max(offset, low), offset + len(lines) if high is None else min(offset + len(lines), high)
+                if begin >= stop:
+                    continue
+                if last_end is not None and begin != last_end:
+                    output_file.write(SEPARATOR)
+                first_start = begin if first_start is None else first_start
+                output_file.write(clean_lines(lines[begin - offset : stop - offset], line_filter.encoding, errors))
+                last_end = stop
+
+        write(head)
+        size = low
+        for block in iter_blocks(RangeReader(input_file, start, end)):
+            size += len(block)
+            write(block)
+        high = size
+        input_file.seek(end)
+        write(normalize_newlines(b"".join(input_file.readline() for _ in range(before))))
+
+    return first_start is not None, first_start == low, last_end == high
+
+
+async def filter_sharded_context(file, output_file, line_filter, before, after, jobs, shard_dir=None, min_shard_size=BLOCK_SIZE, start=0, end=None, errors="strict"):
+    """Filter ``file``, or its ``[start, end)`` byte range, with context lines, with ``jobs`` worker processes.
+
+    Each worker also filters the few lines around its byte range that context can
+    reach from, so context crossing a shard boundary is written once, by the
+    shard holding it. Shards are appended in file order, with a separator where
+    the last line written by one shard does not directly precede the first line
+    written by the next.
+    """
+    ranges = shard_ranges(file, jobs, min_shard_size, start, end)
+    loop = asyncio.get_running_loop()
+
+    with (
+        tempfile.TemporaryDirectory(dir=shard_dir, prefix=".line-filter.") as tmp_dir,
+        ProcessPoolExecutor(max_workers=max(len(ranges), 1)) as pool,
+    ):
+        shard_paths = [Path(tmp_dir) / f"{i}.shard" for i in range(len(ranges))]
+        shards = [loop.run_in_executor(pool, context_range, file, start, end, line_filter, before, after, shard_path, errors) for (start, end), shard_path in zip(ranges, shard_paths)]
+        try:
+            # Index of the last shard that wrote lines, and whether it wrote the last line of its range
+            previous, at_end = None, False
+            for i, (shard, shard_path) in enumerate(zip(shards, shard_paths)):
+                written, at_start, last_at_end = await shard
+                if written and previous is not None and not (previous == i - 1 and at_end and at_start):
+                    await write_block(output_file, SEPARATOR)
+                await asyncio.to_thread(append_file, output_file, shard_path)
+                if written:
+                    previous, at_end = i, last_at_end
+        finally:
+            for shard in shards:
+                shard.cancel()
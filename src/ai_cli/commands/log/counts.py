@@ -0,0 +1,88 @@
+class LimitReached(Exception):
+    """Raised by a ``MatchCounter`` once it passed on as many lines as allowed, stopping the scan writing to it."""
+
+
+def count_lines(data):
+    """Number of lines in ``data``, an unterminated last one included."""
+    return data.count(b"\n") + (bool(data) and not data.endswith(b"\n"))
+
+
+def head_lines(data, count):
+    """Return the first ``count`` lines of ``data``."""
+    end = 0
+    for _ in range(count):
+        end = data.find(b"\n", end) + 1
+        if not end:
+            return data
+    return data[:end]
+
+
+class MatchCounter:
+    """Binary writer counting the lines written to it and passing at most ``limit`` of them on to ``file``.
+
+    Without ``file`` lines are only counted. Writes need not end on a line break:
+    a partial line is held back until the rest of it comes, or ``close`` takes it
+    as the unterminated last line. Once ``limit`` lines are passed on, writing
+    raises ``LimitReached``, which leaving the counter as a context manager
+    swallows. With ``selector``, only the lines it selects are counted and
+    passed on, while each of ``hit_filters`` counts in ``hits`` the lines it
+    selects among all those written.
+    """
+
+    def __init__(self, file=None, limit=None, selector=None, hit_filters=()):
+        self.file = file
+        self.limit = limit
+        self.selector = selector
+        self.hit_filters = list(hit_filters)
+        self.count = 0
+        self.hits = [0] * len(self.hit_filters)
+        self.carry = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return exc_type is not None and issubclass(exc_type, LimitReached)
+
+    @property
+    def reached(self):
+        return self.limit is not None and self.count >= self.limit
+
+    def write(self, data):
+        size = len(data)
+        data = self.carry + bytes(data) if self.carry else bytes(data)
+        cut = data.rfind(b"\n") + 1
+        self.carry = data[cut:]
+        self._take(data[:cut])
+        return size
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        """Take the unterminated last line, if any, unless the limit was already reached."""
+        data, self.carry = self.carry, b""
+        if data and not self.reached:
+            self._take(data)
+
+    def _take(self, lines):
+        if self.reached:
+            raise LimitReached
+        if not lines:
+            return
+        for i, hit_filter in enumerate(self.hit_filters):
+            self.hits[i] += count_lines(hit_filter(lines))
+        if self.selector is not None:
+            lines = self.selector(lines)
+        count = count_lines(lines)
+        if self.limit is not None and self.count + count >= self.limit:
+            lines, count = head_lines(lines, self.limit - self.count), self.limit - self.count
+        self.count += count
+        if self.file is not None and lines:
+            self.file.write(lines)
+        if self.reached:
+            self.flush()
+            raise LimitReached
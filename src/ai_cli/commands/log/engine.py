@@ -0,0 +1,303 @@
+import asyncio
+import codecs
+
+from ai_cli import stats
+from ai_cli.commands.log.matcher import ALL, ANY, Matcher
+from ai_cli.commands.log.writer import QueuedWriter
+
+BLOCK_SIZE = 4 * 1024 * 1024
+ENCODING = "utf-8"
+# Characters outside ASCII whose lowercase holds ASCII: "İ" lowers to "i" and a combining dot, the Kelvin sign to "k"
+FOLDS_TO_ASCII = "\u0130\u212a"
+# Bytes starting a character outside ASCII in UTF-8, and in single-byte encodings
+UTF8_LEADS = tuple(bytes((byte,)) for byte in range(0xC2, 0xF5))
+HIGH_BYTES = tuple(bytes((byte,)) for byte in range(0x80, 0x100))
+# Undecodable input is looked for this many bytes at a time, keeping the decoded text small
+CHECK_SIZE = 64 * 1024
+# What to do with undecodable bytes: raise, pass matching lines through as they are, replace the bytes, or drop the lines
+ERRORS = ("strict", "surrogateescape", "replace", "skip")
+# Bytes of the start of an input looked at to tell binary files apart, like git does: text has no NUL
+SNIFF_SIZE = 8000
+
+
+class BinaryFileError(UnicodeDecodeError):
+    """Raised for inputs that look like binary data, before anything is filtered."""
+
+    def __init__(self, encoding, head):
+        nul = head.find(b"\0")
+        super().__init__(encoding, head, nul, nul + 1, "binary data")
+
+    def __reduce__(self):
+        # Rebuilt from its own arguments, not UnicodeDecodeError's, when sent back from a worker process
+        return BinaryFileError, (self.encoding, self.object)
+
+
+def is_ascii_compatible(encoding):
+    """Tell whether ``encoding`` writes ASCII, line breaks included, as single ASCII bytes and nothing else with them.
+
+    That is UTF-8 and the single-byte encodings, which byte-level matching needs.
+    Multibyte ones such as UTF-16 or Shift JIS are not.
+    """
+    info = codecs.lookup(encoding)
+    if info.name == "utf-8":
+        return True
+    ascii = bytes(range(0x80))
+    return ascii.decode(encoding, "replace") == ascii.decode("ascii") and len(bytes(range(0x100)).decode(encoding, "replace")) == 0x100
+
+
+def sniff_binary(head, encoding=ENCODING):
+    """Raise ``BinaryFileError`` if the first bytes of an input hold a NUL byte, so binary files fail before being scanned."""
+    head = head[:SNIFF_SIZE]
+    if b"\0" in head and is_ascii_compatible(encoding):
+        raise BinaryFileError(encoding, head)
+
+
+def normalize_newlines(data):
+    """Translate ``\\r\\n`` and lone ``\\r`` into ``\\n``, as text-mode reads do."""
+    if b"\r" not in data:
+        return data
+    return data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+
+class LineBlocks:
+    """Cut a stream of raw chunks into blocks of whole, newline-normalized lines.
+
+    A partial trailing line is carried over to the next chunk. A trailing ``\\r``
+    is held back too, so a ``\\r\\n`` pair split across two chunks still counts
+    as a single line break.
+    """
+
+    def __init__(self):
+        self.carry = b""
+
+    def feed(self, chunk):
+        data = self.carry + chunk if self.carry else chunk
+        hold = b""
+        if data.endswith(b"\r"):
+            data, hold = data[:-1], b"\r"
+        data = normalize_newlines(data)
+        cut = data.rfind(b"\n") + 1
+        self.carry = data[cut:] + hold
+        return data[:cut]
+
+    def flush(self):
+        data, self.carry = normalize_newlines(self.carry), b""
+        return data
+
+
+def iter_blocks(file, block_size=BLOCK_SIZE):
+    """Yield blocks of whole lines from a binary file object."""
+    blocks = LineBlocks()
+    while chunk := stats.read(file.read, block_size):
+        if block := blocks.feed(chunk):
+            yield block
+    if block := blocks.flush():
+        yield block
+
+
+async def read_blocks(file, block_size=BLOCK_SIZE):
+    """Yield blocks of whole lines from an aiofiles binary file handle."""
+    blocks = LineBlocks()
+    while chunk := await stats.aread(file.read, block_size):
+        if block := blocks.feed(chunk):
+            yield block
+    if block := blocks.flush():
+        yield block
+
+
+async def read_stream_blocks(stream, block_size=BLOCK_SIZE):
+    """Yield blocks of whole lines from a binary stream, such as stdin, as data arrives.
+
+    ``read1`` returns after a single underlying read, so lines from a slow writer
+    are passed on right away instead of waiting for a whole block to fill up.
+    """
+    blocks = LineBlocks()
+    read = getattr(stream, "read1", stream.read)
+    while chunk := await asyncio.to_thread(stats.read, read, block_size):
+        if block := blocks.feed(chunk):
+            yield block
+    if block := blocks.flush():
+        yield block
+
+
+def prefix_lines(block, prefix):
+    """Put ``prefix`` in front of every line of ``block``, terminating the last one."""
+    return prefix + bytes(block).removesuffix(b"\n").replace(b"\n", b"\n" + prefix) + b"\n"
+
+
+def number_lines(lines, number, mark=b":"):
+    """Put the line number, counting from ``number``, and ``mark`` in front of every ``\n``-terminated line of ``lines``."""
+    parts = bytes(lines).split(b"\n")
+    last = parts.pop()
+    numbered = b"".join(b"%d%s%s\n" % (n, mark, part) for n, part in enumerate(parts, number))
+    return numbered + b"%d%s%s" % (number + len(parts), mark, last) if last else numbered
+
+
+def write_lines(output_file, data):
+    """Write whole lines and flush them, so downstream readers see complete lines."""
+    stats.write(output_file, data)
+    with stats.phase("write"):
+        output_file.flush()
+
+
+async def write_block(output_file, data):
+    """Write whole lines from the event loop: queued for the writer thread of a ``QueuedWriter``, written and flushed in a thread otherwise."""
+    if not isinstance(output_file, QueuedWriter):
+        await asyncio.to_thread(write_lines, output_file, data)
+        return
+    stats.count(writes=1, bytes_written=len(data))
+    if not output_file.offer(data):
+        # The writer is behind: wait for room without blocking the event loop
+        await asyncio.to_thread(output_file.write, data)
+
+
+async def filter_blocks(blocks, output_file, line_filter):
+    """Filter an async stream of blocks into a binary file, one write per block."""
+    async for block in blocks:
+        if matched := stats.match(line_filter, block):
+            await write_block(output_file, matched)
+
+
+class LineFilter:
+    """Select the lines of a block that contain all (or any) substrings, case-insensitively.
+
+    Matching runs on bytes: the whole block is lowercased once and handed to a
+    compiled ``Matcher``, so lines that cannot match are never visited.
+    ``bytes.lower`` only folds ASCII, which is all ``str.lower`` does to a line
+    too unless it holds a character lowering to ASCII, or a needle is not ASCII.
+    Only the lines where the two can differ are decoded and lowered as text, so
+    the selected lines are exactly those a text-mode ``line.lower()`` scan picks.
+    With ``case_sensitive``, blocks are matched as they are. With ``vectorized``,
+    the matcher is the NumPy-backed ``VectorMatcher``.
+
+    With ``errors="strict"``, blocks that do not decode raise ``UnicodeDecodeError``
+    like a text-mode read. Other ``ERRORS`` modes never decode lines that do not
+    match: matching lines are written as they are, with undecodable bytes
+    replaced, or dropped when they hold any.
+    """
+
+    def __init__(self, substrings, mode=ALL, encoding=ENCODING, case_sensitive=False, errors="strict", vectorized=False):
+        self.mode = mode
+        self.encoding = encoding
+        self.case_sensitive = case_sensitive
+        self.errors = errors
+        substrings = list(substrings) if case_sensitive else [sub.lower() for sub in substrings]
+        # A line holds at most one "\n", at its very end, and never a "\r".
+        possible = [sub for sub in substrings if "\r" not in sub and "\n" not in sub[:-1]]
+        if mode == ANY:
+            # No substrings at all keeps every line, as it does with ALL
+            self.everything = not substrings or "" in possible
+            self.nothing = bool(substrings) and not possible
+        else:
+            self.everything = not any(substrings)
+            self.nothing = len(possible) < len(substrings)
+        self.substrings = [sub for sub in possible if sub]
+        if vectorized:
+            from ai_cli.commands.log.vectorized import VectorMatcher  # NumPy is an optional dependency
+        self.matcher = (VectorMatcher if vectorized else Matcher)([sub.encode(encoding, "surrogateescape") for sub in self.substrings], mode)
+        # Bytes marking the lines that folding as text may match differently than folding bytes
+        if case_sensitive:
+            self.unstable = ()
+        elif all(sub.isascii() for sub in self.substrings):
+            self.unstable = tuple(char.encode(encoding) for char in FOLDS_TO_ASCII if can_encode(char, encoding))
+        else:
+            self.unstable = UTF8_LEADS if codecs.lookup(encoding).name == "utf-8" else HIGH_BYTES
+
+    def __call__(self, block):
+        if self.nothing:
+            return b""
+        if self.everything:
+            return block
+        if block.isascii():
+            return b"".join(self.matcher.scan(block if self.case_sensitive else block.lower(), block))
+        if self.errors == "strict":
+            check_decodable(block, self.encoding)
+        if self.case_sensitive:
+            spans = self.matcher.spans(block)
+        else:
+            spans = self.matcher.spans(block.lower())
+            if self.unstable:
+                spans = self._refold(block, spans)
+        matched = b"".join(block[start:end] for start, end in spans)
+        return clean_lines(matched, self.encoding, self.errors)
+
+    def line_matches(self, line):
+        """Tell whether a single line is selected, with the ``str.lower`` fallback."""
+        if self.case_sensitive:
+            found = self.matcher.matches(line)
+        else:
+            found = self.matcher.matches(line.lower()) or (any(marker in line for marker in self.unstable) and self._text_matches(line))
+        return found and (self.errors != "skip" or line.isascii() or is_decodable(line, self.encoding))
+
+    def _text_matches(self, line):
+        # Undecodable bytes decode to lone surrogates, as they do in command-line arguments
+        text = line.decode(self.encoding, "surrogateescape").lower()
+        test = any if self.mode == ANY else all
+        return test(sub in text for sub in self.substrings)
+
+    def _refold(self, block, spans):
+        """Add the lines matching once folded as text to the ``spans`` matched by folding bytes."""
+        matched = {start for start, _ in spans}
+        added = []
+        for start, end in marked_lines(block, self.unstable):
+            if start not in matched and self._text_matches(block[start:end]):
+                added.append((start, end))
+            matched.add(start)
+        return sorted(spans + added) if added else spans
+
+
+def can_encode(char, encoding):
+    try:
+        char.encode(encoding)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def clean_lines(lines, encoding, errors):
+    """Apply the ``replace`` or ``skip`` errors mode to matching lines, only decoding them when they are not ASCII."""
+    if errors not in ("replace", "skip") or lines.isascii() or is_decodable(lines, encoding):
+        return lines
+    if errors == "skip":
+        return b"".join(line for line in lines.splitlines(keepends=True) if is_decodable(line, encoding))
+    return lines.decode(encoding, "replace").encode(encoding, "replace")
+
+
+def is_decodable(data, encoding):
+    try:
+        if len(data) > CHECK_SIZE:
+            check_decodable(data, encoding)
+        else:
+            data.decode(encoding)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def check_decodable(block, encoding):
+    """Raise ``UnicodeDecodeError`` where a text-mode read of ``block`` would, without decoding it all at once."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    view = memoryview(block)
+    for pos in range(0, len(block), CHECK_SIZE):
+        decoder.decode(view[pos : pos + CHECK_SIZE])
+    decoder.decode(b"", final=True)
+
+
+def marked_lines(block, markers):
+    """Yield the ``(start, end)`` offsets of the lines of ``block`` holding any of ``markers``, once per marker.
+
+    Each marker's first byte is looked for with ``find``, which runs at memory
+    speed for a single byte, and the rest of it checked where that byte is.
+    """
+    find, rfind, size = block.find, block.rfind, len(block)
+    for marker in markers:
+        lead = marker[:1]
+        pos = find(lead)
+        while pos != -1:
+            if not block.startswith(marker, pos):
+                pos = find(lead, pos + 1)
+                continue
+            start = rfind(b"\n", 0, pos) + 1
+            end = find(b"\n", pos) + 1 or size
+            yield start, end
+            pos = find(lead, end)
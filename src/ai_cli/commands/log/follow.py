@@ -0,0 +1,182 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import struct
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, LineBlocks, write_block
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT = struct.Struct("iIII")
+POLL_INTERVAL = 0.25
+# Trailing bytes remembered to notice a file truncated and refilled past the read position
+MARK_SIZE = 64
+
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify, awaitable from the running event loop."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read_events(self):
+        """Return the ``(mask, name)`` pairs queued so far."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, pos = [], 0
+        while pos < len(data):
+            _, mask, _, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            events.append((mask, data[pos : pos + length].rstrip(b"\0")))
+            pos += length
+        return events
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(self.fd)
+        return self.read_events()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher:
+    """Wait for changes to a file by watching its directory.
+
+    Watching the directory rather than the file also reports a new file being
+    created or moved in under the same name, which is how rotation shows up. Falls
+    back to polling where inotify is not available.
+    """
+
+    def __init__(self, path):
+        self.name = os.fsencode(path.name)
+        try:
+            self.inotify = Inotify()
+            self.inotify.add_watch(path.parent, WATCH_MASK)
+        except (AttributeError, OSError):
+            self.inotify = None
+
+    async def wait(self):
+        if self.inotify is None:
+            await asyncio.sleep(POLL_INTERVAL)
+            return
+        while not any(name == self.name for _, name in await self.inotify.wait()):
+            pass
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+class Follower:
+    """Read a file incrementally, surviving copytruncate and rename-based rotation."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+        self.caught_up = False
+        self.rewind()
+
+    def open(self):
+        try:
+            self.file = open(self.path, "rb")  # noqa: SIM115 -- kept open across reads, closed by close()
+        except FileNotFoundError:
+            self.file = None
+        self.rewind()
+
+    def rewind(self):
+        if self.file is not None:
+            self.file.seek(0)
+        self.blocks = LineBlocks()
+        self.mark = b""
+
+    def truncated(self):
+        """Tell whether the file shrank, or was rewritten, below the read position."""
+        fd, pos = self.file.fileno(), self.file.tell()
+        if os.fstat(fd).st_size < pos:
+            return True
+        return bool(self.mark) and os.pread(fd, len(self.mark), pos - len(self.mark)) != self.mark
+
+    def read(self):
+        """Return the next block of whole lines appended to the file, or ``b""`` once caught up.
+
+        A trailing partial line is held back until its newline arrives, unless the
+        file was rotated away, in which case it can no longer grow.
+        """
+        while True:
+            if self.file is None:
+                self.open()
+                if self.file is None:
+                    return b""
+            if self.caught_up and self.truncated():
+                # Truncated in place (copytruncate): start over from the top
+                self.rewind()
+            self.caught_up = False
+
+            while chunk := self.file.read(BLOCK_SIZE):
+                self.mark = (self.mark + chunk[-MARK_SIZE:])[-MARK_SIZE:]
+                if block := self.blocks.feed(chunk):
+                    return block
+
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                return b""
+            opened = os.fstat(self.file.fileno())
+            if (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                # Rotated by rename: finish the old file, then read the new one from its start
+                tail = self.blocks.flush()
+                self.file.close()
+                self.open()
+                if tail:
+                    return tail
+            elif self.truncated():
+                self.rewind()
+            else:
+                self.caught_up = True
+                return b""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+async def follow(path, output_file, line_filter):
+    """Filter ``path`` and keep filtering lines appended to it until cancelled."""
+    follower, watcher = Follower(path), Watcher(Path(path).resolve())
+    try:
+        while True:
+            while block := await asyncio.to_thread(follower.read):
+                if matched := stats.match(line_filter, block):
+                    await write_block(output_file, matched)
+            await watcher.wait()
+    finally:
+        watcher.close()
+        follower.close()
@@ -0,0 +1,246 @@
+import array
+from collections import deque
+from contextlib import suppress
+import hashlib
+from itertools import repeat
+import os
+from pathlib import Path
+import struct
+import sys
+import tempfile
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import ENCODING, normalize_newlines
+from ai_cli.commands.log.matcher import ANY
+
+MAGIC = b"LFINDEX1"
+# Magic, device, inode, size and mtime of the file when indexed, end of the indexed lines, last bytes indexed
+HEADER = struct.Struct("<8sQQQqQ64s")
+# Block start, end and bloom filter size in bits (0: no filter, always scan)
+RECORD = struct.Struct("<QQI")
+MARK_SIZE = 64
+INDEX_BLOCK = 256 * 1024
+
+# Grams are the 4-byte words at offsets multiple of STRIDE in a folded block, so
+# only needles of MIN_NEEDLE bytes or more are sure to cover a whole one
+GRAM = 4
+STRIDE = 2
+MIN_NEEDLE = GRAM + STRIDE - 1
+BITS_PER_GRAM = 8
+GRAM_HASH = 0x9E3779B1
+TO_BINARY = bytes.maketrans(b"\0\1", b"01")
+
+# Parsed index files by path, so a long-lived process (ai-cli serve) does not read them again
+LOADED_INDEXES = {}
+MAX_LOADED_INDEXES = 16
+
+
+def index_path(path, index_dir=None, suffix=".idx"):
+    """Return where the index of ``path`` lives: one file per absolute path and kind of index (``suffix``) in the cache directory."""
+    if index_dir is None:
+        from ai_cli.settings import settings  # pydantic is slow to import, only pay for it when caching
+
+        index_dir = settings.CACHE_DIR / "index"
+    key = hashlib.sha1(os.fsencode(Path(path).resolve())).hexdigest()
+    return Path(index_dir) / f"{key}{suffix}"
+
+
+def read_index(path):
+    """Return the header fields and records of the index file at ``path``, parsing each version of it once."""
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if (loaded := LOADED_INDEXES.get(path)) and loaded[0] == version:
+        return loaded[1], list(loaded[2])
+    data = path.read_bytes()
+    header = HEADER.unpack_from(data)
+    records, pos = [], HEADER.size
+    while pos < len(data):
+        start, stop, bits = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        records.append((start, stop, bits, data[pos : pos + (bits + 7) // 8]))
+        pos += (bits + 7) // 8
+    remember_index(path, version, header, records)
+    return header, records
+
+
+def remember_index(path, version, header, records):
+    LOADED_INDEXES.pop(path, None)
+    if len(LOADED_INDEXES) >= MAX_LOADED_INDEXES:
+        del LOADED_INDEXES[next(iter(LOADED_INDEXES))]
+    LOADED_INDEXES[path] = (version, header, tuple(records))
+
+
+def fold(block, encoding=ENCODING):
+    """Case-fold a block of lines the way ``LineFilter`` folds each of them."""
+    block = normalize_newlines(block)
+    if block.isascii():
+        return block.lower()
+    return block.decode(encoding).lower().encode(encoding, "surrogateescape")
+
+
+def grams(data):
+    """Return the distinct 4-byte words at offsets multiple of ``STRIDE`` in ``data``, as little-endian integers."""
+    found = set()
+    for offset in range(0, GRAM, STRIDE):
+        words = array.array("I", data[offset : offset + (len(data) - offset) // GRAM * GRAM])
+        if sys.byteorder == "big":
+            words.byteswap()
+        found.update(words)
+    return found
+
+
+def needle_grams(needle):
+    """Return, for each possible alignment of ``needle`` in a block, the grams it then fully covers."""
+    return [[int.from_bytes(needle[i : i + GRAM], "little") for i in range(offset, len(needle) - GRAM + 1, STRIDE)] for offset in range(STRIDE)]
+
+
+def make_bloom(block_grams):
+    """Build a one-hash bloom filter of ``block_grams``, returning its size in bits and its bytes."""
+    bits = max(64, len(block_grams) * BITS_PER_GRAM)
+    slots = bytearray(bits)
+    deque(map(slots.__setitem__, map(bits.__rmod__, map(GRAM_HASH.__mul__, block_grams)), repeat(1)), maxlen=0)
+    # One byte per slot, packed into bits with slot i as bit i
+    return bits, int(slots.translate(TO_BINARY)[::-1], 2).to_bytes((bits + 7) // 8, "little")
+
+
+def bloom_has(bits, bloom, gram_list):
+    for gram in gram_list:
+        slot = gram * GRAM_HASH % bits
+        if not bloom[slot >> 3] >> (slot & 7) & 1:
+            return False
+    return True
+
+
+class BlockIndex:
+    """Bloom filters of the 4-byte words found in each block of whole lines of a file.
+
+    A block can only hold a line containing a needle of at least ``MIN_NEEDLE``
+    bytes if, for one of the needle's alignments, all the words it covers are in
+    the block's filter. The index records the identity of the file it was built
+    from: it is dropped when the file is replaced, shrinks or is rewritten, and
+    extended when lines are appended to it.
+    """
+
+    def __init__(self, path, stat, mark=b"", end=0, records=None):
+        self.path = path
+        self.stat = stat
+        self.mark = mark
+        self.end = end
+        self.records = records or []
+        self.changed = not records
+
+    @classmethod
+    def load(cls, path, input_file):
+        """Load the index at ``path`` for the open ``input_file``, or start an empty one if it is stale."""
+        stat = os.fstat(input_file.fileno())
+        try:
+            (magic, dev, ino, size, mtime_ns, end, mark), records = read_index(path)
+        except (OSError, struct.error):
+            return cls(path, stat)
+        if magic != MAGIC or (dev, ino) != (stat.st_dev, stat.st_ino) or stat.st_size < size:
+            return cls(path, stat)
+        # Only appending keeps the index: the size grew and the last indexed bytes are still there
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns) and (stat.st_size == size or read_mark(input_file, end) != mark):
+            return cls(path, stat)
+
+        index = cls(path, stat, mark, end, records)
+        index.changed = (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+        return index
+
+    def add(self, start, end, block, encoding=ENCODING):
+        """Index the block of whole lines read from ``[start, end)``."""
+        try:
+            bits, bloom = make_bloom(grams(fold(block, encoding)))
+        except UnicodeDecodeError:
+            bits, bloom = 0, b""
+        self.records.append((start, end, bits, bloom))
+        self.end = end
+        self.mark = block[-MARK_SIZE:].rjust(MARK_SIZE, b"\0")
+        self.changed = True
+
+    def candidates(self, line_filter):
+        """Yield the ``(start, end)`` ranges of the indexed blocks that may hold matching lines."""
+        if line_filter.nothing:
+            return
+        needles = [sub.lower().encode(line_filter.encoding, "surrogateescape") for sub in line_filter.substrings]
+        # Needles too short to cover a gram cannot rule a block out
+        probes = [needle_grams(needle) for needle in needles if len(needle) >= MIN_NEEDLE]
+        if line_filter.everything or (line_filter.mode == ANY and len(probes) < len(needles)):
+            probes = []
+        test = any if line_filter.mode == ANY and probes else all
+
+        for start, end, bits, bloom in self.records:
+            if not bits or test(any(bloom_has(bits, bloom, gram_list) for gram_list in alignments) for alignments in probes):
+                yield start, end
+
+    def save(self):
+        """Write the index atomically, if it changed. An unwritable cache only costs the speed-up."""
+        if not self.changed:
+            return
+        header = HEADER.pack(MAGIC, self.stat.st_dev, self.stat.st_ino, self.stat.st_size, self.stat.st_mtime_ns, self.end, self.mark)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".index.")
+        except OSError:
+            return
+        try:
+            with open(fd, "wb") as f:
+                f.write(header)
+                for start, end, bits, bloom in self.records:
+                    f.write(RECORD.pack(start, end, bits))
+                    f.write(bloom)
+            os.replace(tmp_path, self.path)
+            saved = os.stat(self.path)
+            remember_index(self.path, (saved.st_ino, saved.st_size, saved.st_mtime_ns), HEADER.unpack(header), self.records)
+        except OSError:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+
+
+def read_mark(input_file, end):
+    return os.pread(input_file.fileno(), min(MARK_SIZE, end), max(0, end - MARK_SIZE)).rjust(MARK_SIZE, b"\0")
+
+
+def iter_line_ranges(input_file, start, block_size=INDEX_BLOCK):
+    """Yield ``(start, end, data)`` for blocks of whole lines read from ``start``.
+
+    Blocks end right after a ``\\n``, except the last one when the file does not.
+    """
+    input_file.seek(start)
+    carry = b""
+    while chunk := stats.read(input_file.read, block_size):
+        data = carry + chunk
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            yield start, start + cut, data[:cut]
+            start += cut
+        carry = data[cut:]
+    if carry:
+        yield start, start + len(carry), carry
+
+
+def scan_indexed(input_file, index, output_file, line_filter, block_size=INDEX_BLOCK):
+    """Filter an open file with the help of its loaded ``index``, extending the index with appended lines."""
+    for start, end in index.candidates(line_filter):
+        input_file.seek(start)
+        if matched := stats.match(line_filter, normalize_newlines(stats.read(input_file.read, end - start))):
+            stats.write(output_file, matched)
+
+    for start, end, block in iter_line_ranges(input_file, index.end, block_size):
+        if block.endswith(b"\n"):
+            index.add(start, end, block, line_filter.encoding)
+        if matched := stats.match(line_filter, normalize_newlines(block)):
+            stats.write(output_file, matched)
+
+
+def filter_indexed(path, output_file, line_filter, index_dir=None, block_size=INDEX_BLOCK):
+    """Filter a regular file with the help of its block index, building or extending the index on the way.
+
+    Indexed blocks are only read when their bloom filter says they may match; lines
+    appended since the last run are filtered and indexed. A trailing line with no
+    newline yet is filtered but not indexed, so it is read again next time.
+    """
+    with open(path, "rb") as input_file:
+        index = BlockIndex.load(index_path(path, index_dir), input_file)
+        scan_indexed(input_file, index, output_file, line_filter, block_size)
+    index.save()
@@ -0,0 +1,124 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+import os
+from pathlib import Path
+
+from ai_cli import stats
+from ai_cli.commands.log.compressed import DECOMPRESSION_ERRORS, SUFFIXES, UnsupportedCompression, detect_file_compression, open_decompressed
+from ai_cli.commands.log.context import SEPARATOR, ContextFilter
+from ai_cli.commands.log.counts import LimitReached, MatchCounter
+from ai_cli.commands.log.engine import SNIFF_SIZE, iter_blocks, prefix_lines, sniff_binary
+from ai_cli.commands.log.index import filter_indexed
+from ai_cli.commands.log.mapped import filter_mapped
+from ai_cli.commands.log.writer import QueuedWriter, atomic_output
+
+# What filtering one input can fail with without the others being affected
+FILE_ERRORS = (UnicodeDecodeError, UnsupportedCompression, *DECOMPRESSION_ERRORS)
+
+
+def filtered_name(path):
+    """Return the default output name for ``path``: ``app.log`` -> ``app-filtered.log``.
+
+    Compression suffixes are dropped, as the output is always plain text.
+    """
+    path = Path(path)
+    if path.suffix in SUFFIXES:
+        path = path.with_suffix("")
+    return f"{path.stem}-filtered{path.suffix}"
+
+
+def output_paths(files, output_dir):
+    """Map each input to its own output under ``output_dir``, mirroring the inputs' directory layout."""
+    if not files:
+        return []
+    parents = [file.parent.resolve() for file in files]
+    root = Path(os.path.commonpath(parents))
+    return [output_dir / parent.relative_to(root) / filtered_name(file) for file, parent in zip(files, parents)]
+
+
+class PrefixedWriter:
+    """Binary writer putting a prefix in front of the whole lines written to it."""
+
+    def __init__(self, file, prefix):
+        self.file = file
+        self.prefix = prefix
+
+    def write(self, lines):
+        return self.file.write(prefix_lines(lines, self.prefix))
+
+
+def sniff_file(path, encoding):
+    """Raise ``BinaryFileError`` when the start of a file looks like binary data."""
+    with open(path, "rb") as f:
+        sniff_binary(f.read(SNIFF_SIZE), encoding)
+
+
+def scan_file(path, output_file, line_filter, compression, mapped=False, indexed=False):
+    if indexed and not compression:
+        filter_indexed(path, output_file, line_filter)
+    elif mapped and not compression:
+        filter_mapped(path, output_file, line_filter)
+    else:
+        with open_decompressed(path, compression) if compression else open(path, "rb") as input_file:
+            for block in iter_blocks(input_file):
+                if matched := stats.match(line_filter, block):
+                    stats.write(output_file, matched)
+
+
+def filter_file(path, output_path, line_filter, prefix=None, mapped=False, indexed=False, limit=None, context=None):
+    """Filter a whole input file, compressed or not, into ``output_path``, stopping after ``limit`` matches. Runs in a worker.
+
+    With ``context``, a ``(before, after, errors, numbered)`` tuple, matches are
+    written with the lines around them, and their line numbers if ``numbered``,
+    streaming the file whatever ``mapped`` and ``indexed`` say.
+    """
+    compression = detect_file_compression(path)
+    if not compression:
+        sniff_file(path, line_filter.encoding)
+    with atomic_output(output_path) as raw_file, QueuedWriter(raw_file) as output_file:
+        if context is not None:
+            before, after, errors, numbered = context
+            block_filter = ContextFilter(line_filter, before, after, limit, prefix, errors, numbered, separator=SEPARATOR if before or after else None)
+            with suppress(LimitReached):
+                scan_file(path, output_file, block_filter, compression)
+            return output_path
+        if prefix is not None:
+            output_file = PrefixedWriter(output_file, prefix)
+        if limit is None:
+            scan_file(path, output_file, line_filter, compression, mapped, indexed)
+        else:
+            with MatchCounter(output_file, limit) as counter:
+                scan_file(path, counter, line_filter, compression, mapped, indexed)
+    return output_path
+
+
+async def filter_files(files, outputs, line_filter, jobs, prefixed=False, mapped=False, indexed=False, limit=None, context=None):
+    """Filter each of ``files`` into the matching ``outputs`` path, ``jobs`` files at a time.
+
+    Files are filtered in worker processes, or in a single worker thread when
+    ``jobs`` is 1. Yields ``(file, output, error)`` in input order as soon as a file
+    and all the files before it are done, so merging overlaps filtering. ``error``
+    is the exception that made filtering that file fail, if any. With ``limit``,
+    each file stops being scanned after that many matching lines. ``context`` is
+    passed on to ``filter_file``.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor if jobs > 1 else ThreadPoolExecutor
+
+    with executor(max_workers=max(1, min(jobs, len(files)))) as pool:
+        tasks = [
+            loop.run_in_executor(pool, filter_file, file, output, line_filter, os.fsencode(str(file)) + b":" if prefixed else None, mapped, indexed, limit, context)
+            for file, output in zip(files, outputs)
+        ]
+        try:
+            for file, output, task in zip(files, outputs, tasks):
+                try:
+                    await task
+                except FILE_ERRORS as e:
+                    yield file, output, e
+                else:
+                    yield file, output, None
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,31 +1,339 @@
+import asyncio
+from contextlib import nullcontext, suppress
+import importlib.util
+import os
 from pathlib import Path
+import tempfile
 
 import aiofiles
 
+from ai_cli import stats
 from ai_cli.asyn import click
-from ai_cli.validators.files import validate_file_parent_dir_exists
+from ai_cli.commands.log.common import STDIO, expand_file_inputs, report_failure, silence_stdout
+from ai_cli.commands.log.compressed import DECOMPRESSION_ERRORS, MAGIC_SIZE, UnsupportedCompression, detect_compression, detect_file_compression, filter_compressed
+from ai_cli.commands.log.context import SEPARATOR, ContextFilter, filter_sharded_context
+from ai_cli.commands.log.counts import LimitReached, MatchCounter
+from ai_cli.commands.log.engine import ENCODING, ERRORS, SNIFF_SIZE, LineFilter, filter_blocks, read_blocks, read_stream_blocks, sniff_binary, write_block
+from ai_cli.commands.log.follow import follow
+from ai_cli.commands.log.index import filter_indexed
+from ai_cli.commands.log.inputs import filter_files, filtered_name, output_paths, sniff_file
+from ai_cli.commands.log.lines import line_number
+from ai_cli.commands.log.mapped import filter_mapped
+from ai_cli.commands.log.matcher import ALL, ANY
+from ai_cli.commands.log.query import QuerySyntaxError, compile_query
+from ai_cli.commands.log.results import filter_cached
+from ai_cli.commands.log.shards import append_file, filter_sharded, scan_range
+from ai_cli.commands.log.timerange import time_window
+from ai_cli.commands.log.validators import validate_encoding, validate_time
+from ai_cli.commands.log.writer import QueuedWriter, open_output
+from ai_cli.validators.files import validate_dir_exists, validate_file_parent_dir_exists
+
+
+async def filter_per_file(files, output_dir, line_filter, jobs, mapped, indexed, limit=None, context=None):
+    """Filter every input into its own output under ``output_dir``, up to ``limit`` lines each. Returns the number of inputs that failed."""
+    outputs = output_paths(files, output_dir)
+    for parent in {output.parent for output in outputs}:
+        parent.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    async for file, output, error in filter_files(files, outputs, line_filter, jobs, mapped=mapped, indexed=indexed, limit=limit, context=context):
+        if error is None:
+            click.echo(f"Generated filtered file at: {output}")
+            continue
+        output.unlink(missing_ok=True)
+        report_failure(file, error)
+        failed += 1
+    return failed
+
+
+async def filter_merged(files, output_file, line_filter, jobs, mapped, indexed, shard_dir=None, prefixed=True, limit=None, context=None):
+    """Filter every input into ``output_file``, in input order, each line prefixed with its file's path unless not ``prefixed``.
+
+    Each input stops being scanned after ``limit`` matching lines. With
+    ``context``, the lines of different inputs are separated like distant ones.
+    Returns the number of inputs that failed; their matches are left out.
+    """
+    failed = 0
+    written = False
+    before, after, *_ = context or (0, 0)
+    with tempfile.TemporaryDirectory(dir=shard_dir, prefix=".line-filter.") as tmp_dir:
+        shards = [Path(tmp_dir) / f"{i}.shard" for i in range(len(files))]
+        async for file, shard, error in filter_files(files, shards, line_filter, jobs, prefixed=prefixed, mapped=mapped, indexed=indexed, limit=limit, context=context):
+            if error is None:
+                if (before or after) and shard.stat().st_size:
+                    if written:
+                        await write_block(output_file, SEPARATOR)
+                    written = True
+                await asyncio.to_thread(append_file, output_file, shard)
+                continue
+            report_failure(file, error)
+            failed += 1
+    return failed
 
 
 @click.command(name="line-filter")
-@click.argument("file", type=click.Path(exists=True, file_okay=True, dir_okay=False))
-@click.argument("substrings", nargs=-1, required=True)
-@click.option("--output", "-o", type=click.Path(), help="Custom output file path", callback=validate_file_parent_dir_exists)
-async def log_line_filter(file, substrings, output):
-    """Filter lines containing all substrings (case-insensitive) from a text file"""
-    file = Path(file)
-    output = Path(output) if output else Path.cwd() / f"{file.stem}-filtered{file.suffix}"
-    output = output.expanduser().resolve()
-    output.parent.mkdir(parents=True, exist_ok=True)
+@click.argument("file", type=click.Path(allow_dash=True))
+@click.argument("substrings", nargs=-1)
+@click.option(
+    "--query",
+    "-q",
+    help='Query the lines must also match: words, "quoted text", /regex/ or /regex/i, field=value on JSON or logfmt lines (also !=, ~ for a regex, >, >=, <, <=), @time>=2025-04-20T10:00 on the line\'s first timestamp, combined with AND, OR, NOT and parentheses',
+)
+@click.option("--since", callback=validate_time, help="Only keep lines stamped at or after this time, such as 2025-04-20T10:02 (ISO-8601 or Common Log Format timestamps, compared as written)")
+@click.option("--until", callback=validate_time, help="Only keep lines stamped before this time")
+@click.option("--input", "-i", "extra_inputs", multiple=True, help="Another file, directory or quoted glob pattern to scan, repeatable")
+@click.option("--output", "-o", type=click.Path(allow_dash=True), help="Custom output file path, '-' for stdout (default when FILE is '-')", callback=validate_file_parent_dir_exists)
+@click.option("--output-dir", "-d", type=click.Path(file_okay=False), help="Write one filtered file per input into this directory instead of merging them", callback=validate_dir_exists)
+@click.option("--any", "match_any", is_flag=True, help="Keep lines containing any of the substrings instead of all of them")
+@click.option("--case-sensitive", "-s", is_flag=True, help="Match substrings and query words with their case, skipping case folding")
+@click.option("--encoding", default=ENCODING, show_default=True, callback=validate_encoding, help="Encoding of the inputs, UTF-8 or a single-byte one such as latin-1")
+@click.option(
+    "--errors",
+    type=click.Choice(ERRORS),
+    default="surrogateescape",
+    show_default=True,
+    help="Undecodable bytes: fail (strict), write matching lines as they are (surrogateescape), replace the bytes (replace) or drop the lines (skip)",
+)
+@click.option("--after-context", "-A", type=click.IntRange(min=0), help="Also write this many lines after each matching line")
+@click.option("--before-context", "-B", type=click.IntRange(min=0), help="Also write this many lines before each matching line")
+@click.option("--context", "-C", "context_lines", type=click.IntRange(min=0), help="Also write this many lines before and after each matching line")
+@click.option("--line-number", "-n", "numbered", is_flag=True, help="Put the line number in front of each line, followed by ':' on matching lines and '-' on context lines")
+@click.option("--count", "-c", "counting", is_flag=True, help="Print the number of matching lines instead of writing them, and with several SUBSTRINGS how many lines hold each")
+@click.option("--max-matches", "-m", type=click.IntRange(min=1), help="Stop scanning after this many matching lines")
+@click.option("--first", is_flag=True, help="Stop scanning at the first matching line, like --max-matches 1")
+@click.option("--jobs", "-j", type=click.IntRange(min=0), default=1, show_default=True, help="Worker processes filtering files, or byte ranges of a single file, in parallel (0: one per CPU)")
+@click.option("--mmap", "mapped", is_flag=True, help="Scan regular files through a memory map instead of reading them")
+@click.option("--numpy", "vectorized", is_flag=True, help="Find line breaks and common substrings with vectorized NumPy operations over whole blocks (needs the 'numpy' extra)")
+@click.option("--follow", "-f", "following", is_flag=True, help="Keep following FILE for appended lines, across truncation and rotation")
+@click.option("--index", "indexed", is_flag=True, help="Keep a block index of uncompressed inputs in the cache dir, so later queries only read blocks that may match")
+@click.option("--cache", "cached", is_flag=True, help="Reuse the stored result of the same query on an unchanged FILE, extending it when lines were appended")
+async def log_line_filter(
+    file,
+    substrings,
+    query,
+    since,
+    until,
+    extra_inputs,
+    output,
+    output_dir,
+    match_any,
+    case_sensitive,
+    encoding,
+    errors,
+    after_context,
+    before_context,
+    context_lines,
+    numbered,
+    counting,
+    max_matches,
+    first,
+    jobs,
+    mapped,
+    vectorized,
+    following,
+    indexed,
+    cached,
+):
+    """Filter lines containing all substrings (case-insensitive) from text files or stdin ('-')
+
+    FILE may also be a directory, scanned recursively, or a quoted glob pattern such
+    as '/var/log/app/*.log*'. Several inputs are merged into one output with each
+    line prefixed by its file's path, unless --output-dir is given.
+
+    With --query, literals the query needs are searched for first, and only lines
+    holding them are checked against its regexes, fields and timestamps.
+
+    With --since or --until, a single uncompressed file in time order is
+    binary-searched for the lines in that range, and only those are scanned.
+    Lines without a timestamp go with the stamped line before them. Other inputs
+    are scanned whole, keeping lines whose own timestamp is in range.
+
+    With -A, -B or -C, groups of matching lines and their context are separated
+    by '--' lines. Context is kept in a bounded buffer while streaming, and
+    crosses the byte ranges of --jobs; --mmap, --index and --cache are not used.
+    With -n, --since and --until find the number of the first line in range with
+    the line index kept in the cache dir, as 'log slice' does.
+
+    Matches are written by a separate thread while the next blocks are read and
+    matched. Output files are written under a temporary name and renamed into
+    place once complete, so a failed run leaves no partial output, except with
+    --follow.
+
+    With --count, matching lines are counted without being written anywhere.
+    With --max-matches or --first, inputs are scanned until enough lines match,
+    in a single process.
+
+    Lines are matched as bytes, so undecodable bytes only matter in matching
+    lines, as --errors says. Inputs holding NUL bytes in their first few KB are
+    taken for binary files and fail right away.
+    """
+    if not substrings and query is None and since is None and until is None:
+        raise click.UsageError("Give SUBSTRINGS to look for, a --query, --since/--until, or a combination")
+    from_stdin = file == STDIO
+    if from_stdin and (extra_inputs or output_dir):
+        raise click.UsageError("stdin ('-') cannot be combined with other inputs or --output-dir")
+    if output and output_dir:
+        raise click.UsageError("--output and --output-dir are mutually exclusive")
+    files = [] if from_stdin else expand_file_inputs([file, *extra_inputs])
+    many = len(files) > 1 or output_dir is not None
+    if following and many:
+        raise click.UsageError("--follow takes a single FILE")
+    if following and from_stdin:
+        raise click.UsageError("--follow needs a FILE, stdin is already read as it grows")
+    if counting and (output or output_dir or following):
+        raise click.UsageError("--count writes no lines, it cannot be combined with --output, --output-dir or --follow")
+    if first and max_matches is not None:
+        raise click.UsageError("--first and --max-matches are mutually exclusive")
+    if vectorized and importlib.util.find_spec("numpy") is None:
+        raise click.UsageError("--numpy needs the 'numpy' package, installed with: pip install 'ai-cli[numpy]'")
+    limit = 1 if first else max_matches
+    before = before_context if before_context is not None else context_lines or 0
+    after = after_context if after_context is not None else context_lines or 0
+    # Counting leaves context and line numbers out, like grep does
+    context = (before, after, errors, numbered) if (before or after or numbered) and not counting else None
+    if context:
+        # Context and line numbers run across blocks: the index skipping them, the mapped scan writing lines one by one and stored results do not apply
+        mapped = indexed = cached = False
+
+    file = STDIO if from_stdin else str(files[0])
+    seekable = not from_stdin and Path(file).is_file()
+    stdin = click.get_binary_stream("stdin") if from_stdin else None
+    with stats.phase("open"):
+        if many:
+            compression = None
+        elif seekable:
+            compression = detect_file_compression(file)
+        else:
+            peek = getattr(stdin, "peek", None)
+            compression = detect_compression(peek(MAGIC_SIZE)) if peek else None
+    if following and compression:
+        raise click.UsageError("--follow does not support compressed files")
+    to_stdout = str(output) == STDIO if output else from_stdin
+    if output_dir:
+        output_dir = output_dir.expanduser().resolve()
+        files = [f for f in files if output_dir not in f.resolve().parents]
+    elif not to_stdout and not counting:
+        output = Path(output) if output else Path.cwd() / ("filtered.log" if many else filtered_name(file))
+        output = output.expanduser().resolve()
+        output.parent.mkdir(parents=True, exist_ok=True)
+        files = [f for f in files if f.resolve() != output]
+
+    time_range = since is not None or until is not None
+    window = None
+    if time_range and seekable and not compression and not many and not following:
+        window = await asyncio.to_thread(time_window, file, since, until)
+    mode = ANY if match_any else ALL
+    # Counting the lines holding each substring scans for those holding any, the counter then picks the matching ones
+    hits = counting and len(substrings) > 1
+    scan_mode = ANY if hits else mode
+    # Context finds matching lines back by their bytes, it replaces undecodable bytes itself
+    scan_errors = "surrogateescape" if context and errors == "replace" else errors
+    if query is None and (not time_range or window):
+        line_filter = LineFilter(substrings, mode=scan_mode, encoding=encoding, case_sensitive=case_sensitive, errors=scan_errors, vectorized=vectorized)
+    else:
+        try:
+            # Without a window to scan, the timestamp of every line is checked
+            line_filter = compile_query(query, substrings, scan_mode, encoding, None if window else since, None if window else until, case_sensitive, scan_errors, vectorized)
+        except QuerySyntaxError as e:
+            raise click.BadParameter(str(e), param_hint="--query") from None
+    selector = LineFilter(substrings, mode, encoding, case_sensitive, errors) if scan_mode != mode else None
+    hit_filters = [LineFilter([sub], ALL, encoding, case_sensitive, errors) for sub in substrings] if hits else []
+    jobs = jobs or os.cpu_count() or 1
+    if (limit or numbered) and not many:
+        # Stopping early beats scanning every byte range to the end in parallel, and lines are numbered in order
+        jobs = 1
+    first_line = 1
+    if numbered and window and window[0]:
+        # The line index finds the number of the first line in the window without counting the lines before it
+        first_line = await asyncio.to_thread(line_number, file, window[0]) + 1
+    block_filter = (
+        ContextFilter(line_filter, before, after, limit, errors=errors, numbered=numbered, first_line=first_line, separator=SEPARATOR if before or after else None)
+        if context and not many
+        else line_filter
+    )
+    shard_dir = None if to_stdout or output_dir or counting else output.parent
+    failed = 0
+    counter = None
+
+    async def scan(output_file):
+        if compression:
+            await filter_compressed(stdin or file, compression, output_file, block_filter, 1 if context else jobs, shard_dir)
+        elif window and jobs > 1 and context:
+            await filter_sharded_context(file, output_file, line_filter, before, after, jobs, shard_dir, start=window[0], end=window[1], errors=errors)
+        elif window:
+            if jobs > 1:
+                await filter_sharded(file, output_file, line_filter, jobs, mapped, shard_dir, start=window[0], end=window[1])
+            else:
+                await asyncio.to_thread(scan_range, file, output_file, block_filter, *window, mapped)
+        elif seekable and indexed:
+            await asyncio.to_thread(filter_indexed, file, output_file, line_filter)
+        elif seekable and jobs > 1 and context:
+            await filter_sharded_context(file, output_file, line_filter, before, after, jobs, shard_dir, errors=errors)
+        elif seekable and jobs > 1:
+            await filter_sharded(file, output_file, line_filter, jobs, mapped, shard_dir)
+        elif seekable and mapped:
+            await asyncio.to_thread(filter_mapped, file, output_file, line_filter)
+        elif from_stdin:
+            await filter_blocks(read_stream_blocks(stdin), output_file, block_filter)
+        else:
+            async with aiofiles.open(file, mode="rb") as input_file:
+                await filter_blocks(read_blocks(input_file), output_file, block_filter)
 
     try:
-        async with aiofiles.open(file, mode="r") as input_file, aiofiles.open(output, mode="w") as output_file:
-            async for line in input_file:
-                line_lower = line.lower()
-                if all(sub.lower() in line_lower for sub in substrings):
-                    await output_file.write(line)
+        with stats.phase("open"):
+            if seekable and not compression and not many:
+                await asyncio.to_thread(sniff_file, file, encoding)
+            elif from_stdin and not compression and peek:
+                sniff_binary(peek(SNIFF_SIZE), encoding)
+        if output_dir:
+            failed = await filter_per_file(files, output_dir, line_filter, jobs, mapped, indexed, limit, context)
+        else:
+            if counting:
+                sink = nullcontext()
+            elif to_stdout:
+                sink = nullcontext(click.get_binary_stream("stdout"))
+            else:
+                # A followed output shows lines as they come, others only appear once complete
+                sink = open_output(output, atomic=not following)
+            with sink as output_file, nullcontext() if counting else QueuedWriter(output_file) as writer:
+                output_file = writer or output_file
+                if counting or (limit and not context):
+                    output_file = counter = MatchCounter(output_file, limit, selector, hit_filters)
+                with counter or suppress(LimitReached):
+                    if many:
+                        failed = await filter_merged(files, output_file, line_filter, jobs, mapped, indexed, shard_dir, prefixed=not counting, limit=limit, context=context)
+                    elif following:
+                        await follow(file, output_file, block_filter)
+                    elif seekable and cached:
+                        # Lines appended after a window ending at --until may be past it, and are not filtered by time
+                        appendable = not compression and not (window and until)
+                        key = [scan_mode, query, since, until] if query or time_range else None
+                        await filter_cached(file, output_file, line_filter, substrings, scan, appendable=appendable, query=key, case_sensitive=case_sensitive)
+                    else:
+                        await scan(output_file)
     except UnicodeDecodeError:
         click.echo("Error: File is not a text file", err=True)
         ctx = click.get_current_context()
         ctx.exit(code=1)
+    except BrokenPipeError:
+        silence_stdout()
+        return
+    except UnsupportedCompression as e:
+        click.echo(f"Error: {e}", err=True)
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
+    except DECOMPRESSION_ERRORS as e:
+        if not compression:
+            raise
+        click.echo(f"Error: Could not decompress {file}: {e}", err=True)
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
 
-    click.echo(f"Generated filtered file at: {output}")
+    if counting:
+        click.echo(counter.count)
+        for sub, count in zip(substrings, counter.hits):
+            click.echo(f"{sub}\t{count}")
+    elif not to_stdout and not output_dir:
+        click.echo(f"Generated filtered file at: {output}")
+    if failed:
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
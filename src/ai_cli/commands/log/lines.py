@@ -0,0 +1,202 @@
+import array
+from bisect import bisect_right
+from contextlib import suppress
+from itertools import accumulate
+import os
+import struct
+import sys
+import tempfile
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, number_lines
+from ai_cli.commands.log.index import INDEX_BLOCK, MARK_SIZE, index_path, iter_line_ranges, read_mark
+from ai_cli.commands.log.shards import SYNC_SIZE, RangeReader
+
+MAGIC = b"LNINDEX1"
+# Magic, device, inode, size and mtime of the file when indexed, end and number of the indexed lines, stride, last bytes indexed
+HEADER = struct.Struct("<8sQQQqQQI64s")
+SUFFIX = ".lines"
+# Every this many lines, the offset of the line is kept: 8 bytes per 1024 lines
+LINE_STRIDE = 1024
+
+
+class LineIndex:
+    """Byte offsets of every ``stride``-th line of a file, so line ``n`` is found with one seek and a read of under ``stride`` lines.
+
+    Lines end with ``\\n``. Only whole lines are indexed: an unterminated last
+    line is read again next time. Like ``BlockIndex``, the index records the
+    identity of its file, is dropped when the file is replaced, shrinks or is
+    rewritten, and is extended when lines are appended to it.
+    """
+
+    def __init__(self, path, stat, stride=LINE_STRIDE, mark=b"", end=0, lines=0, offsets=None):
+        self.path = path
+        self.stat = stat
+        self.stride = stride
+        self.mark = mark
+        self.end = end
+        self.lines = lines
+        self.offsets = offsets if offsets is not None else array.array("Q")
+        self.changed = offsets is None
+
+    @classmethod
+    def load(cls, path, input_file, stride=LINE_STRIDE):
+        """Load the index at ``path`` for the open ``input_file``, or start an empty one if it is stale."""
+        stat = os.fstat(input_file.fileno())
+        try:
+            data = path.read_bytes()
+            magic, dev, ino, size, mtime_ns, end, lines, saved_stride, mark = HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return cls(path, stat, stride)
+        if magic != MAGIC or saved_stride != stride or (dev, ino) != (stat.st_dev, stat.st_ino) or stat.st_size < size:
+            return cls(path, stat, stride)
+        # Only appending keeps the index: the size grew and the last indexed bytes are still there
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns) and (stat.st_size == size or read_mark(input_file, end) != mark):
+            return cls(path, stat, stride)
+
+        offsets = array.array("Q", data[HEADER.size :])
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        index = cls(path, stat, stride, mark, end, lines, offsets)
+        index.changed = (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns)
+        return index
+
+    def update(self, input_file, until=None, until_line=None, block_size=INDEX_BLOCK):
+        """Index the whole lines past the indexed ones, up to the end of the file, or only up to byte ``until`` or line ``until_line``."""
+        if (until is not None and until < self.end) or (until_line is not None and until_line < self.lines):
+            return
+        for start, end, block in iter_line_ranges(input_file, self.end, block_size):
+            if not block.endswith(b"\n"):
+                break
+            lines = block.split(b"\n")
+            lines.pop()
+            # Line i of the block starts after the i lines before it and their line breaks
+            first = -self.lines % self.stride
+            if first < len(lines):
+                starts = list(accumulate(map(len, lines), initial=start))
+                self.offsets.extend(starts[i] + i for i in range(first, len(lines), self.stride))
+            self.lines += len(lines)
+            self.end = end
+            self.mark = block[-MARK_SIZE:].rjust(MARK_SIZE, b"\0")
+            self.changed = True
+            if (until is not None and until < end) or (until_line is not None and until_line < self.lines):
+                break
+
+    def line_offset(self, input_file, number):
+        """Return the offset of line ``number``, counting from 0, or the size of the file past its last line."""
+        if number >= self.lines:
+            return skip_lines(input_file, self.end, number - self.lines)
+        sample = number // self.stride
+        return skip_lines(input_file, self.offsets[sample], number - sample * self.stride)
+
+    def line_number(self, input_file, offset):
+        """Return how many lines end before byte ``offset``, which is the number of the line it is in, counting from 0."""
+        if offset >= self.end:
+            return self.lines + count_lines_between(input_file, self.end, offset)
+        sample = bisect_right(self.offsets, offset) - 1
+        return sample * self.stride + count_lines_between(input_file, self.offsets[sample], offset)
+
+    def save(self):
+        """Write the index atomically, if it changed. An unwritable cache only costs the speed-up."""
+        if not self.changed:
+            return
+        header = HEADER.pack(MAGIC, self.stat.st_dev, self.stat.st_ino, self.stat.st_size, self.stat.st_mtime_ns, self.end, self.lines, self.stride, self.mark)
+        offsets = self.offsets
+        if sys.byteorder == "big":
+            offsets = array.array("Q", offsets)
+            offsets.byteswap()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".lines.")
+        except OSError:
+            return
+        try:
+            with open(fd, "wb") as f:
+                f.write(header)
+                f.write(offsets)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+        except OSError:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+
+
+def skip_lines(input_file, pos, count):
+    """Return the offset right after the ``count`` lines starting at ``pos``, or the size of the file if it has fewer."""
+    while count:
+        chunk = os.pread(input_file.fileno(), SYNC_SIZE, pos)
+        if not chunk:
+            break
+        found = chunk.count(b"\n")
+        if found < count:
+            count -= found
+            pos += len(chunk)
+            continue
+        cut = -1
+        for _ in range(count):
+            cut = chunk.find(b"\n", cut + 1)
+        return pos + cut + 1
+    return pos if count == 0 else os.fstat(input_file.fileno()).st_size
+
+
+def tail_offset(input_file, count):
+    """Return the offset of the last ``count`` lines of ``input_file``, reading it backwards from its end."""
+    fd = input_file.fileno()
+    size = os.fstat(fd).st_size
+    if not count:
+        return size
+    # A final line break ends the last line, it does not start another one
+    pos = size - 1 if size and os.pread(fd, 1, size - 1) == b"\n" else size
+    while pos > 0:
+        step = min(SYNC_SIZE, pos)
+        pos -= step
+        chunk = os.pread(fd, step, pos)
+        found = chunk.count(b"\n")
+        if found < count:
+            count -= found
+            continue
+        cut = len(chunk)
+        for _ in range(count):
+            cut = chunk.rfind(b"\n", 0, cut)
+        return pos + cut + 1
+    return 0
+
+
+def write_range(input_file, output_file, start, end, first_line=None):
+    """Write the ``[start, end)`` byte range of ``input_file``, its lines numbered from ``first_line`` unless it is None."""
+    reader = RangeReader(input_file, start, end)
+    carry = b""
+    while chunk := stats.read(reader.read, BLOCK_SIZE):
+        if first_line is None:
+            stats.write(output_file, chunk)
+            continue
+        data = carry + chunk
+        cut = data.rfind(b"\n") + 1
+        stats.write(output_file, number_lines(data[:cut], first_line))
+        first_line += data.count(b"\n", 0, cut)
+        carry = data[cut:]
+    if carry:
+        stats.write(output_file, number_lines(carry, first_line))
+
+
+def count_lines_between(input_file, start, end):
+    """Count the line breaks in the ``[start, end)`` byte range of ``input_file``."""
+    found = 0
+    while start < end and (chunk := os.pread(input_file.fileno(), min(SYNC_SIZE, end - start), start)):
+        found += chunk.count(b"\n")
+        start += len(chunk)
+    return found
+
+
+def open_line_index(path, input_file, index_dir=None, until=None, until_line=None):
+    """Load the line index of ``path``, open as ``input_file``, bring it up to date as far as ``update`` says and save it."""
+    index = LineIndex.load(index_path(path, index_dir, SUFFIX), input_file)
+    index.update(input_file, until, until_line)
+    index.save()
+    return index
+
+
+def line_number(path, offset, index_dir=None):
+    """Return the number, counting from 0, of the line of ``path`` holding byte ``offset``, with the help of its line index."""
+    with open(path, "rb") as input_file:
+        return open_line_index(path, input_file, index_dir, offset).line_number(input_file, offset)
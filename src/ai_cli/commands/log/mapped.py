@@ -0,0 +1,88 @@
+import mmap
+import os
+import re
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, normalize_newlines
+from ai_cli.commands.log.matcher import ALL
+
+# Bytes that case folding may change, or that may belong to a line break
+UNSTABLE = re.compile(rb"[a-z\n\r\x80-\xff]+")
+LINE_BREAKS = re.compile(rb"[\n\r]+")
+MIN_ANCHOR = 3
+
+
+def raw_anchor(line_filter):
+    """Return the longest needle fragment that case folding leaves untouched, if any.
+
+    Neither ``bytes.lower`` nor ``str.lower`` changes ASCII digits and punctuation,
+    or maps anything else onto them, so every matching line holds such a fragment
+    verbatim and it can be searched for in the raw mapped bytes. Without case
+    folding, whole needles are. Lines whose undecodable bytes get replaced are
+    not written as they are mapped, so they are not looked for this way.
+    """
+    if line_filter.mode != ALL or line_filter.nothing or line_filter.everything or line_filter.errors == "replace":
+        return None
+    unstable = LINE_BREAKS if line_filter.case_sensitive else UNSTABLE
+    runs = [run for needle in line_filter.matcher.needles for run in unstable.split(needle)]
+    anchor = max(runs, key=len, default=b"")
+    return anchor if len(anchor) >= MIN_ANCHOR else None
+
+
+def iter_windows(mm, start, end, window):
+    """Yield ``(start, end)`` windows of about ``window`` bytes ending on a newline."""
+    while start < end:
+        stop = min(start + window, end)
+        if stop < end:
+            stop = mm.rfind(b"\n", start, stop) + 1 or mm.find(b"\n", stop, end) + 1 or end
+        yield start, stop
+        start = stop
+
+
+def anchored_spans(mm, start, end, anchor, line_filter):
+    """Yield the spans of matching lines, visiting only lines holding ``anchor``."""
+    find, rfind = mm.find, mm.rfind
+    pos = find(anchor, start, end)
+    while pos != -1:
+        line_start = rfind(b"\n", start, pos) + 1 or start
+        line_end = find(b"\n", pos, end) + 1 or end
+        if line_filter.line_matches(mm[line_start:line_end]):
+            yield line_start, line_end
+        pos = find(anchor, line_end, end)
+
+
+def filter_mapped(path, output_file, line_filter, start=0, end=None, window=BLOCK_SIZE):
+    """Filter the ``[start, end)`` byte range of a regular file through a read-only memory map.
+
+    When the query has a fragment unaffected by case folding, candidate lines are
+    found with ``find`` on the mapping itself and matching spans are written
+    straight from it. Otherwise each window is copied once and handed to the
+    block filter. Pages are released once scanned, keeping resident memory flat.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else end
+        if start >= end:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+            anchor = raw_anchor(line_filter)
+            view = memoryview(mm)
+            try:
+                for window_start, window_end in iter_windows(mm, start, end, window):
+                    # Lines ending in "\r" need newline translation, which the block filter does
+                    stats.count(reads=1, bytes_read=window_end - window_start)
+                    if anchor is not None and mm.find(b"\r", window_start, window_end) == -1:
+                        # Lines are only looked at around the anchor, they are not counted
+                        with stats.phase("match"):
+                            # Spans are gathered into one write per window, copied out of the mapping once
+                            matched = b"".join([view[line_start:line_end] for line_start, line_end in anchored_spans(mm, window_start, window_end, anchor, line_filter)])
+                        if matched:
+                            stats.write(output_file, matched)
+                    elif matched := stats.match(line_filter, normalize_newlines(mm[window_start:window_end])):
+                        stats.write(output_file, matched)
+                    page = window_start - window_start % mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, page, window_end - page)
+            finally:
+                view.release()
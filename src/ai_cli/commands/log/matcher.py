@@ -0,0 +1,136 @@
+import functools
+import re
+
+ALL = "all"
+ANY = "any"
+
+# Bytes of the first block used to estimate how common each needle is
+SAMPLE_SIZE = 256 * 1024
+
+
+def _chain(node, prefix=b""):
+    """Follow a run of single-child, non-terminal trie nodes."""
+    while len(node) == 1 and None not in node:
+        ((byte, node),) = node.items()
+        prefix += bytes((byte,))
+    return prefix, node
+
+
+def _trie_pattern(node):
+    prefix, node = _chain(node)
+    branches = [re.escape(bytes((byte,))) + _trie_pattern(child) for byte, child in sorted((k, v) for k, v in node.items() if k is not None)]
+    if not branches:
+        return re.escape(prefix)
+    body = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+    # Longer needles are tried first, so the longest needle starting at a position wins
+    if None in node:
+        body = b"(?:" + body + b")?"
+    return re.escape(prefix) + body
+
+
+def compile_needles(needles):
+    """Compile needles into a trie-shaped alternation.
+
+    Common prefixes are shared, so each position of the subject is rejected after
+    looking at a handful of bytes no matter how many needles there are.
+    """
+    trie = {}
+    for needle in needles:
+        node = trie
+        for byte in needle:
+            node = node.setdefault(byte, {})
+        node[None] = True
+    return re.compile(_trie_pattern(trie))
+
+
+@functools.lru_cache(maxsize=128)
+def compile_matcher(needles):
+    """Compile a tuple of needles into the single-match and overlapping patterns, once per process."""
+    pattern = compile_needles(needles)
+    return pattern, re.compile(b"(?=(" + pattern.pattern + b"))")
+
+
+class Matcher:
+    """Multi-pattern matcher built once per invocation from case-folded needles.
+
+    ``pattern`` finds the leftmost occurrence of any needle in one pass and backs
+    ``ANY`` scans. ``ALL`` scans anchor on the rarest needle and check the others
+    from rarest to most common, so most candidate lines are rejected after one
+    lookup. ``hits`` reports every needle present in a line, including overlapping
+    ones, in a single pass.
+    """
+
+    def __init__(self, needles, mode=ALL):
+        self.mode = mode
+        self.needles = sorted(set(needles), key=len, reverse=True)
+        self.index = {needle: i for i, needle in enumerate(self.needles)}
+        # A needle found at some position implies every needle contained in it
+        self.implied = [frozenset(j for j, other in enumerate(self.needles) if other in needle) for needle in self.needles]
+        self.pattern, self.overlapping = compile_matcher(tuple(self.needles))
+        self.order = None
+
+    def calibrate(self, sample):
+        """Order needles from rarest to most common in ``sample`` for ALL checks."""
+        counts = {needle: sample.count(needle) for needle in self.needles}
+        self.order = sorted(self.needles, key=lambda needle: (counts[needle], -len(needle)))
+
+    def __len__(self):
+        return len(self.needles)
+
+    def hits(self, lowered):
+        """Return the indices of all needles found in ``lowered``."""
+        found = set()
+        index, implied = self.index, self.implied
+        for match in self.overlapping.finditer(lowered):
+            found |= implied[index[match.group(1)]]
+        return found
+
+    def matches(self, lowered):
+        """Tell whether ``lowered`` satisfies the matcher's ALL/ANY semantics."""
+        if self.mode == ANY:
+            return self.pattern.search(lowered) is not None
+        return all(map(lowered.__contains__, self.order or self.needles))
+
+    def scan(self, lowered, original):
+        """Return the lines of ``original`` whose lowered form matches.
+
+        ``lowered`` and ``original`` must have the same length. Only lines holding
+        an occurrence of the anchor (ALL) or of any needle (ANY) are visited.
+        """
+        return [original[start:end] for start, end in self.spans(lowered)]
+
+    def spans(self, lowered):
+        """Return the ``(start, end)`` offsets of the matching lines of ``lowered``, in order."""
+        if self.mode == ANY:
+            return self._spans_any(lowered)
+        return self._spans_all(lowered)
+
+    def _spans_all(self, lowered):
+        if self.order is None:
+            self.calibrate(lowered[:SAMPLE_SIZE])
+        anchor, rest = self.order[0], self.order[1:]
+        find, rfind, size = lowered.find, lowered.rfind, len(lowered)
+        matched = []
+
+        pos = find(anchor)
+        while pos != -1:
+            start = rfind(b"\n", 0, pos) + 1
+            end = find(b"\n", pos) + 1 or size
+            if not rest or all(map(lowered[start:end].__contains__, rest)):
+                matched.append((start, end))
+            pos = find(anchor, end)
+        return matched
+
+    def _spans_any(self, lowered):
+        search = self.pattern.search
+        find, rfind, size = lowered.find, lowered.rfind, len(lowered)
+        matched = []
+
+        match = search(lowered)
+        while match is not None:
+            pos = match.start()
+            start = rfind(b"\n", 0, pos) + 1
+            end = find(b"\n", pos) + 1 or size
+            matched.append((start, end))
+            match = search(lowered, end)
+        return matched
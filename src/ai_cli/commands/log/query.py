@@ -0,0 +1,507 @@
+from functools import cached_property
+import json
+import re
+
+from ai_cli.commands.log.engine import ENCODING, LineFilter, check_decodable, clean_lines, is_decodable
+from ai_cli.commands.log.matcher import ALL, ANY, Matcher
+from ai_cli.commands.log.timerange import TIME_VALUE, find_time, normalize_time
+
+KEYWORDS = {"AND", "OR", "NOT"}
+FIELD_TERM = re.compile(r"(@?[A-Za-z_][\w.-]*)(!=|>=|<=|=|~|>|<)(.*)", re.DOTALL)
+TIME_FIELD = "@time"
+LOGFMT_PAIR = re.compile(r'([A-Za-z_][\w.-]*)=("(?:[^"\\]|\\.)*"|\S*)')
+# Keys and values made of these are written verbatim by JSON encoders and logfmt, so the line must contain them
+VERBATIM = re.compile(r"[A-Za-z0-9_.:@+ -]+")
+# Regex literals shorter than this are not worth a prefilter pass
+MIN_REGEX_LITERAL = 2
+# Letters that IGNORECASE matches against non-ASCII characters str.lower leaves alone (ı, ſ)
+UNSTABLE_FOLDS = {"i", "s"}
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+class Line:
+    """A line being checked, with the forms predicates need computed once, when first needed."""
+
+    def __init__(self, raw, encoding=ENCODING):
+        self.raw = raw
+        self.encoding = encoding
+
+    @cached_property
+    def lowered(self):
+        return self.raw.lower()
+
+    @cached_property
+    def text(self):
+        # Blocks are checked for undecodable bytes before lines are, unless those are tolerated
+        return self.raw.decode(self.encoding, "surrogateescape")
+
+    @cached_property
+    def lowered_text(self):
+        return self.text.lower()
+
+    @cached_property
+    def content(self):
+        return self.text.rstrip("\n")
+
+    @cached_property
+    def fields(self):
+        """Fields of a JSON object line, or else of a logfmt line, with numbers as they are written."""
+        content = self.content.strip()
+        if content.startswith("{"):
+            try:
+                fields = json.loads(content, parse_int=str, parse_float=str)
+            except ValueError:
+                fields = None
+            if isinstance(fields, dict):
+                return fields
+        return {key: unquote(value) for key, value in LOGFMT_PAIR.findall(self.content)}
+
+    @cached_property
+    def timestamp(self):
+        """The first date and time in the line, normalized to compare as a string."""
+        return find_time(self.content)
+
+
+def unquote(value):
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def lookup(fields, name):
+    """Return the value of a field as text, following dots into nested JSON objects."""
+    value = fields.get(name, fields)
+    if value is fields:
+        for key in name.split("."):
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+
+class Literal:
+    """Lines containing ``text``, case-insensitively unless ``case_sensitive``, like ``LineFilter`` matches substrings."""
+
+    cost = 1
+
+    def __init__(self, text, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.text = text if case_sensitive else text.lower()
+        self.needle = self.text.encode(ENCODING, "surrogateescape")
+        # Prefilters fold case, so they only decide case-insensitive literals on their own
+        self.exact = not case_sensitive
+
+    def requirements(self):
+        return [frozenset([self.text.lower()])]
+
+    def matches(self, line):
+        if self.case_sensitive:
+            return self.needle in line.raw
+        if self.needle in line.lowered:
+            return True
+        return not line.raw.isascii() and self.text in line.lowered_text
+
+
+class Regex:
+    """Lines where a regular expression matches, on their text without the line break."""
+
+    cost = 2
+    exact = False
+
+    def __init__(self, pattern, flags=0):
+        try:
+            self.regex = re.compile(pattern, flags)
+        except re.error as e:
+            raise QuerySyntaxError(f"Invalid regex /{pattern}/: {e}") from None
+
+    def requirements(self):
+        return regex_requirements(self.regex.pattern, self.regex.flags)
+
+    def matches(self, line):
+        return self.regex.search(line.content) is not None
+
+
+class Field:
+    """Lines whose JSON or logfmt field ``name`` compares to ``value``: ``=``, ``~`` (regex) or numerically."""
+
+    cost = 4
+    exact = False
+
+    def __init__(self, name, op, value):
+        self.name = name
+        self.op = op
+        self.value = value
+        if op == "~":
+            self.regex = Regex(value).regex
+        elif op != "=":
+            self.number = number(value)
+            if self.number is None:
+                raise QuerySyntaxError(f"{name}{op}{value}: {op} compares numbers")
+
+    def requirements(self):
+        literals = [key for key in self.name.split(".") if VERBATIM.fullmatch(key)]
+        if self.op == "=" and VERBATIM.fullmatch(self.value):
+            literals.append(self.value)
+        return [frozenset([literal.lower()]) for literal in literals]
+
+    def matches(self, line):
+        value = lookup(line.fields, self.name)
+        if value is None:
+            return False
+        if self.op == "=":
+            return value == self.value
+        if self.op == "~":
+            return self.regex.search(value) is not None
+        found = number(value)
+        return found is not None and compare(found, self.op, self.number)
+
+
+class Time:
+    """Lines whose first timestamp compares to a possibly partial date and time; ``=`` matches a prefix."""
+
+    cost = 3
+    exact = False
+
+    def __init__(self, op, value):
+        if op not in {"=", ">", ">=", "<", "<="} or not TIME_VALUE.fullmatch(value):
+            raise QuerySyntaxError(f"{TIME_FIELD}{op}{value}: expected =, >, >=, < or <= and a date like 2025-04-20T10:00:00")
+        self.op = op
+        self.value = normalize_time(value)
+
+    def requirements(self):
+        return []
+
+    def matches(self, line):
+        timestamp = line.timestamp
+        if timestamp is None:
+            return False
+        if self.op == "=":
+            return timestamp.startswith(self.value)
+        return compare(timestamp, self.op, self.value)
+
+
+class Not:
+    exact = False
+
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+
+    def requirements(self):
+        return []
+
+    def matches(self, line):
+        return not self.child.matches(line)
+
+
+class And:
+    def __init__(self, children):
+        # Cheap checks first, so expensive ones only run on lines that passed them
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = max(child.cost for child in children)
+        self.exact = all(child.exact for child in children)
+
+    def requirements(self):
+        return [requirement for child in self.children for requirement in child.requirements()]
+
+    def matches(self, line):
+        return all(child.matches(line) for child in self.children)
+
+
+class Or:
+    def __init__(self, children):
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.cost = max(child.cost for child in children)
+        self.exact = all(isinstance(child, Literal) and child.exact for child in children)
+
+    def requirements(self):
+        """Each branch needs one of its own requirements, so the union of one per branch is needed."""
+        chosen = [best_requirement(child.requirements()) for child in self.children]
+        if any(requirement is None for requirement in chosen):
+            return []
+        return [frozenset().union(*chosen)]
+
+    def matches(self, line):
+        return any(child.matches(line) for child in self.children)
+
+
+def number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def compare(left, op, right):
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    if op == "<":
+        return left < right
+    return left <= right
+
+
+def best_requirement(requirements):
+    """Pick the requirement most likely to be selective: the one whose shortest literal is longest."""
+    return max(requirements, key=lambda requirement: (min(map(len, requirement)), -len(requirement)), default=None)
+
+
+def regex_requirements(pattern, flags):
+    """Extract literals any match of a regex must contain, as sets of which one is needed.
+
+    Only ASCII literals are used, lowered, with IGNORECASE splitting them at letters
+    it also matches outside ASCII, so a line matching the regex always contains
+    one literal of each set once lowered.
+    """
+    try:
+        from re import _constants as sre, _parser as sre_parse
+    except ImportError:  # Internal modules, best effort only
+        return []
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    return sequence_requirements(sre, parsed, bool(parsed.state.flags & re.IGNORECASE))
+
+
+def sequence_requirements(sre, items, ignorecase):
+    requirements, run = [], []
+
+    def flush():
+        if len(run) >= MIN_REGEX_LITERAL:
+            requirements.append(frozenset(["".join(run).lower()]))
+        run.clear()
+
+    for op, av in items:
+        if op is sre.LITERAL and av < 128 and not (ignorecase and chr(av).lower() in UNSTABLE_FOLDS):
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            requirements += sequence_requirements(sre, sub, (ignorecase or add_flags & re.IGNORECASE) and not del_flags & re.IGNORECASE)
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT, sre.POSSESSIVE_REPEAT) and av[0] >= 1:
+            requirements += sequence_requirements(sre, av[2], ignorecase)
+        elif op is sre.ATOMIC_GROUP:
+            requirements += sequence_requirements(sre, av, ignorecase)
+        elif op is sre.BRANCH:
+            chosen = [best_requirement(sequence_requirements(sre, branch, ignorecase)) for branch in av[1]]
+            if all(requirement is not None for requirement in chosen):
+                requirements.append(frozenset().union(*chosen))
+    flush()
+    return requirements
+
+
+def tokenize(text, case_sensitive=False):
+    """Split a query into ``(kind, value)`` tokens: parentheses, keywords and terms."""
+    tokens, pos = [], 0
+    while pos < len(text):
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+        elif char in "()":
+            tokens.append((char, char))
+            pos += 1
+        elif char in "\"'":
+            value, pos = read_quoted(text, pos)
+            tokens.append(("term", Literal(value, case_sensitive)))
+        elif char == "/":
+            pattern, pos = read_until(text, pos + 1, "/", "regex")
+            flags_end = pos
+            while flags_end < len(text) and text[flags_end].isalpha():
+                flags_end += 1
+            tokens.append(("term", Regex(pattern, regex_flags(text[pos:flags_end]))))
+            pos = flags_end
+        else:
+            end = pos
+            while end < len(text) and not text[end].isspace() and text[end] not in "()\"'":
+                end += 1
+            word = text[pos:end]
+            if match := FIELD_TERM.fullmatch(word):
+                name, op, value = match.groups()
+                if not value and end < len(text) and text[end] in "\"'":
+                    value, end = read_quoted(text, end)
+                tokens.append(("term", field_term(name, op, value)))
+            elif word in KEYWORDS:
+                tokens.append((word, word))
+            else:
+                tokens.append(("term", Literal(word, case_sensitive)))
+            pos = end
+    return tokens
+
+
+def read_quoted(text, pos):
+    value, end = read_until(text, pos + 1, text[pos], "string")
+    return re.sub(r"\\(.)", r"\1", value), end
+
+
+def read_until(text, pos, delimiter, what):
+    """Return the text up to an unescaped ``delimiter``, and the position after it."""
+    end = pos
+    while end < len(text) and text[end] != delimiter:
+        end += 2 if text[end] == "\\" else 1
+    if end >= len(text):
+        raise QuerySyntaxError(f"Unterminated {what} at position {pos}")
+    value = text[pos:end]
+    # Escaped delimiters stand for themselves, other escapes are kept for the regex
+    return value.replace("\\" + delimiter, delimiter) if what == "regex" else value, end + 1
+
+
+def regex_flags(letters):
+    flags = 0
+    for letter in letters:
+        if letter != "i":
+            raise QuerySyntaxError(f"Unknown regex flag '{letter}', only 'i' is supported")
+        flags |= re.IGNORECASE
+    return flags
+
+
+def field_term(name, op, value):
+    if name == TIME_FIELD:
+        return Time(op, value)
+    if name.startswith("@"):
+        raise QuerySyntaxError(f"Unknown field {name}, only {TIME_FIELD} is special")
+    if op == "!=":
+        return Not(Field(name, "=", value))
+    return Field(name, op, value)
+
+
+class Parser:
+    """Recursive descent over tokens: OR binds loosest, then AND (or juxtaposition), then NOT."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QuerySyntaxError("Empty query")
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise QuerySyntaxError(f"Unexpected '{self.tokens[self.pos][0]}'")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError("Unexpected end of query")
+        kind, value = self.take()
+        if kind == "(":
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QuerySyntaxError("Missing ')'")
+            self.take()
+            return node
+        if kind != "term":
+            raise QuerySyntaxError(f"Unexpected '{kind}'")
+        return value
+
+
+def parse_query(text, case_sensitive=False):
+    return Parser(tokenize(text, case_sensitive)).parse()
+
+
+class Plan:
+    """A query compiled into literal prefilters and a per-line predicate, usable wherever a ``LineFilter`` is.
+
+    Every literal a matching line must contain becomes a block-level ``LineFilter``
+    pass: those required together in one ALL pass, each set of alternatives in an
+    ANY pass. Only lines surviving them are decoded and checked against the
+    regexes, fields and timestamps of the query, cheapest predicates first. Queries
+    made of literals only are answered by the prefilters alone.
+    """
+
+    def __init__(self, node, encoding=ENCODING, errors="strict", vectorized=False):
+        self.node = node
+        self.encoding = encoding
+        self.errors = errors
+        requirements = node.requirements()
+        required = sorted({literal for requirement in requirements if len(requirement) == 1 for literal in requirement})
+        alternatives = sorted({requirement for requirement in requirements if len(requirement) > 1}, key=sorted)
+        self.prefilters = [LineFilter(required, ALL, encoding, errors=errors, vectorized=vectorized)] if required else []
+        self.prefilters += [LineFilter(sorted(alternative), ANY, encoding, errors=errors, vectorized=vectorized) for alternative in alternatives]
+
+        # The residual predicate leaves out what the prefilters already decide
+        if isinstance(node, And):
+            residual = [child for child in node.children if not child.exact]
+            self.residual = None if not residual else residual[0] if len(residual) == 1 else And(residual)
+        else:
+            self.residual = None if node.exact else node
+
+        # What the block index and memory-mapped scans use to skip data
+        first = self.prefilters[0] if self.prefilters else None
+        self.mode = first.mode if first else ALL
+        self.substrings = first.substrings if first else []
+        self.matcher = first.matcher if first else Matcher([], ALL)
+        self.nothing = any(prefilter.nothing for prefilter in self.prefilters)
+        self.everything = False
+        # Prefilters fold case, literals matched with case are checked again per line
+        self.case_sensitive = False
+
+    def __call__(self, block):
+        for prefilter in self.prefilters:
+            if not block:
+                return block
+            block = prefilter(block)
+        if self.residual is None or not block:
+            return block
+        if not self.prefilters and self.errors == "strict":
+            check_decodable(block, self.encoding)  # Surface undecodable input like a text-mode read would
+        matches = self.residual.matches
+        matched = b"".join(line for line in block.splitlines(keepends=True) if matches(Line(line, self.encoding)))
+        return matched if self.prefilters else clean_lines(matched, self.encoding, self.errors)
+
+    def line_matches(self, line):
+        if not all(prefilter.line_matches(line) for prefilter in self.prefilters):
+            return False
+        if not self.prefilters and self.errors == "skip" and not is_decodable(line, self.encoding):
+            return False
+        return self.residual is None or self.residual.matches(Line(line, self.encoding))
+
+
+def compile_query(query=None, substrings=(), mode=ALL, encoding=ENCODING, since=None, until=None, case_sensitive=False, errors="strict", vectorized=False):
+    """Compile a query, combined with the lines having all (or any) ``substrings`` and stamped from ``since`` until before ``until``, into a ``Plan``."""
+    nodes = [] if query is None else [parse_query(query, case_sensitive)]
+    if substrings:
+        literals = [Literal(sub, case_sensitive) for sub in substrings]
+        nodes += literals if mode == ALL else [literals[0] if len(literals) == 1 else Or(literals)]
+    if since:
+        nodes.append(Time(">=", since))
+    if until:
+        nodes.append(Time("<", until))
+    return Plan(nodes[0] if len(nodes) == 1 else And(nodes), encoding, errors, vectorized)
@@ -0,0 +1,212 @@
+import asyncio
+from contextlib import suppress
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, iter_blocks
+from ai_cli.commands.log.shards import RangeReader
+
+FINGERPRINT_SIZE = 4096
+HIT = "hit"
+APPEND = "append"
+
+
+def result_key(stat, substrings, mode, encoding, query=None, case_sensitive=False, errors="strict"):
+    """Identify a query on a file by its device and inode, the sorted, case-folded set of substrings, the query expression and how undecodable bytes are handled."""
+    key = [stat.st_dev, stat.st_ino, mode, encoding, sorted({sub if case_sensitive else sub.lower() for sub in substrings})]
+    if query is not None:
+        key.append(query)
+    if case_sensitive:
+        key.append("case-sensitive")
+    if errors != "strict":
+        key.append(errors)
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+
+def fingerprints(input_file, size):
+    """Hash the first and the last few KB of the first ``size`` bytes of a file."""
+
+    def digest(start, end):
+        return hashlib.sha1(os.pread(input_file.fileno(), end - start, start)).hexdigest()
+
+    return digest(0, min(size, FINGERPRINT_SIZE)), digest(max(0, size - FINGERPRINT_SIZE), size)
+
+
+def last_line_start(input_file, end):
+    """Return the offset right after the last ``\\n`` before ``end``, or 0."""
+    while end > 0:
+        start = max(0, end - BLOCK_SIZE)
+        newline = os.pread(input_file.fileno(), end - start, start).rfind(b"\n")
+        if newline != -1:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+class Tee:
+    """Binary writer copying everything written to it to several files."""
+
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, data):
+        for file in self.files:
+            file.write(data)
+        return len(data)
+
+    def flush(self):
+        for file in self.files:
+            file.flush()
+
+
+class CachedResult:
+    """The output of one query, stored with the size, mtime and fingerprints of the file it came from."""
+
+    def __init__(self, cache_dir, key):
+        self.cache_dir = Path(cache_dir)
+        self.data_path = self.cache_dir / f"{key}.out"
+        self.meta_path = self.cache_dir / f"{key}.json"
+        try:
+            self.meta = json.loads(self.meta_path.read_text())
+            if self.data_path.stat().st_size < self.meta["output_size"]:
+                self.meta = None
+        except (OSError, ValueError, KeyError):
+            self.meta = None
+
+    def state(self, input_file, stat, appendable=True):
+        """Tell whether the stored output is current (``HIT``), only misses appended lines (``APPEND``) or is stale."""
+        meta = self.meta
+        if meta is None or stat.st_size < meta["size"]:
+            return None
+        if list(fingerprints(input_file, meta["size"])) != [meta["head"], meta["tail"]]:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) == (meta["size"], meta["mtime_ns"]):
+            return HIT
+        if appendable and stat.st_size > meta["size"]:
+            return APPEND
+        return None
+
+    def copy_to(self, output_file, size=None):
+        with open(self.data_path, "rb") as data:
+            remaining = self.meta["output_size"] if size is None else size
+            while remaining and (chunk := data.read(min(BLOCK_SIZE, remaining))):
+                output_file.write(chunk)
+                remaining -= len(chunk)
+
+    def kept_output_size(self):
+        """Size of the stored output without the line matched in the file's unterminated last line, if any."""
+        size = self.meta["output_size"]
+        with open(self.data_path, "rb") as data:
+            data.seek(max(0, size - BLOCK_SIZE))
+            tail = data.read(size - data.tell())
+        if not tail or tail.endswith(b"\n"):
+            return size
+        newline = tail.rfind(b"\n")
+        if newline == -1:
+            return 0 if size <= BLOCK_SIZE else None
+        return size - len(tail) + newline + 1
+
+    def open_data(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=".result.", delete=False)
+
+    def store(self, data_file, input_file, stat):
+        """Make the output written to ``data_file`` the stored result for ``input_file`` as of ``stat``."""
+        head, tail = fingerprints(input_file, stat.st_size)
+        meta = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "head": head, "tail": tail, "output_size": data_file.tell()}
+        data_file.close()
+        os.replace(data_file.name, self.data_path)
+        with tempfile.NamedTemporaryFile("w", dir=self.cache_dir, prefix=".result.", delete=False) as f:
+            json.dump(meta, f)
+        os.replace(f.name, self.meta_path)
+        self.meta = meta
+
+
+def evict(cache_dir, max_size, keep=None):
+    """Delete the least recently used results until the stored outputs fit in ``max_size`` bytes."""
+    entries = []
+    for meta_path in Path(cache_dir).glob("*.json"):
+        data_path = meta_path.with_suffix(".out")
+        with suppress(OSError):
+            entries.append((meta_path.stat().st_mtime_ns, data_path.stat().st_size, meta_path, data_path))
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, meta_path, data_path in sorted(entries):
+        if total <= max_size:
+            break
+        if meta_path.stem == keep:
+            continue
+        with suppress(OSError):
+            meta_path.unlink()
+            data_path.unlink()
+        total -= size
+
+
+def filter_tail(input_file, output_file, line_filter, start, end):
+    for block in iter_blocks(RangeReader(input_file, start, end)):
+        if matched := stats.match(line_filter, block):
+            stats.write(output_file, matched)
+
+
+async def filter_cached(path, output_file, line_filter, substrings, scan, appendable=True, cache_dir=None, max_size=None, query=None, case_sensitive=False):
+    """Write the output of a query over ``path``, reusing the stored result when the file did not change.
+
+    When lines were appended since, only the new lines are filtered and the stored
+    result is extended. Otherwise ``scan(output_file)`` filters the whole file and
+    its output is stored as well. Results used least recently are evicted once
+    they take more than ``max_size`` bytes.
+    """
+    if cache_dir is None or max_size is None:
+        from ai_cli.settings import settings  # pydantic is slow to import, only pay for it when caching
+
+        cache_dir = settings.CACHE_DIR / "results" if cache_dir is None else cache_dir
+        max_size = settings.RESULT_CACHE_SIZE if max_size is None else max_size
+    cache_dir = Path(cache_dir)
+
+    with await asyncio.to_thread(open, path, "rb") as input_file:
+        stat = os.fstat(input_file.fileno())
+        key = result_key(stat, substrings, line_filter.mode, line_filter.encoding, query, case_sensitive, line_filter.errors)
+        cached = CachedResult(cache_dir, key)
+        state = cached.state(input_file, stat, appendable)
+
+        if state == HIT:
+            await asyncio.to_thread(cached.copy_to, output_file)
+            with suppress(OSError):
+                os.utime(cached.meta_path)
+            return
+
+        start = 0
+        kept = None
+        if state == APPEND:
+            start = last_line_start(input_file, cached.meta["size"])
+            # An unterminated last line is filtered again now that it may have grown
+            if b"\r" not in os.pread(input_file.fileno(), cached.meta["size"] - start, start):
+                kept = cached.kept_output_size()
+
+        try:
+            data_file = cached.open_data()
+        except OSError:
+            data_file = None
+        tee = Tee(output_file, data_file) if data_file else output_file
+        try:
+            if kept is not None:
+                await asyncio.to_thread(cached.copy_to, tee, kept)
+                await asyncio.to_thread(filter_tail, input_file, tee, line_filter, start, stat.st_size)
+            else:
+                await scan(tee)
+            # Only store what is known to match the file as it was when we started
+            if data_file and os.fstat(input_file.fileno()).st_size == stat.st_size:
+                with suppress(OSError):
+                    await asyncio.to_thread(cached.store, data_file, input_file, stat)
+                    data_file = None
+        finally:
+            if data_file:
+                data_file.close()
+                with suppress(OSError):
+                    os.unlink(data_file.name)
+
+    with suppress(OSError):
+        evict(cache_dir, max_size, keep=key)
@@ -0,0 +1,167 @@
+import io
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+from ai_cli.commands.log.compressed import detect_file_compression, open_decompressed
+from ai_cli.commands.log.engine import BLOCK_SIZE, LineFilter
+from ai_cli.commands.log.index import BlockIndex, index_path, scan_indexed
+from ai_cli.commands.log.matcher import ALL, ANY
+
+# Bytes of query results kept in memory to answer narrower queries from
+MAX_RESULTS_SIZE = 256 * 1024 * 1024
+
+
+class Query:
+    """Lines holding every substring in ``required`` and at least one substring of each set in ``alternatives``.
+
+    Substrings are case-folded, like ``LineFilter`` matches them.
+    """
+
+    def __init__(self, required=(), alternatives=()):
+        self.required = frozenset(sub.lower() for sub in required)
+        self.alternatives = frozenset(frozenset(sub.lower() for sub in alternative) for alternative in alternatives)
+
+    @classmethod
+    def of(cls, substrings, mode=ALL):
+        return cls(substrings) if mode == ALL else cls(alternatives=[substrings])
+
+    def refine(self, substrings, mode=ALL):
+        """Return the query selecting the lines of this one that also match ``substrings``."""
+        new = Query.of(substrings, mode)
+        return Query(self.required | new.required, self.alternatives | new.alternatives)
+
+    def __eq__(self, other):
+        return (self.required, self.alternatives) == (other.required, other.alternatives)
+
+    def __hash__(self):
+        return hash((self.required, self.alternatives))
+
+    def __str__(self):
+        clauses = [repr(sub) for sub in sorted(self.required)]
+        clauses += ["(" + " OR ".join(repr(sub) for sub in sorted(alternative)) + ")" for alternative in sorted(self.alternatives, key=sorted)]
+        return " AND ".join(clauses)
+
+    def narrows(self, other):
+        """Tell whether every line this query selects is also selected by ``other``."""
+        if not other.required <= self.required:
+            return False
+        return all(alternative & self.required or any(mine <= alternative for mine in self.alternatives) for alternative in other.alternatives)
+
+    def line_filters(self):
+        filters = [LineFilter(sorted(self.required), ALL)] if self.required else []
+        return filters + [LineFilter(sorted(alternative), ANY) for alternative in self.alternatives]
+
+    def __call__(self, lines, line_filters=None):
+        """Return the lines of a block of whole lines that match."""
+        for line_filter in self.line_filters() if line_filters is None else line_filters:
+            lines = line_filter(lines)
+        return lines
+
+
+class Result:
+    """The lines selected by ``query``, found by scanning the result of ``searched``, or the whole file if ``None``."""
+
+    def __init__(self, query, lines, searched):
+        self.query = query
+        self.lines = lines
+        self.searched = searched
+
+    @property
+    def count(self):
+        return self.lines.count(b"\n") + (not self.lines.endswith(b"\n") and bool(self.lines))
+
+
+class OpenedLog:
+    """A log file kept open between queries, with its block index loaded.
+
+    A compressed file is decompressed once into a temporary file, indexed like an
+    uncompressed one, so memory does not grow with the log. Query results are
+    kept too, up to ``max_results_size`` bytes: a query selecting a subset of what
+    a kept result selected, such as one adding a substring, only scans that
+    result. Kept results and the index are dropped when the file is replaced or
+    rewritten; the index is extended when lines are appended to it.
+    """
+
+    def __init__(self, path, index_dir=None, max_results_size=MAX_RESULTS_SIZE):
+        self.path = os.path.abspath(path)
+        self.index_dir = index_dir
+        self.max_results_size = max_results_size
+        self.file = None
+        self.decompressed_dir = None
+        self.version = None
+        self.results = {}
+        self.reopen()
+
+    def reopen(self):
+        self.close()
+        self.compression = detect_file_compression(self.path)
+        self.file = open(self.path, "rb")  # noqa: SIM115 -- kept open between queries, closed by close()
+        self.version = version(os.fstat(self.file.fileno()))
+        self.results = {}
+        if self.compression:
+            self.decompressed_dir = tempfile.TemporaryDirectory(prefix="ai-cli-shell.")
+            decompressed_path = Path(self.decompressed_dir.name) / "decompressed.log"
+            with open_decompressed(self.file, self.compression) as decompressed, open(decompressed_path, "wb") as f:
+                shutil.copyfileobj(decompressed, f, BLOCK_SIZE)
+            self.file.close()
+            self.file = open(decompressed_path, "rb")  # noqa: SIM115 -- kept open between queries, closed by close()
+            self.index = BlockIndex.load(Path(self.decompressed_dir.name) / "decompressed.index", self.file)
+        else:
+            self.index = BlockIndex.load(index_path(self.path, self.index_dir), self.file)
+
+    def refresh(self):
+        """Pick up changes to the file since the last query."""
+        current = version(os.stat(self.path))
+        if current[:2] != self.version[:2] or (self.compression and current != self.version):
+            self.reopen()
+        elif current != self.version:
+            # Reloading checks whether lines were only appended, keeping the index then
+            self.index = BlockIndex.load(self.index.path, self.file)
+            self.version = current
+            self.results = {}
+
+    def filter(self, query, within=None):
+        """Return the ``Result`` of ``query``, only scanning ``within`` or the narrowest kept result it refines."""
+        self.refresh()
+        if cached := self.results.get(query):
+            self.keep(cached)
+            return cached
+        if within is None or self.results.get(within.query) is not within:
+            candidates = [result for result in self.results.values() if query.narrows(result.query)]
+            within = min(candidates, key=lambda result: len(result.lines), default=None)
+
+        if within is not None:
+            result = Result(query, query(within.lines), within.query)
+        else:
+            # The index can only rule blocks out for one filter, the others run on what it selected
+            first, *rest = query.line_filters() or [LineFilter([""])]
+            output = io.BytesIO()
+            scan_indexed(self.file, self.index, output, first)
+            self.index.save()
+            result = Result(query, query(output.getvalue(), rest), None)
+        self.keep(result)
+        return result
+
+    def keep(self, result):
+        """Remember ``result`` as the most recent one, forgetting the oldest ones beyond the size limit."""
+        self.results.pop(result.query, None)
+        self.results[result.query] = result
+        size = sum(len(kept.lines) for kept in self.results.values())
+        for query in list(self.results):
+            if size <= self.max_results_size or query == result.query:
+                break
+            size -= len(self.results.pop(query).lines)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.decompressed_dir is not None:
+            self.decompressed_dir.cleanup()
+            self.decompressed_dir = None
+
+
+def version(stat):
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
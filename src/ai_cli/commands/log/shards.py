@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from itertools import pairwise
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+from ai_cli import stats
+from ai_cli.commands.log.engine import BLOCK_SIZE, iter_blocks
+from ai_cli.commands.log.mapped import filter_mapped
+
+SYNC_SIZE = 64 * 1024
+
+
+def shard_ranges(path, jobs, min_size=BLOCK_SIZE, start=0, end=None):
+    """Split the ``[start, end)`` byte range of a file into at most ``jobs`` ``(start, end)`` byte ranges.
+
+    Every range but the first starts right after a ``\\n``, so no line (and no
+    ``\\r\\n`` pair) is ever split between two ranges. Ranges are at least
+    ``min_size`` bytes long, except possibly the last one.
+    """
+    end = os.path.getsize(path) if end is None else end
+    size = end - start
+    jobs = max(1, min(jobs, size // max(min_size, 1)))
+    bounds = [start]
+
+    with open(path, "rb") as f:
+        for i in range(1, jobs):
+            pos = max(start + size * i // jobs, bounds[-1] + 1)
+            f.seek(pos - 1)
+            while chunk := f.read(SYNC_SIZE):
+                newline = chunk.find(b"\n")
+                if newline != -1:
+                    pos += newline
+                    break
+                pos += len(chunk)
+            if pos >= end:
+                break
+            bounds.append(pos)
+
+    bounds.append(end)
+    return [(start, end) for start, end in pairwise(bounds) if end > start]
+
+
+class RangeReader:
+    """Read-only file view limited to the ``[start, end)`` byte range."""
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.remaining = end - start
+        file.seek(start)
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def scan_range(path, output_file, line_filter, start, end, mapped=False):
+    """Filter the ``[start, end)`` byte range of ``path`` into the binary ``output_file``."""
+    if mapped:
+        filter_mapped(path, output_file, line_filter, start, end)
+        return
+    with open(path, "rb") as input_file:
+        for block in iter_blocks(RangeReader(input_file, start, end)):
+            if matched := stats.match(line_filter, block):
+                stats.write(output_file, matched)
+
+
+def filter_range(path, start, end, line_filter, shard_path, mapped=False):
+    """Filter one byte range of ``path`` into ``shard_path``. Runs in a worker process."""
+    with open(shard_path, "wb") as output_file:
+        scan_range(path, output_file, line_filter, start, end, mapped)
+    return shard_path
+
+
+def append_file(output_file, path):
+    with open(path, "rb") as shard:
+        shutil.copyfileobj(shard, output_file, BLOCK_SIZE)
+    os.unlink(path)
+
+
+async def filter_sharded(file, output_file, line_filter, jobs, mapped=False, shard_dir=None, min_shard_size=BLOCK_SIZE, start=0, end=None):
+    """Filter ``file``, or its ``[start, end)`` byte range, into the binary ``output_file`` with ``jobs`` worker processes.
+
+    Each worker filters a newline-aligned byte range into its own shard file in a
+    temporary directory under ``shard_dir``. Shards are appended to the output in
+    file order as soon as they and all the shards before them are done, so merging
+    overlaps filtering.
+    """
+    ranges = shard_ranges(file, jobs, min_shard_size, start, end)
+    loop = asyncio.get_running_loop()
+
+    with (
+        tempfile.TemporaryDirectory(dir=shard_dir, prefix=".line-filter.") as tmp_dir,
+        ProcessPoolExecutor(max_workers=max(len(ranges), 1)) as pool,
+    ):
+        shards = [loop.run_in_executor(pool, filter_range, file, start, end, line_filter, Path(tmp_dir) / f"{i}.shard", mapped) for i, (start, end) in enumerate(ranges)]
+        try:
+            for shard in shards:
+                await asyncio.to_thread(append_file, output_file, await shard)
+        finally:
+            for shard in shards:
+                shard.cancel()
@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+from ai_cli import stats
+from ai_cli.asyn import click
+from ai_cli.commands.log.common import silence_stdout
+from ai_cli.commands.log.compressed import detect_file_compression
+from ai_cli.commands.log.lines import open_line_index, skip_lines, tail_offset, write_range
+
+file_argument = click.argument("file", type=click.Path(exists=True, dir_okay=False))
+numbered_option = click.option("--line-number", "-N", "numbered", is_flag=True, help="Put the line number and ':' in front of each line")
+
+
+def check_uncompressed(file):
+    with stats.phase("open"):
+        if detect_file_compression(file):
+            raise click.UsageError(f"{file} is compressed, its lines cannot be reached without decompressing it: use 'log line-filter' instead")
+
+
+async def write_to_stdout(find_range, file):
+    """Write to stdout the byte range of ``file`` that ``find_range(input_file)`` returns as ``(start, end, first_line)``, in a thread.
+
+    Lines are numbered from ``first_line`` unless it is None.
+    """
+
+    def run():
+        output_file = click.get_binary_stream("stdout")
+        with open(file, "rb") as input_file:
+            with stats.phase("open"):
+                start, end, first_line = find_range(input_file)
+            write_range(input_file, output_file, start, end, first_line)
+        output_file.flush()
+
+    check_uncompressed(file)
+    try:
+        await asyncio.to_thread(run)
+    except BrokenPipeError:
+        silence_stdout()
+
+
+@click.command(name="head")
+@file_argument
+@click.option("--lines", "-n", "count", type=click.IntRange(min=0), default=10, show_default=True, help="Number of lines to write")
+@numbered_option
+async def log_head(file, count, numbered):
+    """Write the first lines of FILE, reading only those."""
+    await write_to_stdout(lambda input_file: (0, skip_lines(input_file, 0, count), 1 if numbered else None), file)
+
+
+@click.command(name="tail")
+@file_argument
+@click.option("--lines", "-n", "count", type=click.IntRange(min=0), default=10, show_default=True, help="Number of lines to write")
+@numbered_option
+async def log_tail(file, count, numbered):
+    """Write the last lines of FILE, reading it backwards from its end.
+
+    With --line-number, the line index kept in the cache dir gives the number of
+    the first line written, counting only the lines appended since it was built.
+    """
+
+    def find_range(input_file):
+        start = tail_offset(input_file, count)
+        first_line = open_line_index(file, input_file, until=start).line_number(input_file, start) + 1 if numbered else None
+        return start, os.fstat(input_file.fileno()).st_size, first_line
+
+    await write_to_stdout(find_range, file)
+
+
+@click.command(name="slice")
+@file_argument
+@click.argument("start", type=click.IntRange(min=0))
+@click.argument("end", type=click.IntRange(min=0), required=False)
+@click.option("--bytes", "by_bytes", is_flag=True, help="START and END are byte offsets, counting from 0, widened to the whole lines holding them")
+@numbered_option
+async def log_slice(file, start, end, by_bytes, numbered):
+    """Write lines START to END of FILE, counting from 1, or from START to the end of FILE.
+
+    A line index kept in the cache dir holds the offset of every 1024th line, so
+    line START is reached with one seek and a read of less than 1024 lines. It is
+    built on first use, reading FILE up to END once, and extended as lines are
+    appended to FILE. With --bytes, START and END (included) are byte offsets.
+    """
+    if not by_bytes and start < 1:
+        raise click.BadParameter("lines count from 1", param_hint="START")
+    if end is not None and end < start:
+        raise click.BadParameter("END must not be before START", param_hint="END")
+
+    def find_range(input_file):
+        size = os.fstat(input_file.fileno()).st_size
+        if by_bytes:
+            index = open_line_index(file, input_file, until=start)
+            number = index.line_number(input_file, min(start, size))
+            first = index.line_offset(input_file, number)
+            last = size if end is None else skip_lines(input_file, min(end, size), 1)
+        else:
+            index = open_line_index(file, input_file, until_line=end or start)
+            number = start - 1
+            first = index.line_offset(input_file, number)
+            last = size if end is None else index.line_offset(input_file, end)
+        return first, last, number + 1 if numbered else None
+
+    await write_to_stdout(find_range, file)
@@ -0,0 +1,134 @@
+import json
+import os
+
+from ai_cli.asyn import click
+from ai_cli.commands.log.common import STDIO, expand_file_inputs, report_failure, silence_stdout
+from ai_cli.commands.log.compressed import DECOMPRESSION_ERRORS, MAGIC_SIZE, UnsupportedCompression, detect_compression, open_decompressed, read_decompressed_blocks
+from ai_cli.commands.log.engine import ENCODING, SNIFF_SIZE, LineFilter, read_stream_blocks, sniff_binary
+from ai_cli.commands.log.matcher import ALL, ANY
+from ai_cli.commands.log.summary import CAPACITY_FACTOR, MIN_CAPACITY, Summary, summarize_files, summarize_stream
+from ai_cli.commands.log.validators import validate_encoding, validate_time
+
+# Width of the longest bar of the per-minute histogram
+BAR_WIDTH = 40
+
+
+def format_summary(summary, top, encoding, histogram=True):
+    """Lay out the ``top`` templates and the per-minute histogram of ``summary`` as text lines."""
+    minutes = sorted(summary.minutes.items())
+    span = f", from {minutes[0][0]} to {minutes[-1][0]}" if minutes else ""
+    lines = [f"{summary.lines:,} lines, {summary.unstamped:,} without a timestamp{span}", ""]
+    rows = summary.templates.top(top)
+    if rows:
+        lines.append(f"{'COUNT':>12}  {'SHARE':>6}  {'FIRST':<16}  {'LAST':<16}  TEMPLATE")
+        for template, count, error, first, last in rows:
+            # Counts that may be overstated are marked, by how much is in --json
+            shown = f"{'~' if error else ''}{count:,}"
+            lines.append(f"{shown:>12}  {count / summary.lines:>6.1%}  {first or '-':<16}  {last or '-':<16}  {display(template, encoding)}")
+    if histogram and minutes:
+        peak = max(count for _, count in minutes)
+        lines += ["", f"{'MINUTE':<16}  {'LINES':>12}"]
+        lines += [f"{minute:<16}  {count:>12,}  {'#' * max(1, round(count * BAR_WIDTH / peak))}" for minute, count in minutes]
+    return lines
+
+
+def summary_json(summary, top, encoding):
+    return {
+        "lines": summary.lines,
+        "unstamped": summary.unstamped,
+        "templates": [{"template": display(template, encoding), "count": count, "error": error, "first": first, "last": last} for template, count, error, first, last in summary.templates.top(top)],
+        "minutes": dict(sorted(summary.minutes.items())),
+    }
+
+
+def display(template, encoding):
+    # Templates hold the line's bytes decoded as Latin-1
+    return template.encode("latin-1").decode(encoding, "replace")
+
+
+@click.command(name="summarize")
+@click.argument("file", type=click.Path(allow_dash=True))
+@click.argument("substrings", nargs=-1)
+@click.option("--query", "-q", help="Only summarize the lines matching this query, as line-filter --query takes it")
+@click.option("--since", callback=validate_time, help="Only summarize lines stamped at or after this time")
+@click.option("--until", callback=validate_time, help="Only summarize lines stamped before this time")
+@click.option("--input", "-i", "extra_inputs", multiple=True, help="Another file, directory or quoted glob pattern to summarize with FILE, repeatable")
+@click.option("--any", "match_any", is_flag=True, help="Summarize lines containing any of the substrings instead of all of them")
+@click.option("--case-sensitive", "-s", is_flag=True, help="Match substrings and query words with their case")
+@click.option("--encoding", default=ENCODING, show_default=True, callback=validate_encoding, help="Encoding of the inputs, UTF-8 or a single-byte one such as latin-1")
+@click.option("--top", "-k", type=click.IntRange(min=1), default=10, show_default=True, help="Number of message templates to list")
+@click.option("--histogram/--no-histogram", default=True, show_default=True, help="Also list the number of lines per minute")
+@click.option("--json", "as_json", is_flag=True, help="Write the summary as JSON, with the error bound of every count")
+@click.option("--jobs", "-j", type=click.IntRange(min=0), default=1, show_default=True, help="Worker processes summarizing files, or byte ranges of uncompressed files, in parallel (0: one per CPU)")
+async def log_summarize(file, substrings, query, since, until, extra_inputs, match_any, case_sensitive, encoding, top, histogram, as_json, jobs):
+    """Summarize text files or stdin ('-'): the most frequent message templates, and lines per minute
+
+    Lines are read once and turned into templates by masking their timestamps,
+    UUIDs, IP addresses, hex values and numbers. The most frequent templates are
+    kept by a Space-Saving sketch of a bounded number of counters, so memory does
+    not grow with the input: counts marked '~' may be overstated, by at most the
+    error --json lists with them. Only lines holding SUBSTRINGS
+    and matching --query, --since and --until are summarized, if given.
+
+    Lines are counted per minute of the ISO-8601 timestamp starting them or, for
+    other logs such as Common Log Format ones, of the first timestamp they hold.
+    Compressed inputs are decompressed as they are read.
+    """
+    from_stdin = file == STDIO
+    if from_stdin and extra_inputs:
+        raise click.UsageError("stdin ('-') cannot be combined with other inputs")
+    files = [] if from_stdin else expand_file_inputs([file, *extra_inputs])
+    mode = ANY if match_any else ALL
+    if query is None and since is None and until is None:
+        line_filter = LineFilter(substrings, mode, encoding, case_sensitive, "surrogateescape")
+    else:
+        from ai_cli.commands.log.query import QuerySyntaxError, compile_query  # The query parser is slow to import, only pay for it when used
+
+        try:
+            line_filter = compile_query(query, substrings, mode, encoding, since, until, case_sensitive, "surrogateescape")
+        except QuerySyntaxError as e:
+            raise click.BadParameter(str(e), param_hint="--query") from None
+    capacity = max(top * CAPACITY_FACTOR, MIN_CAPACITY)
+    jobs = jobs or os.cpu_count() or 1
+    summary = Summary(capacity)
+    failed = 0
+
+    try:
+        if from_stdin:
+            stdin = click.get_binary_stream("stdin")
+            peek = getattr(stdin, "peek", None)
+            compression = detect_compression(peek(MAGIC_SIZE)) if peek else None
+            if compression:
+                with open_decompressed(stdin, compression) as decompressed:
+                    summary = await summarize_stream(read_decompressed_blocks(decompressed), line_filter, capacity)
+            else:
+                if peek:
+                    sniff_binary(peek(SNIFF_SIZE), encoding)
+                summary = await summarize_stream(read_stream_blocks(stdin), line_filter, capacity)
+        else:
+            async for path, file_summary, error in summarize_files(files, line_filter, capacity, jobs):
+                if error is None:
+                    summary.merge(file_summary)
+                    continue
+                report_failure(path, error)
+                failed += 1
+    except UnicodeDecodeError:
+        click.echo("Error: File is not a text file", err=True)
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
+    except (UnsupportedCompression, *DECOMPRESSION_ERRORS) as e:
+        click.echo(f"Error: Could not decompress stdin: {e}", err=True)
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
+
+    try:
+        if as_json:
+            click.echo(json.dumps(summary_json(summary, top, encoding)))
+        else:
+            for line in format_summary(summary, top, encoding, histogram):
+                click.echo(line)
+    except BrokenPipeError:
+        silence_stdout()
+    if failed:
+        ctx = click.get_current_context()
+        ctx.exit(code=1)
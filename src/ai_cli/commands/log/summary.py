@@ -0,0 +1,249 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import heapq
+import re
+
+from ai_cli import stats
+from ai_cli.commands.log.compressed import detect_file_compression, open_decompressed
+from ai_cli.commands.log.engine import BLOCK_SIZE, iter_blocks
+from ai_cli.commands.log.inputs import FILE_ERRORS, sniff_file
+from ai_cli.commands.log.shards import RangeReader, shard_ranges
+from ai_cli.commands.log.timerange import FORMATS, find_time
+
+# Digits all become "0" before lines are told apart, the masks below still see numbers where they were
+BLANK_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+# An ISO-8601 timestamp to the minute starting a line, which is then cut at MINUTE_SIZE bytes
+TIME_PREFIX = re.compile(rb"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+MINUTE_SIZE = 16
+# Variable parts of a line, masked in this order, so an address is not taken for numbers. Lines are decoded as Latin-1, one character per byte
+MASKS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"(?<![\w.])\d{1,3}(?:\.\d{1,3}){3}(?::\d{1,5})?(?![\w.])"), "<IP>"),
+    (re.compile(r"(?<![\w:])(?:(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}|(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?::(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?)(?![\w:])"), "<IP>"),
+    (re.compile(r"\b0[xX][0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*[a-fA-F])(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b"), "<HEX>"),
+    (re.compile(r"\d+(?:[.,]\d+)*"), "<NUM>"),
+]
+# Counters kept by the sketch per template asked for: the more, the closer the counts of the last ones
+CAPACITY_FACTOR = 10
+MIN_CAPACITY = 1000
+
+
+def mask(text):
+    """Replace timestamps, UUIDs, IP addresses, hex values and numbers in ``text`` with placeholders, leaving line breaks as they are."""
+    for time_format in FORMATS:
+        text = time_format.pattern.sub("<TIME>", text)
+    for pattern, placeholder in MASKS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+class SpaceSaving:
+    """Space-Saving sketch of the most frequent keys of a stream, in ``capacity`` counters.
+
+    Keys with counters are counted exactly from the time they got one. A new key
+    takes the counter of the least counted key once all are used, starting from
+    its count, which is kept as the ``error`` the new count may overstate. Every
+    key seen more than ``total / capacity`` times holds a counter. The first and
+    last minute a key was seen are kept with its counter.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # Key: [count, error, first, last]
+        self.counters = {}
+        # (count, key) of every counter, possibly lower than the count since, fixed when popped
+        self.heap = []
+
+    def add(self, key, count=1, first=None, last=None):
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            counter[2] = earliest(counter[2], first)
+            counter[3] = latest(counter[3], last)
+            return
+        error = self._evict() if len(self.counters) >= self.capacity else 0
+        self.counters[key] = [count + error, error, first, last]
+        heapq.heappush(self.heap, (count + error, key))
+
+    def merge(self, other):
+        """Add the counts of ``other`` into this sketch, as the mergeable summaries of Agarwal et al. do.
+
+        A key missing from a full sketch may have been counted up to its least
+        count there, so that count is added, as an error, to every key the other
+        sketch holds alone. The ``capacity`` most counted keys are then kept.
+        """
+        floor, other_floor = self._floor(), other._floor()
+        missing, other_missing = (floor, floor, None, None), (other_floor, other_floor, None, None)
+        counters = {}
+        # Keys in a set order, for ties to be kept the same way every run
+        for key in self.counters | other.counters:
+            count, error, first, last = self.counters.get(key, missing)
+            other_count, other_error, other_first, other_last = other.counters.get(key, other_missing)
+            counters[key] = [count + other_count, error + other_error, earliest(first, other_first), latest(last, other_last)]
+        self.counters = dict(heapq.nlargest(self.capacity, counters.items(), key=lambda item: item[1][0]))
+        self.heap = [(counter[0], key) for key, counter in self.counters.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, k):
+        """Return the ``k`` most counted ``(key, count, error, first, last)``."""
+        return [(key, *counter) for key, counter in heapq.nlargest(k, self.counters.items(), key=lambda item: item[1][0])]
+
+    def _floor(self):
+        """Return the least count of a full sketch, the most a key it does not hold may have been seen, else 0."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def _evict(self):
+        """Drop the least counted key and return its count."""
+        while True:
+            count, key = heapq.heappop(self.heap)
+            if self.counters[key][0] == count:
+                del self.counters[key]
+                return count
+            heapq.heappush(self.heap, (self.counters[key][0], key))
+
+
+def earliest(a, b):
+    return b if a is None or (b is not None and b < a) else a
+
+
+def latest(a, b):
+    return b if a is None or (b is not None and b > a) else a
+
+
+class Summary:
+    """Message templates and per-minute line counts of a stream of blocks, in memory bounded by ``capacity`` and the minutes spanned.
+
+    Digits are blanked out of whole blocks first, which leaves few distinct line
+    shapes to count, and only those are masked into templates. Minutes come from
+    the ISO-8601 timestamp starting each line or, for logs stamped elsewhere in
+    the line such as Common Log Format ones, from the first timestamp found in
+    it. Lines without one are counted in ``unstamped``.
+    """
+
+    def __init__(self, capacity):
+        self.templates = SpaceSaving(capacity)
+        self.minutes = Counter()
+        self.lines = 0
+        self.unstamped = 0
+        # Whether lines start with their timestamp, once a stamped line was seen
+        self.leading = None
+
+    def add(self, block):
+        lines = block.split(b"\n")
+        shapes = block.translate(BLANK_DIGITS).split(b"\n")
+        if lines[-1] == b"":
+            lines.pop()
+            shapes.pop()
+        if self.leading is None:
+            stamped = next((line for line in lines if find_time(line.decode("latin-1"))), None)
+            if stamped is not None:
+                self.leading = TIME_PREFIX.match(stamped) is not None
+        stamps = [line[:MINUTE_SIZE] for line in lines] if self.leading else [line_minute(line) for line in lines]
+
+        minutes, templates, counts = {}, {}, {}
+        for (stamp, shape), count in Counter(zip(stamps, shapes)).items():
+            minute = minutes.get(stamp, False)
+            if minute is False:
+                minute = minutes[stamp] = stamp_minute(stamp) if self.leading else stamp
+            if minute is None:
+                self.unstamped += count
+            else:
+                self.minutes[minute] += count
+            template = templates.get(shape)
+            if template is None:
+                template = templates[shape] = mask(shape.decode("latin-1"))
+            counter = counts.get(template)
+            if counter is None:
+                counts[template] = [count, minute, minute]
+            else:
+                counter[0] += count
+                counter[1] = earliest(counter[1], minute)
+                counter[2] = latest(counter[2], minute)
+        self.lines += len(lines)
+        for template, (count, first, last) in counts.items():
+            self.templates.add(template, count, first, last)
+
+    def merge(self, other):
+        self.templates.merge(other.templates)
+        self.minutes.update(other.minutes)
+        self.lines += other.lines
+        self.unstamped += other.unstamped
+
+
+def stamp_minute(stamp):
+    """Return the ``YYYY-MM-DDTHH:MM`` minute of the first bytes of a line, or None if they are not a timestamp."""
+    return stamp.decode("latin-1").replace(" ", "T") if TIME_PREFIX.match(stamp) else None
+
+
+def line_minute(line):
+    stamp = find_time(line.decode("latin-1"))
+    return stamp[:MINUTE_SIZE] if stamp and len(stamp) >= MINUTE_SIZE else None
+
+
+def summarize_blocks(blocks, line_filter, capacity):
+    summary = Summary(capacity)
+    for block in blocks:
+        if matched := stats.match(line_filter, block):
+            summary.add(matched)
+    return summary
+
+
+def summarize_file(path, line_filter, capacity, byte_range=None):
+    """Summarize the lines of ``path`` that ``line_filter`` selects, or of its ``(start, end)`` byte range. Runs in a worker."""
+    if byte_range is None and (compression := detect_file_compression(path)):
+        with open_decompressed(path, compression) as input_file:
+            return summarize_blocks(iter_blocks(input_file), line_filter, capacity)
+    with open(path, "rb") as input_file:
+        blocks = iter_blocks(input_file) if byte_range is None else iter_blocks(RangeReader(input_file, *byte_range))
+        return summarize_blocks(blocks, line_filter, capacity)
+
+
+async def summarize_stream(blocks, line_filter, capacity):
+    """Summarize an async stream of blocks, such as stdin."""
+    summary = Summary(capacity)
+    async for block in blocks:
+        if matched := stats.match(line_filter, block):
+            summary.add(matched)
+    return summary
+
+
+async def summarize_files(files, line_filter, capacity, jobs, min_shard_size=BLOCK_SIZE):
+    """Summarize every file with ``jobs`` workers, processes when more than one, splitting uncompressed files into byte ranges.
+
+    Yields ``(file, summary, error)`` per file in input order, ``summary`` merging
+    those of its ranges, or ``error`` the exception that made it fail.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor if jobs > 1 else ThreadPoolExecutor
+
+    with executor(max_workers=jobs) as pool:
+        tasks = []
+        for file in files:
+            try:
+                compression = detect_file_compression(file)
+                if not compression:
+                    sniff_file(file, line_filter.encoding)
+                ranges = [None] if jobs == 1 or compression else shard_ranges(file, jobs, min_shard_size)
+            except FILE_ERRORS as e:
+                tasks.append(e)
+                continue
+            tasks.append([loop.run_in_executor(pool, summarize_file, str(file), line_filter, capacity, byte_range) for byte_range in ranges])
+        try:
+            for file, parts in zip(files, tasks):
+                summary = Summary(capacity)
+                try:
+                    if isinstance(parts, Exception):
+                        raise parts
+                    for part in parts:
+                        summary.merge(await part)
+                except FILE_ERRORS as e:
+                    yield file, None, e
+                else:
+                    yield file, summary, None
+        finally:
+            for parts in tasks:
+                for part in () if isinstance(parts, Exception) else parts:
+                    part.cancel()
@@ -0,0 +1,130 @@
+import os
+import re
+
+# A possibly partial ISO-8601 date and time, as given to --since, --until or @time
+TIME_VALUE = re.compile(r"\d{4}(-\d{2}(-\d{2}([T ]\d{2}(:\d{2}(:\d{2}([.,]\d+)?)?)?)?)?)?")
+MONTHS = {name: f"{i:02d}" for i, name in enumerate(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+# Bytes read from the start and the end of a file to detect its timestamp format
+SAMPLE_SIZE = 64 * 1024
+# Once the range left is this small, the binary search reads it line by line
+SCAN_SIZE = 64 * 1024
+
+
+def normalize_time(value):
+    """Write an ISO-8601 date and time so that comparing strings compares times."""
+    return value.replace(" ", "T").replace(",", ".")
+
+
+class TimeFormat:
+    """A timestamp format: where to find it in a line, and how to rewrite it as normalized ISO-8601."""
+
+    def __init__(self, pattern, normalize):
+        self.pattern = re.compile(pattern)
+        self.normalize = normalize
+
+    def find(self, text):
+        match = self.pattern.search(text)
+        return self.normalize(match) if match else None
+
+
+FORMATS = [
+    # 2025-04-20 10:00:01,123, 2025-04-20T10:00:01.123456Z, 2025-04-20
+    TimeFormat(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?))?", lambda m: normalize_time(m.group(1) + ("T" + m.group(2) if m.group(2) else ""))),
+    # Common Log Format, as Apache and nginx write it: [20/Apr/2025:10:00:01 +0000]
+    TimeFormat(r"\[(\d{2})/(" + "|".join(MONTHS) + r")/(\d{4}):(\d{2}:\d{2}:\d{2})", lambda m: f"{m.group(3)}-{MONTHS[m.group(2)]}-{m.group(1)}T{m.group(4)}"),
+]
+
+
+def find_time(text):
+    """Return the first timestamp of a line, in any known format, normalized; ``None`` if it has none."""
+    found = [(match, time_format) for time_format in FORMATS if (match := time_format.pattern.search(text))]
+    if not found:
+        return None
+    match, time_format = min(found, key=lambda match_format: match_format[0].start())
+    return time_format.normalize(match)
+
+
+def decode_line(line):
+    # Timestamps are ASCII, which Latin-1 decodes whatever the other bytes are
+    return line.decode("latin-1")
+
+
+def detect_format(f, size):
+    """Return the timestamp format of a time-ordered file.
+
+    ``None`` when the lines at its start have no timestamp in a known format, or
+    when the last timestamp is before the first one, so the file is not in time
+    order and cannot be binary-searched.
+    """
+    f.seek(0)
+    head = [decode_line(line) for line in f.read(SAMPLE_SIZE).splitlines()]
+    counts = {time_format: sum(time_format.find(line) is not None for line in head) for time_format in FORMATS}
+    time_format = max(counts, key=lambda f: counts[f])
+    if not counts[time_format]:
+        return None
+    f.seek(max(size - SAMPLE_SIZE, 0))
+    tail = [decode_line(line) for line in f.read(SAMPLE_SIZE).splitlines()]
+    first = next(stamp for line in head if (stamp := time_format.find(line)) is not None)
+    last = next((stamp for line in reversed(tail) if (stamp := time_format.find(line)) is not None), first)
+    return time_format if first <= last else None
+
+
+def next_stamped(f, pos, end, time_format):
+    """Return the offset and time of the first line starting in ``[pos, end)`` that has a timestamp, else ``(None, None)``.
+
+    ``f`` is left right after that line.
+    """
+    if pos > 0:
+        # Resync on the start of the next line, which is pos itself when a line ends right before it
+        f.seek(pos - 1)
+        f.readline()
+    else:
+        f.seek(0)
+    while (start := f.tell()) < end:
+        line = f.readline()
+        if not line:
+            break
+        if (stamp := time_format.find(decode_line(line))) is not None:
+            return start, stamp
+    return None, None
+
+
+def seek_time(f, size, target, time_format):
+    """Return the offset of the first line stamped at or after ``target`` in a time-ordered file, or ``size``.
+
+    Lines without a timestamp, such as the rest of a stack trace, belong with the
+    stamped line before them.
+    """
+    low, high = 0, size
+    # Stamped lines starting before low are before target, the first one starting at or after high is not
+    while high - low > SCAN_SIZE:
+        middle = (low + high) // 2
+        start, stamp = next_stamped(f, middle, high, time_format)
+        if start is None or stamp >= target:
+            high = middle
+        else:
+            low = f.tell()
+    while True:
+        start, stamp = next_stamped(f, low, size, time_format)
+        if start is None:
+            return size
+        if stamp >= target:
+            return start
+        low = f.tell()
+
+
+def time_window(path, since=None, until=None):
+    """Return the ``(start, end)`` byte range of a time-ordered file holding the lines from ``since`` until before ``until``.
+
+    Both are normalized times, possibly partial. Only about log2(size) lines are
+    read. ``None`` when the file has no timestamps in a known format or is not in
+    time order.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        time_format = detect_format(f, size)
+        if time_format is None:
+            return None
+        start = seek_time(f, size, since, time_format) if since else 0
+        end = seek_time(f, size, until, time_format) if until else size
+    return start, max(start, end)
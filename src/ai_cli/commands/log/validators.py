@@ -0,0 +1,25 @@
+from ai_cli.asyn import click
+from ai_cli.commands.log.engine import is_ascii_compatible
+from ai_cli.commands.log.timerange import TIME_VALUE, normalize_time
+
+
+def validate_encoding(ctx, param, value):
+    if value is None:
+        return None
+
+    try:
+        compatible = is_ascii_compatible(value)
+    except LookupError:
+        raise click.BadParameter(f"Unknown encoding {value!r}") from None
+    if not compatible:
+        raise click.BadParameter(f"{value!r} is not ASCII-compatible, lines are matched as bytes: use UTF-8 or a single-byte encoding such as latin-1 or cp1252")
+    return value
+
+
+def validate_time(ctx, param, value):
+    if value is None:
+        return None
+
+    if not TIME_VALUE.fullmatch(value):
+        raise click.BadParameter(f"{value!r} is not a date and time like 2025-04-20T10:02:00 or 2025-04-20")
+    return normalize_time(value)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from ai_cli.commands.log.matcher import ALL, ANY, SAMPLE_SIZE, Matcher
+
+NEWLINE = ord("\n")
+# Bytes per occurrence of the rarest ALL needle above which finding lines one occurrence at a time is faster
+SPARSE_SPACING = 512
+# Matching lines above which they are gathered with a byte mask instead of sliced one by one
+GATHER_LINES = 4096
+# Leading needle bytes compared over the whole block before indexing candidates
+HEAD_BYTES = 3
+
+
+def occurrences(data, needle):
+    """Return the offsets of ``needle`` in the ``uint8`` array ``data``, overlapping ones included.
+
+    The first few bytes are compared over the whole array, which leaves few
+    candidates, then the rest only where those matched.
+    """
+    limit = len(data) - len(needle) + 1
+    if limit <= 0:
+        return np.empty(0, np.intp)
+    head = min(len(needle), HEAD_BYTES)
+    mask = data[:limit] == needle[0]
+    equal = np.empty(limit, bool)
+    for k in range(1, head):
+        np.equal(data[k : k + limit], needle[k], out=equal)
+        mask &= equal
+    found = np.flatnonzero(mask)
+    for k in range(head, len(needle)):
+        if not len(found):
+            break
+        found = found[data[found + k] == needle[k]]
+    return found
+
+
+class VectorMatcher(Matcher):
+    """``Matcher`` working on whole blocks with NumPy where needles are common.
+
+    Newline offsets are found in one vectorized pass, every occurrence of each
+    needle in bulk, and occurrences mapped to line numbers with ``searchsorted``.
+    ALL lines are those marked by every needle, ANY lines those marked by one.
+    ANY scans are always vectorized, they replace a regex search visiting every
+    byte. ALL blocks where the rarest needle is rare are left to the ``find``
+    loop of ``Matcher``, which skips to the next occurrence at memory speed.
+    """
+
+    def spans(self, lowered):
+        lines = self._lines(lowered)
+        if lines is None:
+            return super().spans(lowered)
+        starts, ends, selected = lines
+        found = np.flatnonzero(selected)
+        return list(zip(starts[found].tolist(), ends[found].tolist()))
+
+    def scan(self, lowered, original):
+        lines = self._lines(lowered)
+        if lines is None:
+            return super().scan(lowered, original)
+        starts, ends, selected = lines
+        found = np.flatnonzero(selected)
+        if len(found) < GATHER_LINES:
+            return [original[start:end] for start, end in zip(starts[found].tolist(), ends[found].tolist())]
+        return [np.frombuffer(original, np.uint8)[np.repeat(selected, ends - starts)].tobytes()]
+
+    def _lines(self, lowered):
+        """Return the line ``(starts, ends)`` of ``lowered`` and a mask of the matching ones, or ``None`` for sparse needles."""
+        if self.mode == ALL:
+            if self.order is None:
+                self.calibrate(lowered[:SAMPLE_SIZE])
+            # Every matching line holds the rarest needle, its occurrences in the first bytes tell how common it is
+            if lowered.count(self.order[0], 0, SAMPLE_SIZE) * SPARSE_SPACING < min(len(lowered), SAMPLE_SIZE):
+                return None
+        needles = self.order if self.mode == ALL else self.needles
+
+        data = np.frombuffer(lowered, np.uint8)
+        newlines = np.flatnonzero(data == NEWLINE)
+        ends = np.append(newlines + 1, len(lowered))
+        starts = np.concatenate(([0], ends[:-1]))
+        selected = np.zeros(len(ends), bool) if self.mode == ANY else np.ones(len(ends), bool)
+        for needle in needles:
+            marked = np.zeros(len(ends), bool)
+            marked[np.searchsorted(newlines, occurrences(data, needle))] = True
+            if self.mode == ANY:
+                selected |= marked
+            else:
+                selected &= marked
+                if not selected.any():
+                    break
+        return starts, ends, selected
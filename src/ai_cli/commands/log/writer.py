@@ -0,0 +1,170 @@
+from contextlib import contextmanager, suppress
+import os
+import queue
+import secrets
+import threading
+
+# Blocks of matched lines waiting for the writer thread before writers wait for room
+WRITE_QUEUE = 8
+# Bytes gathered into one write when several blocks are waiting
+WRITE_BATCH = 8 * 1024 * 1024
+# Buffers handed to one writev call, within the IOV_MAX of every platform
+MAX_BUFFERS = 1024
+_CLOSE = object()
+
+
+class QueuedWriter:
+    """Binary writer handing whole lines to a dedicated writer thread through a bounded queue.
+
+    Reading and matching go on while earlier matches are written. Blocks waiting
+    in the queue are gathered into one ``os.writev`` call on the file descriptor,
+    or one write of the file object when it has none. Blocks are written as soon
+    as the thread gets to them, so downstream readers see lines without waiting
+    for a flush; ``flush`` waits for every queued block to be written. An error
+    of the thread, such as a broken pipe, is raised by the next ``write`` or by
+    ``close``, and the blocks queued after it are dropped. The thread starts
+    with the first write, after any worker process was forked.
+    """
+
+    def __init__(self, file, max_blocks=WRITE_QUEUE):
+        self.file = file
+        self.fd = None
+        if hasattr(os, "writev"):
+            with suppress(AttributeError, OSError, ValueError):
+                self.fd = file.fileno()
+        if self.fd is not None:
+            # What the file object buffered goes out before the thread writes past it
+            file.flush()
+        self.queue = queue.Queue(max_blocks)
+        self.error = None
+        self.closed = False
+        self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, data):
+        """Queue ``data``, waiting for room when the writer thread is behind."""
+        self._start()
+        self.queue.put(bytes(data))
+        return len(data)
+
+    def offer(self, data):
+        """Queue ``data`` if there is room right away, and tell whether it was queued."""
+        self._start()
+        try:
+            self.queue.put_nowait(bytes(data))
+        except queue.Full:
+            return False
+        return True
+
+    def flush(self):
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Write what is queued and stop the writer thread."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is None:
+            return
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _start(self):
+        if self.error is not None:
+            raise self.error
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch, size = [], 0
+            item = self.queue.get()
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+                size += len(item)
+                if size >= WRITE_BATCH or len(batch) >= MAX_BUFFERS or self.queue.empty():
+                    break
+                item = self.queue.get_nowait()
+            if batch and self.error is None:
+                try:
+                    self._write(batch)
+                except Exception as e:  # noqa: BLE001 -- raised by the next write or by close
+                    self.error = e
+            for _ in range(len(batch) + closing):
+                self.queue.task_done()
+
+    def _write(self, batch):
+        if self.fd is None:
+            self.file.write(batch[0] if len(batch) == 1 else b"".join(batch))
+            self.file.flush()
+            return
+        buffers = [memoryview(data) for data in batch]
+        first = 0
+        while first < len(buffers):
+            written = os.writev(self.fd, buffers[first:])
+            # A partial write leaves the rest of one buffer, and the ones after it, to write again
+            while first < len(buffers) and written >= len(buffers[first]):
+                written -= len(buffers[first])
+                first += 1
+            if written:
+                buffers[first] = buffers[first][written:]
+
+
+@contextmanager
+def atomic_output(path):
+    """Open ``path`` for writing as a temporary file next to it, renamed to ``path`` only once the ``with`` block succeeds.
+
+    Readers never see a partial output, and a failed or interrupted run leaves a
+    previous output in place. The file keeps the permissions of the one it
+    replaces, or gets those ``open`` would give a new one: the kernel applies the
+    umask, which is never changed, as other threads may be creating files.
+    """
+    fd, tmp_path = create_temporary(path)
+    try:
+        with open(fd, "wb") as f:
+            try:
+                os.chmod(fd, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def create_temporary(path):
+    """Create a new file with a random name next to ``path``, as ``open`` would create ``path``, and return its descriptor and path."""
+    directory, name = os.path.split(path)
+    while True:
+        tmp_path = os.path.join(directory or ".", f".{name}.{secrets.token_hex(4)}")
+        try:
+            return os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_CLOEXEC", 0), 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+@contextmanager
+def open_output(path, atomic=True):
+    """Open ``path`` for writing with ``atomic_output``, or in place so readers see lines as they are written."""
+    if atomic:
+        with atomic_output(path) as f:
+            yield f
+    else:
+        with open(path, "wb") as f:
+            yield f
@@ -0,0 +1,284 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, suppress
+from contextvars import ContextVar
+import ctypes
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+from ai_cli.asyn import click, loop_runner
+from ai_cli.client import MAX_REQUEST, check_private_dir, connect, private_dir, socket_path
+from ai_cli.metadata import NAME
+
+STDIO = ("stdin", "stdout", "stderr")
+CLONE_FS = 0x200
+
+# Streams of the request run by the current worker thread, and by the tasks and threads it starts
+request_streams = ContextVar("request_streams", default=None)
+# Held while running a request in a worker that could not get a working directory of its own
+cwd_lock = threading.Lock()
+worker = threading.local()
+
+
+class StreamProxy:
+    """Stand-in for ``sys.stdin``, ``sys.stdout`` or ``sys.stderr`` resolving to the current request's stream."""
+
+    def __init__(self, name, default):
+        self._name = name
+        self._default = default
+
+    def _stream(self):
+        streams = request_streams.get()
+        return streams[self._name] if streams else self._default
+
+    def __getattr__(self, attr):
+        return getattr(self._stream(), attr)
+
+    def __iter__(self):
+        return iter(self._stream())
+
+
+def open_streams(fds):
+    """Open the client's stdin, stdout and stderr, received as file descriptors, as text streams."""
+    stdin, stdout, stderr = fds
+    return {
+        "stdin": open(stdin, "r", encoding="utf-8", errors="surrogateescape"),
+        "stdout": open(stdout, "w", buffering=1 if os.isatty(stdout) else -1, encoding="utf-8", errors="surrogateescape"),
+        "stderr": open(stderr, "w", buffering=1, encoding="utf-8", errors="backslashreplace"),
+    }
+
+
+def close_streams(streams):
+    for stream in streams.values():
+        with suppress(OSError, ValueError):
+            stream.close()
+
+
+def init_worker(runners):
+    """Give the worker thread an event loop runner, and a working directory of its own (Linux) so requests can each use the client's."""
+    try:
+        worker.own_cwd = ctypes.CDLL(None, use_errno=True).unshare(CLONE_FS) == 0
+    except (AttributeError, OSError):
+        worker.own_cwd = False
+    worker.runner = asyncio.Runner()
+    runners.append(worker.runner)
+
+
+class Request:
+    """A command line sent by a client, run in a worker thread on the event loop that worker keeps."""
+
+    def __init__(self, argv, cwd, fds):
+        self.argv = argv
+        self.cwd = cwd
+        self.fds = fds
+        self.loop = None
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the command, as Ctrl-C would. Safe to call from any thread."""
+        self.cancelled = True
+        if loop := self.loop:
+            with suppress(RuntimeError):  # The worker's loop is already closed
+                loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(loop)])
+
+    def run(self):
+        """Run the command and return its exit code. Runs in a worker thread."""
+        from ai_cli.main import app
+
+        streams = open_streams(self.fds)
+        self.loop = worker.runner.get_loop()
+        streams_token = request_streams.set(streams)
+        runner_token = loop_runner.set(worker.runner)
+        try:
+            with nullcontext() if worker.own_cwd else cwd_lock:
+                if self.cancelled:
+                    return 130
+                if self.argv[:1] == ["serve"]:
+                    click.echo("Error: serve cannot be run through the daemon", err=True)
+                    return 2
+                os.chdir(self.cwd)
+                app.main(args=self.argv, prog_name=NAME)
+            return 0
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                click.echo(e.code, err=True)
+                return 1
+            return e.code or 0
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            return 130
+        except Exception:  # noqa: BLE001 -- any failure goes to the client as a traceback and exit code 1
+            traceback.print_exc(file=streams["stderr"])
+            return 1
+        finally:
+            with suppress(OSError, ValueError):
+                streams["stdout"].flush()
+            loop_runner.reset(runner_token)
+            request_streams.reset(streams_token)
+            close_streams(streams)
+
+
+async def readable(sock):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(sock.fileno(), lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(sock.fileno())
+
+
+async def receive_request(conn):
+    """Read a newline-terminated JSON request and the three stdio descriptors sent along with it."""
+    loop = asyncio.get_running_loop()
+    await readable(conn)
+    data, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST, len(STDIO))
+    while data and not data.endswith(b"\n") and len(data) < MAX_REQUEST:
+        if not (chunk := await loop.sock_recv(conn, MAX_REQUEST)):
+            break
+        data += chunk
+    try:
+        request = json.loads(data)
+        if len(fds) != len(STDIO):
+            raise ValueError("Expected stdin, stdout and stderr")
+        return Request([str(arg) for arg in request["argv"]], str(request["cwd"]), fds)
+    except (ValueError, KeyError, TypeError):
+        for fd in fds:
+            os.close(fd)
+        return None
+
+
+class Daemon:
+    """Run commands sent over a Unix socket, at most ``max_requests`` at a time.
+
+    Each request runs in a worker thread keeping an event loop across requests,
+    so imports, compiled matchers and loaded indexes stay warm. A request whose
+    client disconnects is cancelled. On shutdown the socket stops accepting,
+    running requests get ``grace`` seconds to finish and are then cancelled.
+    """
+
+    def __init__(self, path, max_requests, grace):
+        self.path = path
+        self.grace = grace
+        self.slots = asyncio.Semaphore(max_requests)
+        self.runners = []
+        self.pool = ThreadPoolExecutor(max_workers=max_requests, thread_name_prefix="ai-cli-serve", initializer=init_worker, initargs=(self.runners,))
+        self.handlers = set()
+        self.requests = set()
+
+    def listen(self):
+        if os.path.dirname(self.path) == private_dir():
+            try:
+                check_private_dir(private_dir(), create=True)
+            except PermissionError as e:
+                raise click.ClickException(str(e)) from None
+        if os.path.exists(self.path):
+            try:
+                sock = connect(self.path)
+            except PermissionError as e:
+                raise click.ClickException(str(e)) from None
+            if sock:
+                sock.close()
+                raise click.ClickException(f"A daemon is already listening on {self.path}")
+            os.unlink(self.path)  # Left behind by a daemon that did not shut down
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)  # Only the owner may connect
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen()
+        sock.setblocking(False)
+        return sock
+
+    async def handle(self, conn):
+        loop = asyncio.get_running_loop()
+        try:
+            request = await receive_request(conn)
+            if request is None:
+                return
+            self.requests.add(request)
+            try:
+                async with self.slots:
+                    running = loop.run_in_executor(self.pool, request.run)
+                    hangup = asyncio.ensure_future(loop.sock_recv(conn, 1))
+                    await asyncio.wait([running, hangup], return_when=asyncio.FIRST_COMPLETED)
+                    if not running.done():
+                        request.cancel()
+                    hangup.cancel()
+                    code = await running
+            finally:
+                self.requests.discard(request)
+            await loop.sock_sendall(conn, json.dumps({"exit": code}).encode())
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    async def accept(self, sock):
+        loop = asyncio.get_running_loop()
+        while True:
+            conn, _ = await loop.sock_accept(sock)
+            conn.setblocking(False)
+            handler = asyncio.ensure_future(self.handle(conn))
+            self.handlers.add(handler)
+            handler.add_done_callback(self.handlers.discard)
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        sock = self.listen()
+        accepting = asyncio.ensure_future(self.accept(sock))
+        click.echo(f"Listening on {self.path}")
+        try:
+            await stop.wait()
+        finally:
+            accepting.cancel()
+            sock.close()
+            with suppress(OSError):
+                os.unlink(self.path)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+
+        if self.handlers:
+            click.echo(f"Waiting up to {self.grace:g}s for {len(self.requests)} running request(s)")
+            _, pending = await asyncio.wait(self.handlers, timeout=self.grace)
+            if pending:
+                for request in list(self.requests):
+                    request.cancel()
+                await asyncio.wait(pending)
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        self.pool.shutdown()
+        for runner in self.runners:
+            runner.close()
+
+
+@click.command(name="serve")
+@click.option("--socket", "-s", "path", type=click.Path(dir_okay=False), help="Unix socket to listen on [default: $AI_CLI_SOCKET, else ai-cli.sock in $XDG_RUNTIME_DIR, else in /tmp/ai-cli-UID]")
+@click.option("--max-requests", "-c", type=click.IntRange(min=1), default=8, show_default=True, help="Requests run at the same time, others wait for a free slot")
+@click.option("--grace", type=click.FloatRange(min=0), default=10, show_default=True, help="Seconds running requests get to finish on SIGTERM/SIGINT before being cancelled")
+async def serve(path, max_requests, grace):
+    """Run a daemon executing ai-cli commands sent by ai-cli-client
+
+    Commands then start in a few milliseconds, with imports, compiled matchers
+    and file indexes kept warm between them. The client passes its working
+    directory, stdin, stdout and stderr along, so commands behave as if run
+    locally, and gets their exit code back.
+    """
+    # Worker processes are started from a multi-threaded daemon, where forking is unsafe
+    multiprocessing.set_start_method("forkserver", force=True)
+    stdio = tuple(getattr(sys, name) for name in STDIO)
+    sys.stdin, sys.stdout, sys.stderr = (StreamProxy(name, stream) for name, stream in zip(STDIO, stdio))
+    try:
+        await Daemon(path or socket_path(), max_requests, grace).serve()
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = stdio
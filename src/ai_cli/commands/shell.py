@@ -0,0 +1,210 @@
+import shlex
+import sys
+
+from ai_cli.asyn import click
+from ai_cli.commands.log.compressed import DECOMPRESSION_ERRORS, UnsupportedCompression
+from ai_cli.commands.log.matcher import ALL, ANY
+from ai_cli.commands.log.session import OpenedLog, Query
+
+PROMPT = "ai-cli> "
+EXIT_COMMANDS = {"exit", "quit", ":q"}
+HELP_COMMANDS = {"help", "?", ":h"}
+
+
+class Session:
+    """State of a shell: the opened log and the results of the queries run on it, latest last."""
+
+    def __init__(self):
+        self.log = None
+        self.results = []
+
+    @property
+    def result(self):
+        if not self.results:
+            raise click.UsageError("No result yet, run line-filter first")
+        return self.results[-1]
+
+    def open(self, path):
+        if self.log is not None:
+            self.log.close()
+        self.log = None
+        self.results = []
+        self.log = OpenedLog(path)
+
+    def filter(self, query, within=None):
+        if self.log is None:
+            raise click.UsageError("No log opened, run open FILE first")
+        result = self.log.filter(query, within)
+        self.results.append(result)
+        return result
+
+
+def show_lines(lines, limit):
+    """Print up to ``limit`` lines (0: all of them), saying how many more there are."""
+    if limit:
+        shown = b"".join(lines.splitlines(keepends=True)[:limit])
+        hidden = lines.count(b"\n", len(shown)) + (not lines.endswith(b"\n") and len(lines) > len(shown))
+    else:
+        shown, hidden = lines, 0
+    stdout = click.get_binary_stream("stdout")
+    stdout.write(shown if not shown or shown.endswith(b"\n") else shown + b"\n")
+    stdout.flush()
+    if hidden:
+        click.echo(f"... {hidden} more lines, `show -n 0` prints them all", err=True)
+
+
+def report(result, output, limit):
+    if output:
+        with open(output, "wb") as f:
+            f.write(result.lines)
+    else:
+        show_lines(result.lines, limit)
+    searched = "the whole file" if result.searched is None else f"the result of {result.searched}"
+    click.echo(f"{result.count} matching lines for {result.query}, searched {searched}", err=True)
+
+
+def query_options(f):
+    f = click.option("--output", "-o", type=click.Path(dir_okay=False), help="Write the matching lines to this file instead of printing them")(f)
+    f = click.option("--limit", "-n", type=click.IntRange(min=0), default=20, show_default=True, help="Matching lines printed (0: all)")(f)
+    f = click.option("--any", "match_any", is_flag=True, help="Keep lines containing any of the substrings instead of all of them")(f)
+    return click.argument("substrings", nargs=-1, required=True)(f)
+
+
+@click.group(name="", context_settings={"help_option_names": ["-h", "--help"]})
+def commands():
+    """Shell commands: open a log once, then query and refine it from memory. exit or Ctrl-D leaves the shell."""
+
+
+@commands.command(name="open")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.pass_obj
+def open_log(session, file):
+    """Open a log file, keeping its index and query results in memory (compressed files are decompressed to a temporary file)"""
+    session.open(file)
+    click.echo(f"Opened {session.log.path}", err=True)
+
+
+@commands.command(name="line-filter")
+@query_options
+@click.pass_obj
+def line_filter(session, substrings, match_any, limit, output):
+    """Filter the opened log for lines containing all substrings (case-insensitive)
+
+    Narrower queries than one already run, such as one adding a substring, only
+    scan the earlier query's result.
+    """
+    report(session.filter(Query.of(substrings, ANY if match_any else ALL)), output, limit)
+
+
+@commands.command(name="refine")
+@query_options
+@click.pass_obj
+def refine(session, substrings, match_any, limit, output):
+    """Keep the lines of the last result that also contain all substrings, only scanning that result"""
+    result = session.result
+    report(session.filter(result.query.refine(substrings, ANY if match_any else ALL), within=result), output, limit)
+
+
+@commands.command(name="back")
+@click.pass_obj
+def back(session):
+    """Go back to the result before the last one"""
+    if not session.results:
+        raise click.UsageError("No result to go back from")
+    session.results.pop()
+    if session.results:
+        click.echo(f"Back to {session.result.count} matching lines for {session.result.query}", err=True)
+
+
+@commands.command(name="show")
+@click.option("--limit", "-n", type=click.IntRange(min=0), default=20, show_default=True, help="Lines printed (0: all)")
+@click.pass_obj
+def show(session, limit):
+    """Print the lines of the last result"""
+    show_lines(session.result.lines, limit)
+
+
+@commands.command(name="save")
+@click.argument("file", type=click.Path(dir_okay=False))
+@click.pass_obj
+def save(session, file):
+    """Write the lines of the last result to a file"""
+    with open(file, "wb") as f:
+        f.write(session.result.lines)
+    click.echo(f"Saved {session.result.count} lines to {file}", err=True)
+
+
+@commands.command(name="status")
+@click.pass_obj
+def status(session):
+    """Show the opened log and the results of the queries so far"""
+    if session.log is None:
+        click.echo("No log opened")
+        return
+    click.echo(f"Opened: {session.log.path}")
+    for i, result in enumerate(session.results, 1):
+        click.echo(f"{i}. {result.count} lines for {result.query}")
+
+
+def read_commands():
+    """Yield the command lines typed at the prompt, or read from stdin when it is not a terminal."""
+    if not sys.stdin.isatty():
+        yield from sys.stdin
+        return
+    try:
+        from prompt_toolkit import PromptSession
+    except ImportError:
+        prompt = input
+    else:
+        prompt = PromptSession().prompt
+    while True:
+        try:
+            yield prompt(PROMPT)
+        except KeyboardInterrupt:
+            continue
+        except EOFError:
+            return
+
+
+def run_command(args, session):
+    try:
+        commands.main(args=args, prog_name="", standalone_mode=False, obj=session)
+    except click.UsageError as e:
+        click.echo(f"Error: {e.format_message()}", err=True)
+    except click.ClickException as e:
+        e.show()
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+    except KeyboardInterrupt:
+        click.echo("Interrupted", err=True)
+    except UnicodeDecodeError:
+        click.echo("Error: File is not a text file", err=True)
+    except (UnsupportedCompression, *DECOMPRESSION_ERRORS) as e:  # OSError among them
+        click.echo(f"Error: {e}", err=True)
+
+
+@click.command(name="shell")
+@click.argument("file", required=False, type=click.Path(exists=True, dir_okay=False))
+def shell(file):
+    """Interactive session querying a log kept open in memory
+
+    The opened log's block index, or its decompressed lines, stays in memory
+    along with query results, so repeated and narrowing line-filter queries do
+    not rescan the file. Type help for the shell's commands.
+    """
+    session = Session()
+    if file:
+        run_command(["open", file], session)
+    for line in read_commands():
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            continue
+        if not args:
+            continue
+        if args[0] in EXIT_COMMANDS:
+            break
+        run_command(["--help"] if args[0] in HELP_COMMANDS else args, session)
+    if session.log is not None:
+        session.log.close()
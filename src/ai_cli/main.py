@@ -1,23 +1,22 @@
-import asyncio
 import warnings
 
 from ai_cli.asyn import async_click as click
-from ai_cli.commands.log import log
-from ai_cli.settings import settings as st
+from ai_cli.metadata import NAME, VERSION
+
+
+@click.group(name=NAME, lazy_commands={"log": "ai_cli.commands.log:log", "serve": "ai_cli.commands.serve:serve", "shell": "ai_cli.commands.shell:shell"})
+@click.version_option(VERSION)
+@click.pass_context
+async def app(ctx):
+    pass
 
 
 def main():
     """Entry point for the application."""
     warnings.filterwarnings("ignore", message="coroutine '.*' was never awaited")
 
-    @click.group(name=st.PYPROJECT["project"]["name"])
-    @click.version_option(st.PYPROJECT["project"]["version"])
-    @click.pass_context
-    async def app(ctx):
-        pass
-
-    app.add_command(log)
-    asyncio.run(app())
+    # Standalone click groups exit once the command is done, async commands run their own event loop
+    app()
 
 
 if __name__ == "__main__":
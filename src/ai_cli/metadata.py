@@ -0,0 +1,11 @@
+try:
+    # Written by hatch_build.py when the package is built or installed
+    from ai_cli._metadata import NAME, VERSION
+except ImportError:  # Source checkout that was never built
+    from pathlib import Path
+
+    import tomli
+
+    with (Path(__file__).parents[2] / "pyproject.toml").open("rb") as f:
+        _project = tomli.load(f)["project"]
+    NAME, VERSION = _project["name"], _project["version"]
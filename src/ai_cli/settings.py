@@ -1,13 +1,12 @@
+import os
 from pathlib import Path
 
 from pydantic_settings import BaseSettings
-import tomli
 
 
 class Settings(BaseSettings):
-    PYPROJECT_PATH: Path = Path(__file__).parents[2] / "pyproject.toml"
-
-    PYPROJECT: dict = tomli.load(PYPROJECT_PATH.open("rb"))
+    CACHE_DIR: Path = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "ai-cli"
+    RESULT_CACHE_SIZE: int = 256 * 1024 * 1024
 
 
 settings = Settings()
@@ -0,0 +1,202 @@
+from contextlib import nullcontext
+from contextvars import ContextVar
+import os
+import sys
+import time
+
+# Stats of the running command, only set when it was given --stats or --stats-json
+current = ContextVar("stats", default=None)
+PHASES = ("startup", "open", "read", "match", "write")
+COUNTS = ("reads", "bytes_read", "lines_read", "lines_matched", "writes", "bytes_written")
+_untimed = nullcontext()
+# Functions listed on stderr with --profile
+PROFILE_TOP = 25
+
+
+def process_age():
+    """Seconds since this process started, from ``/proc`` (Linux), or ``None``."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # Fields after the parenthesized command name, which may hold spaces
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def process_io():
+    """Read and write syscalls and bytes of this process so far, from ``/proc`` (Linux), or ``None``."""
+    try:
+        with open("/proc/self/io", "rb") as f:
+            return {key.decode(): int(value) for key, value in (line.split(b":") for line in f)}
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb(children=False):
+    import resource  # Only needed once the command is done
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Phase:
+    """Context manager adding the time spent in it to one phase of ``Stats``."""
+
+    __slots__ = ("name", "start", "stats")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.seconds[self.name] += time.perf_counter() - self.start
+
+
+class Stats:
+    """Timings per phase and counts of bytes, lines and calls of a command run.
+
+    Phases may overlap: blocks read ahead in a thread are read while others are
+    matched. Work done in worker processes is not timed, it only shows in the
+    peak RSS of children.
+    """
+
+    def __init__(self, startup=None):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.seconds["startup"] = startup
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.io = process_io()
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def report(self):
+        total = time.perf_counter() - self.started
+        seconds = {name: round(value, 4) for name, value in self.seconds.items() if value is not None}
+        seconds["other"] = round(max(0.0, total - sum(value for name, value in self.seconds.items() if name != "startup" and value)), 4)
+        seconds["total"] = round(total, 4)
+        counts = self.counts
+        report = {
+            "seconds": seconds,
+            **counts,
+            "match_rate": round(counts["lines_matched"] / counts["lines_read"], 6) if counts["lines_read"] else None,
+            "mb_per_s": round(counts["bytes_read"] / 1e6 / total, 1) if total else None,
+            "lines_per_s": round(counts["lines_read"] / total) if total else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True),
+        }
+        if self.io is not None and (io := process_io()) is not None:
+            report["syscalls"] = {"read": io["syscr"] - self.io["syscr"], "write": io["syscw"] - self.io["syscw"]}
+        return report
+
+    def format(self):
+        report = self.report()
+        lines = [f"{name:<22}{value:>10.4f}s" for name, value in report["seconds"].items()]
+        lines += [f"{name:<22}{report[name]:>10}" for name in COUNTS]
+        for name in ("match_rate", "mb_per_s", "lines_per_s", "peak_rss_mb", "children_peak_rss_mb"):
+            if report[name] is not None:
+                lines.append(f"{name:<22}{report[name]:>10}")
+        for name, value in report.get("syscalls", {}).items():
+            lines.append(f"{'syscalls_' + name:<22}{value:>10}")
+        return "\n".join(lines)
+
+
+def phase(name):
+    """Time the ``with`` block as ``name`` when collecting stats, do nothing otherwise."""
+    stats = current.get()
+    return _untimed if stats is None else stats.phase(name)
+
+
+def count(**counts):
+    if (stats := current.get()) is not None:
+        for name, value in counts.items():
+            stats.counts[name] += value
+
+
+def read(read, size):
+    """Call ``read(size)``, counted as a read when collecting stats."""
+    stats = current.get()
+    if stats is None:
+        return read(size)
+    with stats.phase("read"):
+        chunk = read(size)
+    stats.counts["reads"] += 1
+    stats.counts["bytes_read"] += len(chunk)
+    return chunk
+
+
+async def aread(read, size):
+    """Await ``read(size)``, counted as a read when collecting stats."""
+    stats = current.get()
+    if stats is None:
+        return await read(size)
+    with stats.phase("read"):
+        chunk = await read(size)
+    stats.counts["reads"] += 1
+    stats.counts["bytes_read"] += len(chunk)
+    return chunk
+
+
+def match(line_filter, block):
+    """Return the lines of ``block`` that ``line_filter`` selects, counted when collecting stats."""
+    stats = current.get()
+    if stats is None:
+        return line_filter(block)
+    with stats.phase("match"):
+        matched = line_filter(block)
+    stats.counts["lines_read"] += block.count(b"\n") + (bool(block) and not block.endswith(b"\n"))
+    stats.counts["lines_matched"] += matched.count(b"\n") + (bool(matched) and not matched.endswith(b"\n"))
+    return matched
+
+
+def write(file, data):
+    """Write ``data`` to ``file``, counted as a write when collecting stats."""
+    stats = current.get()
+    if stats is None:
+        return file.write(data)
+    with stats.phase("write"):
+        written = file.write(data)
+    stats.counts["writes"] += 1
+    stats.counts["bytes_written"] += len(data)
+    return written
+
+
+def instrumented(run, stats_format=None, profile_path=None, startup=None):
+    """Call ``run``, collecting ``Stats`` printed to stderr as ``stats_format`` (text or json), and profiling it into ``profile_path``.
+
+    Both are reported even when ``run`` fails or exits early.
+    """
+    from ai_cli.asyn import click
+
+    stats = Stats(startup) if stats_format else None
+    token = current.set(stats)
+    profiler = None
+    if profile_path:
+        import cProfile
+
+        # Threads are profiled too, cProfile hooks into sys.monitoring
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run()
+    finally:
+        current.reset(token)
+        if profiler:
+            import pstats
+
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            click.echo(f"Profile written to {profile_path}, top functions by cumulative time:", err=True)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        if stats:
+            if stats_format == "json":
+                import json
+
+                click.echo(json.dumps(stats.report()), err=True)
+            else:
+                click.echo(stats.format(), err=True)
@@ -0,0 +1,155 @@
+import bz2
+import gzip
+from itertools import pairwise
+import lzma
+
+import pytest
+
+from ai_cli.commands.log.compressed import (
+    detect_compression,
+    detect_file_compression,
+    filter_compressed,
+    filter_gzip_parallel,
+    gzip_member_ranges,
+    open_decompressed,
+    read_decompressed_blocks,
+)
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+
+
+def compress_zstd(data):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {
+    "gzip": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": lzma.compress,
+    "zstd": compress_zstd,
+}
+
+
+@pytest.fixture
+def log_data():
+    lines = [f"2025-04-20 10:00:{i % 60:02d} {'ERROR' if i % 7 == 0 else 'INFO'} request {i}" for i in range(2000)]
+    return "\r\n".join(lines).encode() + b"\n\rtail ERROR without newline"
+
+
+@pytest.fixture
+def output_file(tmp_path):
+    """``out.log`` in ``tmp_path``, opened outside the coroutines filtering into it."""
+    with open(tmp_path / "out.log", "wb") as f:
+        yield f
+
+
+def plain_filter(data, line_filter, tmp_path):
+    path = tmp_path / "plain.log"
+    path.write_bytes(data)
+    with open(path, "rb") as f:
+        return b"".join(line_filter(block) for block in iter_blocks(f, 1000))
+
+
+def multi_member(data, members):
+    """Gzip ``data`` as ``members`` concatenated members cut at arbitrary bytes, not lines."""
+    step = len(data) // members + 1
+    return b"".join(gzip.compress(data[i : i + step]) for i in range(0, len(data), step))
+
+
+@pytest.mark.parametrize("compression", COMPRESSORS)
+def test_detect_file_compression(tmp_path, compression):
+    path = tmp_path / "app.log.z"
+    path.write_bytes(COMPRESSORS[compression](b"line\n"))
+
+    assert detect_file_compression(path) == compression
+
+
+def test_detect_compression_plain_text():
+    assert detect_compression(b"2025-04-20 INFO") is None
+    assert detect_compression(b"") is None
+
+
+@pytest.mark.parametrize("compression", COMPRESSORS)
+async def test_filter_compressed_matches_plain(tmp_path, log_data, compression, output_file):
+    """Filtering the compressed file gives the bytes filtering the plain file gives."""
+    path = tmp_path / "app.log.z"
+    path.write_bytes(COMPRESSORS[compression](log_data))
+    line_filter = LineFilter(["error"])
+
+    await filter_compressed(path, compression, output_file, line_filter)
+    output_file.close()
+
+    assert (tmp_path / "out.log").read_bytes() == plain_filter(log_data, line_filter, tmp_path)
+
+
+async def test_read_decompressed_blocks_yield_whole_lines(tmp_path, log_data):
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(gzip.compress(log_data))
+
+    with open_decompressed(path, "gzip") as f:
+        blocks = [block async for block in read_decompressed_blocks(f, 1000)]
+
+    assert all(block.endswith(b"\n") for block in blocks[:-1])
+    assert b"".join(blocks) == log_data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+
+@pytest.mark.parametrize("jobs", [2, 3, 8])
+def test_gzip_member_ranges_start_on_members(tmp_path, log_data, jobs):
+    path = tmp_path / "app.log.gz"
+    data = multi_member(log_data, 8)
+    path.write_bytes(data)
+
+    ranges = gzip_member_ranges(path, jobs, min_size=1)
+
+    assert 1 < len(ranges) <= jobs
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in pairwise(ranges))
+    assert all(gzip.decompress(data[start:end]) for start, end in ranges)
+
+
+def test_gzip_member_ranges_keep_single_member_whole(tmp_path, log_data):
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(gzip.compress(log_data))
+
+    assert gzip_member_ranges(path, 4, min_size=1) == [(0, path.stat().st_size)]
+
+
+@pytest.mark.parametrize("jobs", [2, 5])
+@pytest.mark.parametrize("match_any", [False, True])
+async def test_filter_gzip_parallel_matches_plain(tmp_path, log_data, jobs, match_any, output_file):
+    """Lines cut across member boundaries, CRLF pairs included, are stitched back together."""
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(multi_member(log_data, 7) + b"\0" * 16)
+    line_filter = LineFilter(["error", "request 1"], mode="any" if match_any else "all")
+
+    assert await filter_gzip_parallel(path, output_file, line_filter, jobs, tmp_path, min_size=1)
+    output_file.close()
+
+    assert (tmp_path / "out.log").read_bytes() == plain_filter(log_data, line_filter, tmp_path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["app.log.gz", "out.log", "plain.log"]
+
+
+async def test_filter_gzip_parallel_declines_single_member(tmp_path, log_data, output_file):
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(gzip.compress(log_data))
+
+    assert not await filter_gzip_parallel(path, output_file, LineFilter(["error"]), 4, tmp_path, min_size=1)
+    output_file.close()
+    assert (tmp_path / "out.log").read_bytes() == b""
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+async def test_filter_compressed_raises_on_truncated_gzip(tmp_path, log_data, jobs, output_file):
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(multi_member(log_data, 4)[:-20])
+
+    with pytest.raises(EOFError):
+        await filter_compressed(path, "gzip", output_file, LineFilter(["error"]), jobs, tmp_path)
+
+
+async def test_filter_gzip_parallel_raises_on_truncated_last_member(tmp_path, log_data, output_file):
+    path = tmp_path / "app.log.gz"
+    path.write_bytes(multi_member(log_data, 4)[:-20])
+
+    with pytest.raises(EOFError):
+        await filter_gzip_parallel(path, output_file, LineFilter(["error"]), 4, tmp_path, min_size=1)
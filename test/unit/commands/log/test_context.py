@@ -0,0 +1,70 @@
+import io
+import random
+
+import pytest
+
+from ai_cli.commands.log.context import ContextFilter, filter_sharded_context, match_spans
+from ai_cli.commands.log.counts import LimitReached
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+
+
+def reference(data, before, after, limit=None):
+    """grep -B/-A on a list of lines."""
+    lines = data.splitlines(keepends=True)
+    matched = [i for i, line in enumerate(lines) if b"error" in line.lower()][:limit]
+    shown = sorted({j for i in matched for j in range(max(0, i - before), min(len(lines), i + after + 1))})
+    out, last = [], None
+    for j in shown:
+        if last is not None and j != last + 1:
+            out.append(b"--\n")
+        out.append(lines[j])
+        last = j
+    return b"".join(out)
+
+
+def random_log(seed, count=300):
+    rng = random.Random(seed)
+    words = [b"ERROR boom", b"info", b"debug x" * 3, b"error again", b"", b"warn"]
+    lines = [rng.choices(words, [1, 6, 3, 1, 1, 2])[0] + b" %d\n" % i for i in range(count)]
+    return b"".join(lines) + (b"trailing error" if seed % 2 else b"")
+
+
+def context_filter(data, before, after, block_size, limit=None):
+    context = ContextFilter(LineFilter(["error"]), before, after, limit)
+    out = []
+    try:
+        for block in iter_blocks(io.BytesIO(data), block_size):
+            out.append(context(block))
+    except LimitReached:
+        pass
+    return b"".join(out)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("before, after", [(0, 0), (1, 0), (0, 2), (2, 3), (5, 5)])
+@pytest.mark.parametrize("block_size", [7, 100, 1 << 20])
+def test_context_matches_reference(seed, before, after, block_size):
+    data = random_log(seed)
+    assert context_filter(data, before, after, block_size) == reference(data, before, after)
+
+
+@pytest.mark.parametrize("limit", [1, 3])
+def test_context_limit(limit):
+    data = random_log(0)
+    assert context_filter(data, 2, 2, 50, limit) == reference(data, 2, 2, limit)
+
+
+def test_match_spans_skip_partial_lines():
+    block = b"xx error\nerror\nerror\n"
+    assert list(match_spans(block, b"error\nerror\n")) == [(9, 15), (15, 21)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("before, after", [(0, 1), (3, 0), (4, 6)])
+async def test_sharded_context_matches_reference(tmp_path, seed, before, after):
+    data = random_log(seed, 2000)
+    path = tmp_path / "app.log"
+    path.write_bytes(data)
+    output = io.BytesIO()
+    await filter_sharded_context(str(path), output, LineFilter(["error"]), before, after, jobs=8, shard_dir=tmp_path, min_shard_size=512)
+    assert output.getvalue() == reference(data, before, after)
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from ai_cli.commands.log.counts import LimitReached, MatchCounter, count_lines, head_lines
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.matcher import ANY
+
+DATA = b"error a\nwarning b\nerror warning c\ninfo d\nerror e"
+
+
+def write_in_pieces(counter, data, size):
+    for pos in range(0, len(data), size):
+        counter.write(data[pos : pos + size])
+
+
+@pytest.mark.parametrize("size", [1, 5, len(DATA)])
+def test_counts_lines_written_in_pieces(size):
+    output = io.BytesIO()
+    with MatchCounter(output) as counter:
+        write_in_pieces(counter, DATA, size)
+    assert counter.count == 5
+    assert output.getvalue() == DATA
+
+
+@pytest.mark.parametrize("size", [1, 7, len(DATA)])
+def test_limit_stops_writes(size):
+    output = io.BytesIO()
+    counter = MatchCounter(output, limit=2)
+    with pytest.raises(LimitReached):
+        write_in_pieces(counter, DATA, size)
+    counter.close()
+    assert counter.count == 2
+    assert output.getvalue() == b"error a\nwarning b\n"
+
+
+def test_limit_is_swallowed_by_context():
+    output = io.BytesIO()
+    with MatchCounter(output, limit=5) as counter:
+        counter.write(DATA)
+        counter.write(b"\nmore\n")
+    assert output.getvalue() == DATA + b"\n"
+
+
+def test_selector_and_hits():
+    substrings = ["error", "warning"]
+    counter = MatchCounter(selector=LineFilter(substrings), hit_filters=[LineFilter([sub]) for sub in substrings])
+    with counter:
+        counter.write(LineFilter(substrings, ANY)(DATA))
+    assert counter.count == 1
+    assert counter.hits == [3, 2]
+
+
+@pytest.mark.parametrize("data, count", [(b"", 0), (b"a", 1), (b"a\n", 1), (b"a\nb", 2)])
+def test_count_lines(data, count):
+    assert count_lines(data) == count
+
+
+def test_head_lines():
+    assert head_lines(b"a\nb\nc", 2) == b"a\nb\n"
+    assert head_lines(b"a\nb", 5) == b"a\nb"
+    assert head_lines(b"a\n", 0) == b""
@@ -0,0 +1,134 @@
+import io
+import os
+import pickle
+
+import pytest
+
+from ai_cli.commands.log.engine import CHECK_SIZE, BinaryFileError, LineBlocks, LineFilter, check_decodable, is_ascii_compatible, iter_blocks, read_stream_blocks, sniff_binary
+from ai_cli.commands.log.matcher import ALL, ANY
+
+
+def text_mode_filter(data, substrings, mode=ALL):
+    """Reference implementation: the original text-mode, per-line filter."""
+    test = any if mode == ANY else all
+    output = io.StringIO(newline=None)
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"):
+        line_lower = line.lower()
+        if test(sub.lower() in line_lower for sub in substrings):
+            output.write(line)
+    return output.getvalue().encode("utf-8")
+
+
+def engine_filter(data, substrings, block_size, mode=ALL):
+    line_filter = LineFilter(substrings, mode)
+    return b"".join(line_filter(block) for block in iter_blocks(io.BytesIO(data), block_size))
+
+
+SAMPLES = [
+    b"INFO start\nERROR boom\nerror again\nDEBUG x\n",
+    b"no trailing newline ERROR",
+    b"windows ERROR\r\nline two\r\nERROR three\r\n",
+    b"old mac ERROR\rsecond\rERROR third",
+    b"mixed\r\nERROR a\rERROR b\nend error\r",
+    b"\n\n\nERROR\n\n",
+    "café ERROR Été\nplain error\nKelvin İstanbul\n".encode(),
+    b"",
+]
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize("substrings", [("error",), ("ERROR", "b"), ("été",), ("k",), ("i",), ("error\n",), ("",), ("a\nb",), ("a\nb", "two"), ("", "x")])
+@pytest.mark.parametrize("block_size", [1, 3, 7, 1024])
+@pytest.mark.parametrize("mode", [ALL, ANY])
+def test_engine_matches_text_mode_output(data, substrings, block_size, mode):
+    """The byte engine must produce byte-identical output to the text-mode loop."""
+    assert engine_filter(data, substrings, block_size, mode) == text_mode_filter(data, substrings, mode)
+
+
+@pytest.mark.parametrize("substrings", [("ERROR",), ("error",), ("Été",), ("İ", "\u212a")])
+@pytest.mark.parametrize("mode", [ALL, ANY])
+def test_case_sensitive_matches_raw_lines(substrings, mode):
+    data = SAMPLES[6] + SAMPLES[7]
+    test = any if mode == ANY else all
+    expected = b"".join(line for line in data.splitlines(keepends=True) if test(sub.encode() in line for sub in substrings))
+    line_filter = LineFilter(substrings, mode, case_sensitive=True)
+    assert line_filter(data) == expected
+    assert [line for line in data.splitlines(keepends=True) if line_filter.line_matches(line)] == expected.splitlines(keepends=True)
+
+
+def test_check_decodable_in_pieces():
+    """Characters split between two pieces are fine, undecodable bytes in any piece are not."""
+    block = b"a" * (CHECK_SIZE - 1) + "é".encode() + b"\n"
+    check_decodable(block, "utf-8")
+    with pytest.raises(UnicodeDecodeError):
+        check_decodable(block + b"x" * CHECK_SIZE + b"\xff\n", "utf-8")
+    with pytest.raises(UnicodeDecodeError):
+        check_decodable(block[:CHECK_SIZE], "utf-8")
+
+
+def test_line_blocks_hold_back_split_crlf():
+    """A CRLF pair split across chunks must not produce an extra empty line."""
+    blocks = LineBlocks()
+    assert blocks.feed(b"one\r") == b""
+    assert blocks.feed(b"\ntwo") == b"one\n"
+    assert blocks.flush() == b"two"
+
+
+def test_invalid_utf8_raises():
+    """Undecodable input is reported the same way a text-mode read reports it."""
+    with pytest.raises(UnicodeDecodeError):
+        LineFilter(["test"])(b"\x00\x01\xff\xfe\n")
+
+
+MIXED = "ok ERROR ü\n".encode() + b"\xff bad error\nfine\n\xfe no match\n"
+
+
+@pytest.mark.parametrize(
+    "errors, expected",
+    [
+        ("surrogateescape", "ok ERROR ü\n".encode() + b"\xff bad error\n"),
+        ("replace", "ok ERROR ü\n\ufffd bad error\n".encode()),
+        ("skip", "ok ERROR ü\n".encode()),
+    ],
+)
+def test_undecodable_lines(errors, expected):
+    """Only matching lines are checked for undecodable bytes, as the errors mode says."""
+    line_filter = LineFilter(["error"], errors=errors)
+    assert line_filter(MIXED) == expected
+    selected = b"".join(line for line in MIXED.splitlines(keepends=True) if line_filter.line_matches(line))
+    assert selected == (expected if errors != "replace" else "ok ERROR ü\n".encode() + b"\xff bad error\n")
+    assert LineFilter(["no match"], errors=errors)(MIXED) == (b"\xfe no match\n" if errors == "surrogateescape" else b"\xef\xbf\xbd no match\n" if errors == "replace" else b"")
+
+
+def test_sniff_binary():
+    with pytest.raises(BinaryFileError) as raised:
+        sniff_binary(b"ELF\x00\x01 ERROR\n")
+    # Worker processes send it back pickled
+    error = pickle.loads(pickle.dumps(raised.value))
+    assert (type(error), error.start, error.reason) == (BinaryFileError, 3, "binary data")
+    sniff_binary(b"\xff mixed ERROR\n")
+    sniff_binary("ü".encode("utf-16"), "utf-16")
+
+
+@pytest.mark.parametrize("encoding, compatible", [("utf-8", True), ("UTF8", True), ("latin-1", True), ("cp1252", True), ("utf-16", False), ("shift_jis", False)])
+def test_is_ascii_compatible(encoding, compatible):
+    assert is_ascii_compatible(encoding) == compatible
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, "rb") as reader, open(write_fd, "wb", buffering=0) as writer:
+        yield reader, writer
+
+
+async def test_stream_blocks_yield_before_eof(pipe):
+    """Lines written to a pipe are yielded without waiting for the writer to close it."""
+    reader, writer = pipe
+    blocks = read_stream_blocks(reader)
+    writer.write(b"first ERROR\npartial")
+    assert await anext(blocks) == b"first ERROR\n"
+    writer.write(b" line\n")
+    assert await anext(blocks) == b"partial line\n"
+    writer.close()
+    assert [block async for block in blocks] == []
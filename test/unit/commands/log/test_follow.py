@@ -0,0 +1,90 @@
+import asyncio
+import io
+import os
+import sys
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.follow import Follower, Watcher, follow
+
+
+async def wait_for_output(output, expected, timeout=5):
+    """Wait until the followed output holds ``expected``."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while output.getvalue() != expected:
+        assert asyncio.get_running_loop().time() < deadline, output.getvalue()
+        await asyncio.sleep(0.01)
+
+
+async def append(path, data):
+    """Append ``data`` to ``path`` off the event loop the follower runs on."""
+
+    def write():
+        with open(path, "ab") as f:
+            f.write(data)
+
+    await asyncio.to_thread(write)
+
+
+@pytest.fixture
+async def followed(tmp_path):
+    """Follow a log in the background and expose its path and filtered output."""
+    path = tmp_path / "app.log"
+    path.write_bytes(b"old ERROR\nold info\n")
+    output = io.BytesIO()
+    task = asyncio.create_task(follow(path, output, LineFilter(["error"])))
+    await wait_for_output(output, b"old ERROR\n")
+    yield path, output
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_follow_appended_lines(followed):
+    """Appended lines are filtered as they arrive; partial lines wait for their newline."""
+    path, output = followed
+    await append(path, b"new error\nskip\npartial ERR")
+    await wait_for_output(output, b"old ERROR\nnew error\n")
+    await append(path, b"OR line\n")
+    await wait_for_output(output, b"old ERROR\nnew error\npartial ERROR line\n")
+
+
+async def test_follow_rename_rotation(followed):
+    """After a rename rotation the rest of the old file and the new file are read."""
+    path, output = followed
+    os.rename(path, path.with_suffix(".log.1"))
+    await append(path.with_suffix(".log.1"), b"late error\n")
+    path.write_bytes(b"rotated error\n")
+    await wait_for_output(output, b"old ERROR\nlate error\nrotated error\n")
+
+
+async def test_follow_copytruncate(followed):
+    """A file truncated in place is read again from its beginning."""
+    path, output = followed
+    await asyncio.to_thread(os.truncate, path, 0)
+    await append(path, b"after truncate error\n")
+    await wait_for_output(output, b"old ERROR\nafter truncate error\n")
+
+
+def test_follower_flushes_partial_line_on_rotation(tmp_path):
+    """An unterminated last line of a rotated file is emitted, as it cannot grow anymore."""
+    path = tmp_path / "app.log"
+    path.write_bytes(b"one\ntwo")
+    follower = Follower(path)
+
+    assert follower.read() == b"one\n"
+    assert follower.read() == b""
+    os.rename(path, tmp_path / "app.log.1")
+    path.write_bytes(b"three\n")
+    assert follower.read() == b"two"
+    assert follower.read() == b"three\n"
+    follower.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_watcher_uses_inotify_on_linux(tmp_path):
+    """The watcher is event driven where inotify exists."""
+    watcher = Watcher(tmp_path / "app.log")
+    assert watcher.inotify is not None
+    watcher.close()
@@ -0,0 +1,139 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+from ai_cli.commands.log.index import BlockIndex, filter_indexed, index_path, needle_grams
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [f"2025-04-20 10:00:{i % 60:02d} {'ERROR' if i % 7 == 0 else 'INFO'} request id=req-{i:06d} done" for i in range(5000)]
+    lines[1234] = "2025-04-20 10:00:00 WARNING Kelvin request id=ÉTÉ-000042 done"
+    path.write_bytes("\r\n".join(lines).encode() + b"\n\rtail ERROR without newline")
+    return path
+
+
+def plain_filter(path, line_filter):
+    with open(path, "rb") as f:
+        return b"".join(line_filter(block) for block in iter_blocks(f, 1000))
+
+
+def run_indexed(path, line_filter, tmp_path, block_size=4096):
+    output = tmp_path / "out.log"
+    with open(output, "wb") as output_file:
+        filter_indexed(path, output_file, line_filter, tmp_path / "index", block_size)
+    return output.read_bytes()
+
+
+def load_index(path, tmp_path):
+    with open(path, "rb") as f:
+        return BlockIndex.load(index_path(path, tmp_path / "index"), f)
+
+
+QUERIES = [
+    (["req-004321"], "all"),
+    (["error", "req-0042"], "all"),
+    (["kelvin request"], "all"),
+    (["été-000042"], "all"),
+    (["req-000001", "req-004999"], "any"),
+    (["req-000001", "err"], "any"),
+    (["without newline"], "all"),
+    ([""], "any"),
+]
+
+
+@pytest.mark.parametrize("substrings, mode", QUERIES)
+def test_filter_indexed_matches_plain(log_file, tmp_path, substrings, mode):
+    """Building the index and then querying it both give the plain filter's output."""
+    line_filter = LineFilter(substrings, mode)
+    expected = plain_filter(log_file, line_filter)
+
+    assert run_indexed(log_file, line_filter, tmp_path) == expected
+    assert index_path(log_file, tmp_path / "index").exists()
+    assert run_indexed(log_file, line_filter, tmp_path) == expected
+
+
+def test_candidates_skip_blocks(log_file, tmp_path):
+    run_indexed(log_file, LineFilter(["x"]), tmp_path)
+    index = load_index(log_file, tmp_path)
+
+    assert len(list(index.candidates(LineFilter(["req-004321"])))) < len(index.records) // 8
+    assert len(list(index.candidates(LineFilter(["info"])))) == len(index.records)
+    assert not list(index.candidates(LineFilter(["no\rway"])))
+
+
+def test_needle_grams_cover_every_alignment():
+    assert needle_grams(b"abcdefg") == [
+        [int.from_bytes(b"abcd", "little"), int.from_bytes(b"cdef", "little")],
+        [int.from_bytes(b"bcde", "little"), int.from_bytes(b"defg", "little")],
+    ]
+
+
+def test_index_extends_on_append(log_file, tmp_path):
+    run_indexed(log_file, LineFilter(["error"]), tmp_path)
+    before = load_index(log_file, tmp_path).records
+
+    with open(log_file, "ab") as f:
+        f.write(b" line\n" + b"2025-04-20 10:00:00 ERROR request id=req-appended done\n" * 500)
+    line_filter = LineFilter(["req-appended"])
+
+    assert run_indexed(log_file, line_filter, tmp_path) == plain_filter(log_file, line_filter)
+    after = load_index(log_file, tmp_path).records
+    assert after[: len(before) - 1] == before[:-1]
+    assert len(after) > len(before)
+
+
+@pytest.mark.parametrize("change", ["truncate", "rewrite", "replace"])
+def test_index_rebuilds_when_file_changes(log_file, tmp_path, change):
+    run_indexed(log_file, LineFilter(["error"]), tmp_path)
+    data = log_file.read_bytes()
+    stat = log_file.stat()
+
+    if change == "truncate":
+        log_file.write_bytes(data[:1000])
+    elif change == "rewrite":
+        log_file.write_bytes(data.replace(b"req-004321", b"req-XYZXYZ"))
+        os.utime(log_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    else:
+        replacement = log_file.with_suffix(".new")
+        replacement.write_bytes(data.replace(b"req-004321", b"req-XYZXYZ") + b"\n")
+        replacement.replace(log_file)
+
+    for substrings in (["req-xyzxyz"], ["req-004321"], ["error"]):
+        line_filter = LineFilter(substrings)
+        assert run_indexed(log_file, line_filter, tmp_path) == plain_filter(log_file, line_filter)
+
+
+def test_filter_indexed_raises_on_undecodable_block(tmp_path):
+    path = tmp_path / "binary.dat"
+    path.write_bytes(b"ok line long enough\n" * 1000 + b"\xff\xfe\n" + b"ok line\n" * 100)
+
+    for _ in range(2):
+        with pytest.raises(UnicodeDecodeError):
+            run_indexed(path, LineFilter(["something absent"]), tmp_path)
+
+
+def test_unwritable_index_dir_still_filters(log_file, tmp_path):
+    blocker = tmp_path / "index"
+    blocker.write_bytes(b"")
+    line_filter = LineFilter(["req-004321"])
+
+    assert run_indexed(log_file, line_filter, tmp_path) == plain_filter(log_file, line_filter)
+
+
+def test_loaded_index_is_reused(log_file, tmp_path, monkeypatch):
+    """Once loaded or saved, an index file is not read again until it changes."""
+    line_filter = LineFilter(["req-004321"])
+    expected = run_indexed(log_file, line_filter, tmp_path)
+
+    read_bytes = Path.read_bytes
+
+    def read_output(self):
+        assert self.suffix != ".idx", "index read again"
+        return read_bytes(self)
+
+    monkeypatch.setattr(Path, "read_bytes", read_output)
+    assert run_indexed(log_file, line_filter, tmp_path) == expected
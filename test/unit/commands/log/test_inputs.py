@@ -0,0 +1,86 @@
+import gzip
+import os
+
+import pytest
+
+from ai_cli.commands.log.common import expand_inputs
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.inputs import filter_files, filtered_name, output_paths, prefix_lines
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    root = tmp_path / "logs"
+    (root / "archive").mkdir(parents=True)
+    (root / "app.log").write_bytes(b"INFO start\nERROR boom\n")
+    (root / "app.log.1").write_bytes(b"ERROR older\r\nINFO fine\r\n")
+    (root / "archive" / "app.log.2.gz").write_bytes(gzip.compress(b"ERROR oldest\nINFO ok"))
+    return root
+
+
+def test_expand_inputs_walks_directories_sorted(log_dir):
+    assert expand_inputs([str(log_dir)]) == [log_dir / "app.log", log_dir / "app.log.1", log_dir / "archive" / "app.log.2.gz"]
+
+
+def test_expand_inputs_globs_and_deduplicates(log_dir):
+    files = expand_inputs([str(log_dir / "*.log*"), str(log_dir / "app.log"), str(log_dir / "**" / "*.gz")])
+
+    assert files == [log_dir / "app.log", log_dir / "app.log.1", log_dir / "archive" / "app.log.2.gz"]
+
+
+@pytest.mark.parametrize("pattern", ["missing.log", "*.missing"])
+def test_expand_inputs_rejects_missing(log_dir, pattern):
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([str(log_dir / pattern)])
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [("app.log", "app-filtered.log"), ("app.log.gz", "app-filtered.log"), ("app.log.1", "app.log-filtered.1"), ("syslog", "syslog-filtered")],
+)
+def test_filtered_name(name, expected):
+    assert filtered_name(name) == expected
+
+
+def test_output_paths_mirror_layout(log_dir, tmp_path):
+    files = expand_inputs([str(log_dir)])
+
+    assert output_paths(files, tmp_path / "out") == [
+        tmp_path / "out" / "app-filtered.log",
+        tmp_path / "out" / "app.log-filtered.1",
+        tmp_path / "out" / "archive" / "app.log-filtered.2",
+    ]
+
+
+@pytest.mark.parametrize("block", [b"a\nb\n", b"a\nb", memoryview(b"a\nb\n")])
+def test_prefix_lines(block):
+    assert prefix_lines(block, b"f:") == b"f:a\nf:b\n"
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+@pytest.mark.parametrize("mapped", [False, True])
+async def test_filter_files_in_input_order(log_dir, tmp_path, jobs, mapped):
+    files = expand_inputs([str(log_dir)])
+    outputs = [tmp_path / f"{i}.out" for i in range(len(files))]
+
+    results = [result async for result in filter_files(files, outputs, LineFilter(["error"]), jobs, prefixed=True, mapped=mapped)]
+
+    assert [(file, output, error) for file, output, error in results] == [(file, output, None) for file, output in zip(files, outputs)]
+    assert [output.read_bytes() for output in outputs] == [
+        os.fsencode(f"{files[0]}:ERROR boom\n"),
+        os.fsencode(f"{files[1]}:ERROR older\n"),
+        os.fsencode(f"{files[2]}:ERROR oldest\n"),
+    ]
+
+
+async def test_filter_files_reports_failures_per_file(log_dir, tmp_path):
+    (log_dir / "binary.dat").write_bytes(b"\xff\xfe ERROR\n")
+    (log_dir / "broken.gz").write_bytes(gzip.compress(b"ERROR x\n")[:-8])
+    files = [log_dir / "app.log", log_dir / "binary.dat", log_dir / "broken.gz", log_dir / "app.log.1"]
+    outputs = [tmp_path / f"{i}.out" for i in range(len(files))]
+
+    errors = [error async for _, _, error in filter_files(files, outputs, LineFilter(["error"]), 2)]
+
+    assert errors[0] is None and errors[3] is None
+    assert isinstance(errors[1], UnicodeDecodeError)
+    assert isinstance(errors[2], EOFError)
@@ -1,6 +1,12 @@
+import gzip
+import json
 from pathlib import Path
+import pstats
+
+import pytest
 
 from ai_cli.commands.log.line_filter import log_line_filter
+from ai_cli.settings import settings
 
 
 def test_filter_by_single_substring(cli_runner, sample_log_path, temp_output_path, cleanup_output):
@@ -172,4 +178,420 @@ def test_non_text_file_handling(cli_runner, temp_output_path, cleanup_output, tm
     
     # Check command failed with error
     assert result.exit_code == 1
-    assert "Error: File is not a text file" in result.output 
\ No newline at end of file
+    assert "Error: File is not a text file" in result.output 
+
+def test_filter_any_substring(cli_runner, sample_log_path, temp_output_path, cleanup_output):
+    """Test that --any keeps lines containing at least one of the substrings."""
+    result = cli_runner.invoke(
+        log_line_filter,
+        [str(sample_log_path), "warning", "debug", "--any", "-o", str(temp_output_path)]
+    )
+
+    assert result.exit_code == 0
+
+    with open(temp_output_path, "r") as f:
+        lines = f.readlines()
+
+    # Should have the 2 WARNING lines and the 4 DEBUG lines
+    assert len(lines) == 6
+    assert all("WARNING" in line or "DEBUG" in line for line in lines)
+
+
+def test_filter_with_jobs(cli_runner, sample_log_path, temp_output_path, cleanup_output):
+    """Test that --jobs produces the same output as a single-process run."""
+    result = cli_runner.invoke(
+        log_line_filter,
+        [str(sample_log_path), "error", "--jobs", "2", "-o", str(temp_output_path)]
+    )
+
+    assert result.exit_code == 0
+
+    with open(temp_output_path, "r") as f:
+        lines = f.readlines()
+
+    assert len(lines) == 4
+    assert all("ERROR" in line for line in lines)
+
+
+def test_filter_with_mmap(cli_runner, sample_log_path, temp_output_path, cleanup_output):
+    """Test that --mmap produces the same output as the streaming path."""
+    result = cli_runner.invoke(
+        log_line_filter,
+        [str(sample_log_path), "warning", "-o", str(temp_output_path), "--mmap"]
+    )
+
+    assert result.exit_code == 0
+
+    with open(temp_output_path, "r") as f:
+        lines = f.readlines()
+
+    assert len(lines) == 2
+    assert all("WARNING" in line for line in lines)
+
+
+def test_filter_stdin_to_stdout(cli_runner, sample_log_path):
+    """Test that '-' reads stdin and writes matches to stdout by default."""
+    result = cli_runner.invoke(log_line_filter, ["-", "warning"], input=sample_log_path.read_bytes())
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 2
+    assert all("WARNING" in line for line in lines)
+    assert "Generated filtered file at" not in result.output
+
+
+def test_filter_file_to_stdout(cli_runner, sample_log_path):
+    """Test that '-o -' writes matches to stdout instead of a file."""
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "debug", "-o", "-"])
+
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 4
+
+
+def test_filter_gzip_file(cli_runner, sample_log_path, tmp_path):
+    """Test that gzip-compressed input is detected and decompressed transparently."""
+    gz_path = tmp_path / "sample-log.log.gz"
+    gz_path.write_bytes(gzip.compress(sample_log_path.read_bytes()))
+
+    result = cli_runner.invoke(log_line_filter, [str(gz_path), "error", "-o", "-"])
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 4
+    assert all("ERROR" in line for line in lines)
+
+
+def test_filter_truncated_gzip_file(cli_runner, sample_log_path, tmp_path):
+    """Test that a corrupt compressed file is reported as an error."""
+    gz_path = tmp_path / "sample-log.log.gz"
+    gz_path.write_bytes(gzip.compress(sample_log_path.read_bytes())[:-12])
+
+    result = cli_runner.invoke(log_line_filter, [str(gz_path), "error", "-o", "-"])
+
+    assert result.exit_code == 1
+    assert "Error: Could not decompress" in result.output
+
+
+def test_filter_glob_merges_with_prefixes(cli_runner, sample_log_path, tmp_path):
+    """Test that a glob pattern scans every matching file into one prefixed output."""
+    for name in ("a.log", "b.log"):
+        (tmp_path / name).write_bytes(sample_log_path.read_bytes())
+    output = tmp_path / "merged.txt"
+
+    result = cli_runner.invoke(log_line_filter, [str(tmp_path / "*.log"), "warning", "-o", str(output), "-j", "2"])
+
+    assert result.exit_code == 0
+    lines = output.read_text().splitlines()
+    assert len(lines) == 4
+    assert all(line.startswith(str(tmp_path / "a.log") + ":") for line in lines[:2])
+    assert all(line.startswith(str(tmp_path / "b.log") + ":") and "WARNING" in line for line in lines[2:])
+
+
+def test_filter_directory_into_output_dir(cli_runner, sample_log_path, tmp_path):
+    """Test that --output-dir writes one unprefixed output per input file."""
+    logs = tmp_path / "logs"
+    (logs / "nested").mkdir(parents=True)
+    (logs / "app.log").write_bytes(sample_log_path.read_bytes())
+    (logs / "nested" / "app.log.gz").write_bytes(gzip.compress(sample_log_path.read_bytes()))
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    result = cli_runner.invoke(log_line_filter, [str(logs), "error", "--output-dir", str(out_dir)])
+
+    assert result.exit_code == 0
+    for output in (out_dir / "app-filtered.log", out_dir / "nested" / "app-filtered.log"):
+        assert f"Generated filtered file at: {output}" in result.output
+        lines = output.read_text().splitlines()
+        assert len(lines) == 4
+        assert all(line.startswith("20") and "ERROR" in line for line in lines)
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_filter_extra_inputs_skip_non_text_files(cli_runner, sample_log_path, tmp_path, jobs):
+    """Test that a binary input is reported and skipped while the others are still filtered, in worker processes too."""
+    binary_file = tmp_path / "binary.dat"
+    binary_file.write_bytes(b"\x00\x01\xff\xfe")
+    other = tmp_path / "other.log"
+    other.write_bytes(b"one error\nfine\n")
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "-i", str(binary_file), "-i", str(other), "-j", jobs, "-o", "-"])
+
+    assert result.exit_code == 1
+    assert f"Error: {binary_file} is not a text file" in result.output
+    assert sum(line.startswith(f"{sample_log_path}:") for line in result.output.splitlines()) == 4
+    assert f"{other}:one error" in result.output.splitlines()
+
+
+def test_filter_missing_input(cli_runner, tmp_path):
+    """Test that a missing file or a glob matching nothing is a usage error."""
+    result = cli_runner.invoke(log_line_filter, [str(tmp_path / "*.log"), "error"])
+
+    assert result.exit_code == 2
+    assert "No file matches" in result.output
+
+
+def test_filter_with_index(cli_runner, sample_log_path, tmp_path, monkeypatch):
+    """Test that --index builds a reusable index in the cache dir without changing the output."""
+    monkeypatch.setattr(settings, "CACHE_DIR", tmp_path / "cache")
+
+    for _ in range(2):
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "warning", "-o", "-", "--index"])
+
+        assert result.exit_code == 0
+        lines = result.output.splitlines()
+        assert len(lines) == 2
+        assert all("WARNING" in line for line in lines)
+    assert len(list((tmp_path / "cache" / "index").glob("*.idx"))) == 1
+
+
+def test_filter_with_cache(cli_runner, sample_log_path, tmp_path, monkeypatch):
+    """Test that --cache stores the result and serves the same output on the next run."""
+    monkeypatch.setattr(settings, "CACHE_DIR", tmp_path / "cache")
+    log_path = tmp_path / "app.log"
+    log_path.write_bytes(sample_log_path.read_bytes())
+
+    outputs = [cli_runner.invoke(log_line_filter, [str(log_path), "error", "-o", "-", "--cache"]).output for _ in range(2)]
+
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0].splitlines()) == 4
+    assert len(list((tmp_path / "cache" / "results").glob("*.out"))) == 1
+
+
+def test_filter_with_query(cli_runner, sample_log_path):
+    """Test that --query combines boolean operators, regexes and time ranges, and SUBSTRINGS with it."""
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "-o", "-", "-q", "(error OR warning) NOT /\\[(http|auth)\\]/ @time<2025-04-20T10:05"])
+
+    assert result.exit_code == 0
+    assert [line.split()[2:4] for line in result.output.splitlines()] == [["WARNING", "[cache]"], ["ERROR", "[db]"], ["WARNING", "[db]"]]
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "db", "-o", "-", "-q", "error OR warning"])
+
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 2
+
+
+def test_filter_query_errors(cli_runner, sample_log_path):
+    """Test that a malformed --query, or neither SUBSTRINGS nor --query, is a usage error."""
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "-q", "(error"])
+
+    assert result.exit_code == 2
+    assert "Missing ')'" in result.output
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path)])
+
+    assert result.exit_code == 2
+    assert "--query" in result.output
+
+
+def test_filter_time_range(cli_runner, sample_log_path):
+    """Test that --since/--until keep the same lines whether the file is searched for the range or stdin is read."""
+    args = ["--since", "2025-04-20 10:01", "--until", "2025-04-20T10:03", "-o", "-"]
+
+    outputs = [
+        cli_runner.invoke(log_line_filter, [str(sample_log_path), *args]).output,
+        cli_runner.invoke(log_line_filter, [str(sample_log_path), *args, "--mmap"]).output,
+        cli_runner.invoke(log_line_filter, ["-", *args], input=sample_log_path.read_bytes()).output,
+    ]
+
+    outputs.append(cli_runner.invoke(log_line_filter, [str(sample_log_path), *args, "--any"]).output)
+    outputs.append(cli_runner.invoke(log_line_filter, ["-", *args, "--any"], input=sample_log_path.read_bytes()).output)
+
+    assert outputs[0] == outputs[1] == outputs[2] == outputs[3] == outputs[4]
+    assert [line.split()[1] for line in outputs[0].splitlines()] == ["10:01:12,498", "10:01:12,503", "10:01:13,110", "10:02:45,870", "10:02:46,002"]
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", *args])
+
+    assert len(result.output.splitlines()) == 2
+
+
+def test_filter_time_range_invalid(cli_runner, sample_log_path):
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "--since", "yesterday"])
+
+    assert result.exit_code == 2
+    assert "is not a date and time" in result.output
+
+
+def test_filter_undecodable_bytes(cli_runner, tmp_path):
+    """Test that undecodable bytes only matter in matching lines, with every engine and --errors mode."""
+    path = tmp_path / "mixed.log"
+    path.write_bytes(b"ERROR ok\n\xff\xfe ERROR bad\nINFO \xff\n" * 2000)
+    expected = {
+        "surrogateescape": b"ERROR ok\n\xff\xfe ERROR bad\n",
+        "replace": "ERROR ok\n\ufffd\ufffd ERROR bad\n".encode(),
+        "skip": b"ERROR ok\n",
+    }
+    for errors, lines in expected.items():
+        for extra in [[], ["--mmap"], ["-j", "2"], ["-q", "ok OR bad"]]:
+            output = tmp_path / "out.log"
+            result = cli_runner.invoke(log_line_filter, [str(path), "error", "-o", str(output), "--errors", errors, *extra])
+
+            assert result.exit_code == 0, result.output
+            assert output.read_bytes() == lines * 2000
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-o", "-", "--errors", "strict"])
+    assert result.exit_code == 1
+    assert "Error: File is not a text file" in result.output
+
+    # A failed run leaves the previous output as it was
+    output.write_bytes(b"previous\n")
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-o", str(output), "--errors", "strict"])
+    assert result.exit_code == 1
+    assert output.read_bytes() == b"previous\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["mixed.log", "out.log"]
+
+
+def test_filter_encoding(cli_runner, tmp_path):
+    """Test that --encoding matches needles in single-byte encoded files, and refuses encodings lines cannot be matched as bytes in."""
+    path = tmp_path / "latin.log"
+    path.write_bytes("Überweisung ERROR\nüberweisung ok\nother\n".encode("latin-1"))
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "ÜBERWEISUNG", "-o", "-", "--encoding", "latin-1", "--errors", "strict"])
+    assert result.exit_code == 0
+    assert result.stdout_bytes == "Überweisung ERROR\nüberweisung ok\n".encode("latin-1")
+
+    for encoding in ["utf-16", "no-such-encoding"]:
+        result = cli_runner.invoke(log_line_filter, [str(path), "error", "--encoding", encoding])
+        assert result.exit_code == 2
+        assert "--encoding" in result.output
+
+
+def test_filter_count(cli_runner, sample_log_path, tmp_path):
+    """Test that --count prints the number of matching lines, and how many hold each substring, with every engine."""
+    for extra in [[], ["--mmap"], ["-j", "2"], ["--index"], ["-q", "error"]]:
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "--count", *extra])
+
+        assert result.exit_code == 0, result.output
+        assert result.output == "4\n"
+    assert not (Path.cwd() / "sample-log-filtered.log").exists()
+
+    data = sample_log_path.read_bytes().lower()
+    expected = [sum(sub in line for line in data.splitlines()) for sub in [b"error", b"database"]]
+    for extra, count in [([], sum(b"error" in line and b"database" in line for line in data.splitlines())), (["--any"], sum(b"error" in line or b"database" in line for line in data.splitlines()))]:
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "database", "-c", *extra])
+
+        assert result.exit_code == 0
+        assert result.output == f"{count}\nerror\t{expected[0]}\ndatabase\t{expected[1]}\n"
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "-i", str(sample_log_path.parent), "error", "-c"])
+    assert result.exit_code == 0
+    assert int(result.output) >= 4
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "-c", "-o", str(tmp_path / "out.log")])
+    assert result.exit_code == 2
+
+
+def test_filter_max_matches(cli_runner, tmp_path):
+    """Test that --max-matches and --first stop after that many matching lines, with every engine."""
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"INFO %d\nERROR %d\n" % (i, i) for i in range(100000)))
+    for extra in [["--first"], ["-m", "3"], ["-m", "3", "--mmap"], ["-m", "3", "-j", "4"], ["-m", "3", "--index"], ["-m", "3", "--cache"], ["-m", "3", "-q", "/error \\d+/i"]]:
+        result = cli_runner.invoke(log_line_filter, [str(path), "error", "-o", "-", *extra])
+
+        assert result.exit_code == 0, result.output
+        assert result.output == "".join(f"ERROR {i}\n" for i in range(1 if "--first" in extra else 3))
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-c", "-m", "10"])
+    assert result.output == "10\n"
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "--first", "-m", "3"])
+    assert result.exit_code == 2
+
+
+def test_filter_context(cli_runner, tmp_path):
+    """Test that -A, -B and -C write the lines around matches with every engine, separating groups apart."""
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"ERROR %d\n" % i if i % 1000 in (0, 3, 500) else b"line %d\n" % i for i in range(200000)))
+    lines = path.read_bytes().splitlines(keepends=True)
+    groups = [b"".join(lines[max(0, i - 1) : i + 6]) + b"--\n" + b"".join(lines[i + 499 : i + 503]) for i in range(0, 200000, 1000)]
+    expected = b"--\n".join(groups)
+    for extra in [[], ["-j", "4"], ["--mmap"], ["--index"], ["-A", "2", "-C", "9"]]:
+        output = tmp_path / "out.log"
+        result = cli_runner.invoke(log_line_filter, [str(path), "error", "-B", "1", "-A", "2", "-o", str(output), *extra])
+
+        assert result.exit_code == 0, result.output
+        assert output.read_bytes() == expected
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-C", "1", "-m", "3", "-o", "-"])
+    assert result.output == "ERROR 0\nline 1\nline 2\nERROR 3\nline 4\n--\nline 499\nERROR 500\nline 501\n"
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-C", "1", "-c"])
+    assert result.output == "600\n"
+
+    small = tmp_path / "small.log"
+    small.write_bytes(b"a\nERROR b\nc\n")
+    other = tmp_path / "other.log"
+    other.write_bytes(b"ERROR d\n")
+    result = cli_runner.invoke(log_line_filter, [str(small), "-i", str(other), "error", "-B", "1", "-o", "-"])
+    assert result.output == f"{small}:a\n{small}:ERROR b\n--\n{other}:ERROR d\n"
+
+
+def test_filter_line_number(cli_runner, tmp_path, monkeypatch):
+    """Test that -n numbers the lines like grep does, alone, with context, across inputs and within a --since window."""
+    monkeypatch.setattr(settings, "CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "app.log"
+    lines = [f"2025-04-20T{10 + i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d} {'ERROR' if i % 1000 in (0, 3) else 'INFO'} {i}" for i in range(20000)]
+    path.write_text("\n".join(lines) + "\n")
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-n", "-j", "4", "-o", "-"])
+
+    assert result.exit_code == 0, result.output
+    assert result.output == "".join(f"{i + 1}:{line}\n" for i, line in enumerate(lines) if "ERROR" in line)
+
+    result = cli_runner.invoke(log_line_filter, [str(path), "error", "-n", "-A", "1", "-m", "3", "-o", "-"])
+    assert result.output == f"1:{lines[0]}\n2-{lines[1]}\n--\n4:{lines[3]}\n5-{lines[4]}\n--\n1001:{lines[1000]}\n1002-{lines[1001]}\n"
+
+    for _ in range(2):
+        # The second run finds the first line of the window with the saved line index
+        result = cli_runner.invoke(log_line_filter, [str(path), "error", "-n", "--since", "2025-04-20T12:00", "-o", "-"])
+        assert result.output == "".join(f"{i + 1}:{line}\n" for i, line in enumerate(lines) if "ERROR" in line and i >= 7200)
+    assert list((tmp_path / "cache" / "index").glob("*.lines"))
+
+    small = tmp_path / "small.log"
+    small.write_text("ERROR a\nb\nERROR c\n")
+    other = tmp_path / "other.log"
+    other.write_text("b\nERROR d\n")
+    result = cli_runner.invoke(log_line_filter, [str(small), "-i", str(other), "error", "-n", "-o", "-"])
+    assert result.output == f"{small}:1:ERROR a\n{small}:3:ERROR c\n{other}:2:ERROR d\n"
+
+
+def test_filter_case_sensitive(cli_runner, sample_log_path):
+    """Test that --case-sensitive matches substrings and query words with their case, with every engine."""
+    for extra in [[], ["--mmap"], ["-q", "Request OR Retry"]]:
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "ERROR", "-o", "-", "--case-sensitive", *extra])
+
+        assert result.exit_code == 0
+        assert all("ERROR" in line for line in result.output.splitlines())
+    assert len(result.output.splitlines()) == 1
+
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "-o", "-", "-s"])
+
+    assert result.exit_code == 0
+    assert result.output == ""
+
+
+def test_filter_stats(cli_runner, sample_log_path, tmp_path):
+    """Test that --stats-json reports the bytes, lines and matches of the scan, and --profile writes a pstats dump."""
+    data = sample_log_path.read_bytes()
+    for extra in [[], ["--mmap"], ["--index"], ["-q", "error"]]:
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "-o", "-", "--stats-json", *extra])
+
+        assert result.exit_code == 0, result.output
+        stats = json.loads(result.output.splitlines()[-1])
+        assert stats["bytes_read"] == len(data)
+        assert stats["lines_matched"] == 4
+        assert set(stats["seconds"]) >= {"open", "read", "match", "write", "total"}
+
+    profile = tmp_path / "run.prof"
+    result = cli_runner.invoke(log_line_filter, [str(sample_log_path), "error", "-o", "-", "--profile", str(profile)])
+    assert result.exit_code == 0
+    assert pstats.Stats(str(profile)).total_calls
+
+
+def test_filter_numpy(cli_runner, sample_log_path):
+    """Test that --numpy writes the same lines as the default engine."""
+    pytest.importorskip("numpy")
+    for args in [["error"], ["error", "database", "--any"], ["-q", "error OR warning"], ["error", "-s"]]:
+        expected = cli_runner.invoke(log_line_filter, [str(sample_log_path), *args, "-o", "-"])
+        result = cli_runner.invoke(log_line_filter, [str(sample_log_path), *args, "-o", "-", "--numpy"])
+
+        assert result.exit_code == 0, result.output
+        assert result.output == expected.output
@@ -0,0 +1,93 @@
+import io
+
+import pytest
+
+from ai_cli.commands.log.engine import number_lines
+from ai_cli.commands.log.lines import LineIndex, line_number, open_line_index, tail_offset, write_range
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"line %d %s\n" % (i, b"x" * (i % 13)) for i in range(5000)) + b"tail without newline")
+    return path
+
+
+def starts(data):
+    """Offsets of every line of ``data``, the naive way."""
+    return [0] + [i + 1 for i, byte in enumerate(data) if byte == 0x0A]
+
+
+def test_line_offsets(log_file, tmp_path):
+    """Test that the index finds every line and the line of every byte, whatever its stride and block size."""
+    data = log_file.read_bytes()
+    expected = starts(data)
+    for stride, block_size in [(1, 100), (7, 1000), (1024, 4096), (100000, 65536)]:
+        with open(log_file, "rb") as f:
+            index = LineIndex(tmp_path / "lines", None, stride)
+            index.update(f, block_size=block_size)
+
+            assert index.lines == 5000
+            assert index.end == len(data) - len(b"tail without newline")
+            for number in [0, 1, min(stride - 1, 5000), min(stride, 5000), 2500, 4999, 5000]:
+                assert index.line_offset(f, number) == expected[number]
+            assert index.line_offset(f, 5001) == len(data)
+            for offset in [0, 5, expected[1], expected[1234] + 3, expected[5000] - 1, expected[5000], len(data)]:
+                assert index.line_number(f, offset) == sum(start <= offset for start in expected[1:])
+
+
+def test_line_index_persistence(log_file, tmp_path):
+    """Test that the index is saved, extended when lines are appended and rebuilt when the file is rewritten."""
+    index_dir = tmp_path / "index"
+    with open(log_file, "rb") as f:
+        index = LineIndex(tmp_path / "lines", None)
+        index.update(f, until_line=100, block_size=1000)
+        assert 100 < index.lines < 5000
+        index.update(f, until_line=50, block_size=1000)
+        assert 100 < index.lines < 5000
+
+        index = open_line_index(log_file, f, index_dir)
+        index = open_line_index(log_file, f, index_dir)
+    assert index.lines == 5000
+    assert line_number(log_file, log_file.stat().st_size, index_dir) == 5000
+
+    with open(log_file, "ab") as f:
+        f.write(b"\nmore\n")
+    with open(log_file, "rb") as f:
+        index = LineIndex.load(next(index_dir.iterdir()), f)
+        assert index.lines == 5000 and index.changed
+        index.update(f)
+    assert index.lines == 5002
+
+    log_file.write_bytes(b"a\nb\n")
+    with open(log_file, "rb") as f:
+        assert open_line_index(log_file, f, index_dir).lines == 2
+    assert line_number(log_file, 2, index_dir) == 1
+
+
+@pytest.mark.parametrize("data", [b"", b"a", b"a\n", b"a\nb", b"a\nb\n", b"\n\n\n", b"x\n" * 10000])
+def test_tail_offset(tmp_path, data):
+    path = tmp_path / "app.log"
+    path.write_bytes(data)
+    lines = data.splitlines(keepends=True)
+    with open(path, "rb") as f:
+        for count in [0, 1, 2, 3, 9999, 20000]:
+            assert data[tail_offset(f, count) :] == b"".join(lines[max(0, len(lines) - count) :] if count else [])
+
+
+def test_write_range(log_file):
+    data = log_file.read_bytes()
+    with open(log_file, "rb") as f:
+        output = io.BytesIO()
+        write_range(f, output, 8, len(data))
+        assert output.getvalue() == data[8:]
+
+        output = io.BytesIO()
+        write_range(f, output, 0, len(data), first_line=1)
+        assert output.getvalue() == b"".join(b"%d:%s" % (i + 1, line) for i, line in enumerate(data.splitlines(keepends=True)))
+
+
+def test_number_lines():
+    assert number_lines(b"a\nb\n", 9) == b"9:a\n10:b\n"
+    assert number_lines(b"a\n\nb", 1, b"-") == b"1-a\n2-\n3-b"
+    assert number_lines(b"", 1) == b""
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+from ai_cli.commands.log.mapped import filter_mapped, raw_anchor
+from ai_cli.commands.log.matcher import ALL, ANY
+
+SAMPLES = [
+    b"GET /api/users 200 id=12\nPOST /API/users 500 id=13\nGET /api/orders 500 id=12\n",
+    b"windows /api/x 500\r\nline two\r\nERROR /api/y 500",
+    "café /api/z 500 Kelvin\n/api/k 500\n".encode(),
+    b"\n\n/api/a 500\n\n",
+]
+
+
+def block_filter(data, line_filter):
+    return b"".join(line_filter(block) for block in iter_blocks(io.BytesIO(data)))
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize("substrings", [("/api/", "500"), ("id=12",), ("users",), ("k", " 500")])
+@pytest.mark.parametrize("mode", [ALL, ANY])
+@pytest.mark.parametrize("window", [1, 16, 4096])
+def test_mapped_matches_block_engine(tmp_path, data, substrings, mode, window):
+    """The memory-mapped scan selects exactly the lines the block engine selects."""
+    path = tmp_path / "app.log"
+    path.write_bytes(data)
+    line_filter = LineFilter(substrings, mode)
+
+    output = io.BytesIO()
+    filter_mapped(path, output, line_filter, window=window)
+
+    assert output.getvalue() == block_filter(data, LineFilter(substrings, mode))
+
+
+def test_mapped_range(tmp_path):
+    """Only lines inside the requested byte range are scanned."""
+    path = tmp_path / "app.log"
+    path.write_bytes(b"a 500\nb 500\nc 500\n")
+    output = io.BytesIO()
+
+    filter_mapped(path, output, LineFilter(["500"]), start=6, end=12)
+
+    assert output.getvalue() == b"b 500\n"
+
+
+def test_raw_anchor_uses_case_free_fragments():
+    """Only fragments without letters, line breaks or non-ASCII bytes are raw anchors."""
+    assert raw_anchor(LineFilter(["status=500", "GET"])) == b"=500"
+    assert raw_anchor(LineFilter(["error"])) is None
+    assert raw_anchor(LineFilter(["/api/", "500"], ANY)) is None
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from ai_cli.commands.log.matcher import ALL, ANY, Matcher, compile_needles
+
+
+def test_hits_report_overlapping_needles():
+    """Needles overlapping or nested in one another are all reported."""
+    matcher = Matcher([b"err", b"error", b"ror", b"or c", b"missing"])
+    found = {matcher.needles[i] for i in matcher.hits(b"an error code")}
+    assert found == {b"err", b"error", b"ror", b"or c"}
+
+
+def test_trie_pattern_prefers_longest_needle():
+    """At a given position the compiled pattern picks the longest needle."""
+    pattern = compile_needles([b"err", b"error", b"errno"])
+    assert pattern.match(b"errors").group() == b"error"
+    assert pattern.match(b"errno").group() == b"errno"
+    assert pattern.match(b"erratum").group() == b"err"
+
+
+@pytest.mark.parametrize("mode", [ALL, ANY])
+@pytest.mark.parametrize("count", [1, 3, 20, 200])
+def test_matches_agree_with_naive_loop(mode, count):
+    """The automaton gives the same verdict as N separate ``in`` checks."""
+    rng = random.Random(count)
+    alphabet = b"abcde"
+    needles = {bytes(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(count)}
+    matcher = Matcher(needles, mode)
+    test = any if mode == ANY else all
+
+    for _ in range(500):
+        line = bytes(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert matcher.matches(line) == test(needle in line for needle in needles)
+        assert {matcher.needles[i] for i in matcher.hits(line)} == {needle for needle in needles if needle in line}
+
+
+@pytest.mark.parametrize("mode", [ALL, ANY])
+def test_scan_returns_matching_lines(mode):
+    """Scanning a block only returns whole matching lines, in order."""
+    block = b"Alpha beta\ngamma\nBETA alpha gamma\nbeta"
+    matcher = Matcher([b"alpha", b"beta"], mode)
+    expected = [b"Alpha beta\n", b"BETA alpha gamma\n"] if mode == ALL else [b"Alpha beta\n", b"BETA alpha gamma\n", b"beta"]
+    assert matcher.scan(block.lower(), block) == expected
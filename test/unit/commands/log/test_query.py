@@ -0,0 +1,154 @@
+import io
+import json
+import re
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.index import filter_indexed
+from ai_cli.commands.log.mapped import filter_mapped
+from ai_cli.commands.log.matcher import ANY
+from ai_cli.commands.log.query import And, Line, Literal, Not, Or, QuerySyntaxError, Regex, compile_query, parse_query, regex_requirements
+
+LINES = [
+    "2025-04-20 10:00:01,120 ERROR [db] connection timeout id=17 user=alice\n",
+    "2025-04-20 10:15:42,003 INFO [http] request completed status=200 latency=12.5\n",
+    '2025-04-20 10:30:00,000 WARNING [auth] token expired user="bob smith"\n',
+    "2025-04-20T10:45:10.5 ERROR [http] request failed status=503 latency=340\n",
+    '{"time": "2025-04-20T11:00:00Z", "level": "error", "msg": "db timeout", "ctx": {"user": "carol", "attempt": 3}}\n',
+    '{"time": "2025-04-20T11:05:00Z", "level": "info", "msg": "retry ok", "ctx": {"user": "alice", "attempt": 4}}\n',
+    "no timestamp here, just an error without fields\n",
+    "Ünïcode ERROR line with ß\n",
+]
+DATA = "".join(LINES).encode()
+
+
+def naive(query):
+    node = parse_query(query)
+    return b"".join(line for line in DATA.splitlines(keepends=True) if node.matches(Line(line)))
+
+
+def test_parse_precedence():
+    node = parse_query("a b OR NOT c")
+    assert isinstance(node, Or)
+    assert isinstance(node.children[0], And)
+    assert isinstance(node.children[1], Not)
+
+
+def test_parse_terms():
+    assert isinstance(parse_query('"a b"'), Literal)
+    assert parse_query('"a b"').text == "a b"
+    assert isinstance(parse_query(r"/a\/b/i"), Regex)
+    assert isinstance(parse_query("user!=bob"), Not)
+
+
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ("", "Empty query"),
+        ("(error", "Missing ')'"),
+        ("error)", "Unexpected ')'"),
+        ("error AND", "Unexpected end of query"),
+        ('"error', "Unterminated string"),
+        ("/err", "Unterminated regex"),
+        ("/err/x", "Unknown regex flag 'x'"),
+        ("/(/", "Invalid regex"),
+        ("@host=a", "Unknown field @host"),
+        ("@time>=tomorrow", "@time"),
+        ("latency>fast", "number"),
+    ],
+)
+def test_parse_errors(query, message):
+    with pytest.raises(QuerySyntaxError, match=re.escape(message)):
+        parse_query(query)
+
+
+@pytest.mark.parametrize(
+    "pattern, flags, required",
+    [
+        (r"connection timeout", 0, [{"connection timeout"}]),
+        (r"foo\d+bar", 0, [{"foo"}, {"bar"}]),
+        (r"(error|fail)ed", 0, [{"error", "fail"}, {"ed"}]),
+        (r"(error|x)", 0, []),
+        (r"a?bc", 0, [{"bc"}]),
+        (r"Timeout", re.IGNORECASE, [{"meout"}]),  # "i" also matches the dotless and dotted variants
+        (r"ki", re.IGNORECASE, []),
+        (r"Ünï", 0, []),
+    ],
+)
+def test_regex_requirements(pattern, flags, required):
+    assert regex_requirements(pattern, flags) == [frozenset(requirement) for requirement in required]
+
+
+@pytest.mark.parametrize(
+    "query, count",
+    [
+        ("error timeout", 2),
+        ("error NOT timeout", 3),
+        ("(warning OR info) [auth]", 1),
+        ("/time\\w+ id=\\d+/", 1),
+        ("/REQUEST (completed|failed)/i", 2),
+        ("status>=500", 1),
+        ("latency<100", 1),
+        ("latency>=12.5 latency<=340", 2),
+        ("user=alice", 1),
+        ('user="bob smith"', 1),
+        ("user!=alice", 7),
+        ("ctx.user=alice", 1),
+        ("ctx.attempt>3", 1),
+        ("level=error", 1),
+        ("msg~^db", 1),
+        ("@time>=2025-04-20T10:15 @time<2025-04-20T11:00", 3),
+        ("@time=2025-04-20T11", 2),
+        ("@time>=2025-04-20 error", 3),
+        ("NOT @time>=2000", 2),
+        ("ß", 1),
+        ("NOT error", 3),
+    ],
+)
+def test_plan_matches_naive_evaluation(query, count):
+    plan = compile_query(query)
+    matched = plan(DATA)
+    assert matched == naive(query)
+    assert matched.count(b"\n") == count
+    assert [line for line in DATA.splitlines(keepends=True) if plan.line_matches(line)] == matched.splitlines(keepends=True)
+
+
+def test_plan_prefilters_literals():
+    plan = compile_query("(error OR warning) /conn\\w+ timeout/ status>=500")
+    assert [(prefilter.mode, prefilter.substrings) for prefilter in plan.prefilters] == [
+        ("all", [" timeout", "conn", "status"]),
+        (ANY, ["error", "warning"]),
+    ]
+    assert compile_query("error timeout").residual is None
+
+
+def test_plan_combines_substrings():
+    assert compile_query("[db]", ["timeout", "error"])(DATA) == LineFilter(["[db]", "timeout", "error"])(DATA)
+    assert compile_query("[db]", ["timeout", "retry"], ANY)(DATA) == naive("[db] (timeout OR retry)")
+
+
+def test_plan_undecodable_input():
+    with pytest.raises(UnicodeDecodeError):
+        compile_query("NOT error")(b"\xff\xfe error\n\xff\n")
+
+
+def test_json_field_with_escapes():
+    line = json.dumps({"msg": 'say "hi"', "n": 1}).encode() + b"\n"
+    assert compile_query('msg="say \\"hi\\""')(line) == line
+
+
+@pytest.mark.parametrize("query", ["error /time\\w+/", "status>=500", "NOT error", "@time<2025-04-20T10:31"])
+def test_plan_with_index_and_mmap(query, tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(DATA * 2000)
+    expected = compile_query(query)(path.read_bytes())
+
+    for _ in range(2):
+        output = io.BytesIO()
+        filter_indexed(path, output, compile_query(query), index_dir=tmp_path / "index", block_size=4096)
+        assert output.getvalue() == expected
+
+    output = io.BytesIO()
+    filter_mapped(path, output, compile_query(query), window=4096)
+    assert output.getvalue() == expected
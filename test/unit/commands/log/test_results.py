@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+from ai_cli.commands.log.results import evict, filter_cached
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(f"10:00:{i % 60:02d} {'ERROR' if i % 7 == 0 else 'INFO'} request {i}\r\n".encode() for i in range(2000)) + b"ERROR par")
+    return path
+
+
+def append(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def plain_filter(path, line_filter):
+    with open(path, "rb") as f:
+        return b"".join(line_filter(block) for block in iter_blocks(f, 1000))
+
+
+async def run_cached(path, substrings, tmp_path, scans, mode="all", max_size=1 << 30, case_sensitive=False):
+    line_filter = LineFilter(substrings, mode, case_sensitive=case_sensitive)
+
+    async def scan(output_file):
+        scans.append(substrings)
+        output_file.write(plain_filter(path, line_filter))
+
+    output = tmp_path / "out.log"
+    with await asyncio.to_thread(open, output, "wb") as output_file:
+        await filter_cached(path, output_file, line_filter, substrings, scan, cache_dir=tmp_path / "results", max_size=max_size, case_sensitive=case_sensitive)
+    return output.read_bytes()
+
+
+async def test_second_run_is_served_from_cache(log_file, tmp_path):
+    scans = []
+    expected = plain_filter(log_file, LineFilter(["error"]))
+
+    assert await run_cached(log_file, ["error"], tmp_path, scans) == expected
+    assert await run_cached(log_file, ["ERROR", "error"], tmp_path, scans) == expected
+    assert scans == [["error"]]
+
+
+async def test_queries_are_cached_separately(log_file, tmp_path):
+    scans = []
+    await run_cached(log_file, ["error"], tmp_path, scans)
+    await run_cached(log_file, ["error", "request 7"], tmp_path, scans)
+    await run_cached(log_file, ["error", "request 7"], tmp_path, scans, mode="any")
+    assert await run_cached(log_file, ["ERROR"], tmp_path, scans, case_sensitive=True) == plain_filter(log_file, LineFilter(["error"]))
+    assert await run_cached(log_file, ["error"], tmp_path, scans, case_sensitive=True) == b""
+
+    assert len(scans) == 5
+
+
+async def test_appended_lines_extend_cached_result(log_file, tmp_path):
+    """Only the appended lines are scanned, and the unterminated last line is filtered again."""
+    scans = []
+    await run_cached(log_file, ["error"], tmp_path, scans)
+    append(log_file, b"tial\nINFO fine\nERROR new\n")
+
+    output = await run_cached(log_file, ["error"], tmp_path, scans)
+
+    assert output == plain_filter(log_file, LineFilter(["error"]))
+    assert output.endswith(b"ERROR partial\nERROR new\n")
+    assert len(scans) == 1
+    assert await run_cached(log_file, ["error"], tmp_path, scans) == output
+    assert len(scans) == 1
+
+
+async def test_append_after_lone_carriage_return_rescans(tmp_path):
+    path = tmp_path / "mac.log"
+    path.write_bytes(b"ERROR one\rERROR two\r")
+    scans = []
+    await run_cached(path, ["error"], tmp_path, scans)
+    append(path, b"\nERROR three\n")
+
+    assert await run_cached(path, ["error"], tmp_path, scans) == b"ERROR one\nERROR two\nERROR three\n"
+    assert len(scans) == 2
+
+
+@pytest.mark.parametrize("change", ["rewrite", "replace", "truncate"])
+async def test_changed_file_is_scanned_again(log_file, tmp_path, change):
+    scans = []
+    await run_cached(log_file, ["error"], tmp_path, scans)
+    data = log_file.read_bytes()
+    stat = log_file.stat()
+
+    if change == "rewrite":
+        log_file.write_bytes(data.replace(b"ERROR", b"error", 1))
+        os.utime(log_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    elif change == "replace":
+        log_file.with_suffix(".new").write_bytes(data)
+        log_file.with_suffix(".new").replace(log_file)
+    else:
+        log_file.write_bytes(data[:5000])
+
+    assert await run_cached(log_file, ["error"], tmp_path, scans) == plain_filter(log_file, LineFilter(["error"]))
+    assert len(scans) == 2
+
+
+async def test_least_recently_used_results_are_evicted(log_file, tmp_path):
+    scans = []
+    kept_size = len(plain_filter(log_file, LineFilter(["error"]))) + len(plain_filter(log_file, LineFilter(["info"])))
+    for substrings in (["error"], ["request"], ["error"]):  # The second "error" run refreshes its result
+        await run_cached(log_file, substrings, tmp_path, scans)
+        await asyncio.sleep(0.02)  # Let file timestamps tell the runs apart
+    await run_cached(log_file, ["info"], tmp_path, scans, max_size=kept_size)
+
+    await run_cached(log_file, ["error"], tmp_path, scans)
+    await run_cached(log_file, ["request"], tmp_path, scans)
+
+    assert scans == [["error"], ["request"], ["info"], ["request"]]
+
+
+def test_evict_keeps_the_current_result(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.json").write_text("{}")
+        (tmp_path / f"{name}.out").write_bytes(b"x" * 100)
+
+    evict(tmp_path, 10, keep="b")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b.json", "b.out"]
@@ -0,0 +1,114 @@
+import gzip
+import os
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.matcher import ALL, ANY
+from ai_cli.commands.log.session import OpenedLog, Query
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [f"{'ERROR' if i % 5 == 0 else 'INFO'} db={'main' if i % 3 else 'replica'} request {i:05d}" for i in range(20000)]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture
+def opened(log_file, tmp_path):
+    log = OpenedLog(log_file, index_dir=tmp_path / "index")
+    yield log
+    log.close()
+
+
+def expected(path, substrings, mode=ALL):
+    return LineFilter(substrings, mode)(path.read_bytes())
+
+
+@pytest.mark.parametrize(
+    "query, other, narrows",
+    [
+        (Query(["error", "db"]), Query(["error"]), True),
+        (Query(["error"]), Query(["error", "db"]), False),
+        (Query.of(["error"], ANY), Query.of(["error", "warn"], ANY), True),
+        (Query.of(["error", "warn"], ANY), Query.of(["error"], ANY), False),
+        (Query(["ERROR", "db"]), Query.of(["error", "warn"], ANY), True),
+        (Query(["db"]), Query.of(["error", "warn"], ANY), False),
+        (Query(["error"]).refine(["a", "b"], ANY), Query(["error"]), True),
+        (Query(["error"]).refine(["a"], ANY), Query(["error"]).refine(["a", "b"], ANY), True),
+    ],
+)
+def test_query_narrows(query, other, narrows):
+    assert query.narrows(other) is narrows
+
+
+def test_filter_whole_file_then_narrower_queries(opened, log_file):
+    """A query adding a substring only scans the result of the query it narrows."""
+    result = opened.filter(Query(["error"]))
+    assert result.lines == expected(log_file, ["error"])
+    assert result.searched is None
+
+    narrowed = opened.filter(Query(["error", "replica"]))
+    assert narrowed.lines == expected(log_file, ["error", "replica"])
+    assert narrowed.searched == Query(["error"])
+
+    assert opened.filter(Query(["replica", "ERROR"])) is narrowed
+
+
+def test_refine_within_result(opened, log_file):
+    result = opened.filter(Query.of(["replica", "00042"], ANY))
+    refined = opened.filter(result.query.refine(["error"]), within=result)
+
+    assert refined.searched == result.query
+    assert refined.lines == LineFilter(["error"])(expected(log_file, ["replica", "00042"], ANY))
+
+
+def test_appended_lines_drop_results(opened, log_file):
+    opened.filter(Query(["error"]))
+    with open(log_file, "a") as f:
+        f.write("ERROR appended line\n")
+
+    result = opened.filter(Query(["error", "appended"]))
+
+    assert result.searched is None
+    assert result.lines == b"ERROR appended line\n"
+    assert opened.index.end == os.path.getsize(log_file)
+
+
+def test_replaced_file_is_reopened(opened, log_file, tmp_path):
+    opened.filter(Query(["error"]))
+    replacement = tmp_path / "new.log"
+    replacement.write_text("ERROR fresh\n")
+    os.replace(replacement, log_file)
+
+    assert opened.filter(Query(["error"])).lines == b"ERROR fresh\n"
+
+
+def test_compressed_file_is_decompressed_to_disk(log_file, tmp_path):
+    """A compressed log is decompressed to a temporary file, indexed, and reread when it is replaced."""
+    compressed = tmp_path / "app.log.gz"
+    compressed.write_bytes(gzip.compress(log_file.read_bytes()))
+    log = OpenedLog(compressed, index_dir=tmp_path / "index")
+    decompressed_dir = log.decompressed_dir.name
+
+    assert log.filter(Query(["error", "replica"])).lines == expected(log_file, ["error", "replica"])
+    assert log.index.end == log_file.stat().st_size
+    assert log.filter(Query(["error"])).lines == expected(log_file, ["error"])
+    assert log.decompressed_dir.name == decompressed_dir
+    assert not (tmp_path / "index").exists()
+
+    compressed.write_bytes(gzip.compress(b"ERROR fresh\n"))
+    assert log.filter(Query(["error"])).lines == b"ERROR fresh\n"
+    log.close()
+    assert not os.path.exists(decompressed_dir)
+
+
+def test_kept_results_fit_in_size_limit(log_file, tmp_path):
+    log = OpenedLog(log_file, index_dir=tmp_path / "index", max_results_size=len(expected(log_file, ["error"])) + 1)
+    log.filter(Query(["error"]))
+    log.filter(Query(["info"]))
+
+    assert list(log.results) == [Query(["info"])]
+    log.close()
@@ -0,0 +1,73 @@
+import io
+from itertools import pairwise
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter, iter_blocks
+from ai_cli.commands.log.shards import filter_sharded, shard_ranges
+
+
+@pytest.fixture
+def crlf_log(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [f"2025-04-20 10:00:{i % 60:02d} {'ERROR' if i % 7 == 0 else 'INFO'} request {i}" for i in range(500)]
+    path.write_bytes("\r\n".join(lines).encode() + b"\n\rtail ERROR without newline")
+    return path
+
+
+@pytest.fixture
+def output_file(tmp_path):
+    """``out.log`` in ``tmp_path``, opened outside the coroutines filtering into it."""
+    with open(tmp_path / "out.log", "wb") as f:
+        yield f
+
+
+@pytest.mark.parametrize("jobs", [1, 2, 3, 8, 64])
+def test_shard_ranges_align_to_newlines(crlf_log, jobs):
+    """Ranges cover the whole file and every range after the first starts a line."""
+    data = crlf_log.read_bytes()
+    ranges = shard_ranges(crlf_log, jobs, min_size=1)
+
+    assert 1 <= len(ranges) <= jobs
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in pairwise(ranges))
+    assert all(data[start - 1 : start] == b"\n" for start, _ in ranges[1:])
+
+
+def test_shard_ranges_keep_small_files_whole(crlf_log):
+    """Files smaller than the minimum shard size are not split."""
+    assert shard_ranges(crlf_log, 8) == [(0, crlf_log.stat().st_size)]
+
+
+def test_shard_ranges_within_byte_range(crlf_log):
+    data = crlf_log.read_bytes()
+    start = data.index(b"\n", len(data) // 3) + 1
+    end = data.index(b"\n", 2 * len(data) // 3) + 1
+    ranges = shard_ranges(crlf_log, 4, min_size=1, start=start, end=end)
+
+    assert ranges[0][0] == start and ranges[-1][1] == end
+    assert all(data[range_start - 1 : range_start] == b"\n" for range_start, _ in ranges)
+
+
+@pytest.mark.parametrize("jobs", [2, 5])
+@pytest.mark.parametrize("mapped", [False, True])
+async def test_filter_sharded_matches_single_process(crlf_log, tmp_path, jobs, mapped, output_file):
+    """Merged shard output is identical to filtering the file in one pass."""
+    line_filter = LineFilter(["error"])
+    expected = b"".join(line_filter(block) for block in iter_blocks(io.BytesIO(crlf_log.read_bytes())))
+
+    await filter_sharded(crlf_log, output_file, line_filter, jobs, mapped, tmp_path, min_shard_size=1)
+    output_file.close()
+
+    output = tmp_path / "out.log"
+    assert output.read_bytes() == expected
+    assert sorted(tmp_path.iterdir()) == sorted([crlf_log, output])
+
+
+async def test_filter_sharded_raises_on_undecodable_input(tmp_path, output_file):
+    """Decoding errors in a worker reach the caller."""
+    path = tmp_path / "binary.dat"
+    path.write_bytes(b"ok line\n" * 100 + b"\xff\xfe\n" + b"ok line\n" * 100)
+
+    with pytest.raises(UnicodeDecodeError):
+        await filter_sharded(path, output_file, LineFilter(["ok"]), 4, min_shard_size=1)
@@ -0,0 +1,59 @@
+import gzip
+
+import pytest
+
+from ai_cli.commands.log.slicing import log_head, log_slice, log_tail
+from ai_cli.settings import settings
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"line %d\n" % i for i in range(1, 3001)))
+    return path
+
+
+def expected(first, last, numbered=False):
+    return "".join(f"{i}:line {i}\n" if numbered else f"line {i}\n" for i in range(first, last + 1))
+
+
+def test_head_and_tail(cli_runner, log_file):
+    result = cli_runner.invoke(log_head, [str(log_file)])
+    assert result.exit_code == 0, result.output
+    assert result.output == expected(1, 10)
+    assert cli_runner.invoke(log_head, [str(log_file), "-n", "5000", "-N"]).output == expected(1, 3000, numbered=True)
+    assert cli_runner.invoke(log_tail, [str(log_file), "-n", "3"]).output == expected(2998, 3000)
+    assert cli_runner.invoke(log_tail, [str(log_file), "-n", "3", "-N"]).output == expected(2998, 3000, numbered=True)
+    assert cli_runner.invoke(log_tail, [str(log_file), "-n", "0"]).output == ""
+
+
+def test_slice(cli_runner, log_file, tmp_path):
+    """Test that lines and byte offsets are sliced the same with a new, a saved and an extended line index."""
+    for _ in range(2):
+        result = cli_runner.invoke(log_slice, [str(log_file), "1500", "1502", "-N"])
+        assert result.exit_code == 0, result.output
+        assert result.output == expected(1500, 1502, numbered=True)
+    assert list((tmp_path / "cache" / "index").glob("*.lines"))
+
+    assert cli_runner.invoke(log_slice, [str(log_file), "2999"]).output == expected(2999, 3000)
+    assert cli_runner.invoke(log_slice, [str(log_file), "4000"]).output == ""
+    with open(log_file, "ab") as f:
+        f.write(b"line 3001\nline 3002")
+    assert cli_runner.invoke(log_slice, [str(log_file), "3000", "-N"]).output == expected(3000, 3001, numbered=True) + "3002:line 3002"
+
+    data = log_file.read_bytes()
+    start = data.index(b"line 100\n") + 2
+    end = data.index(b"line 102\n")
+    assert cli_runner.invoke(log_slice, [str(log_file), str(start), str(end), "--bytes", "-N"]).output == expected(100, 102, numbered=True)
+
+
+def test_slice_errors(cli_runner, log_file, tmp_path):
+    assert cli_runner.invoke(log_slice, [str(log_file), "0"]).exit_code == 2
+    assert cli_runner.invoke(log_slice, [str(log_file), "5", "4"]).exit_code == 2
+
+    compressed = tmp_path / "app.log.gz"
+    compressed.write_bytes(gzip.compress(log_file.read_bytes()))
+    result = cli_runner.invoke(log_head, [str(compressed)])
+    assert result.exit_code == 2
+    assert "compressed" in result.output
@@ -0,0 +1,152 @@
+from collections import Counter
+import gzip
+import json
+import pickle
+import random
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.summarize import log_summarize
+from ai_cli.commands.log.summary import SpaceSaving, Summary, mask, summarize_blocks
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    lines = []
+    for i in range(3000):
+        minute = i // 1000
+        lines.append(b"2025-04-20T10:%02d:%02d INFO user %d logged in from 10.0.%d.%d\n" % (minute, i % 60, i, i % 256, i % 7))
+        if i % 3 == 0:
+            lines.append(b"2025-04-20 10:%02d:00,%03d ERROR job 0x%x failed after %d.%dms\n" % (minute, i % 1000, i, i, i % 10))
+        if i % 1000 == 0:
+            lines.append(b"Traceback (most recent call last):\n")
+    path.write_bytes(b"".join(lines))
+    return path
+
+
+def test_mask():
+    assert mask("2025-04-20T10:00:01 job 123e4567-e89b-12d3-a456-426614174000 on 10.0.0.1:8080 took 1,234.5ms") == "<TIME> job <UUID> on <IP> took <NUM>ms"
+    assert mask("key=deadbeef01 ptr=0x7f, addr fe80::1 v2 %d") == "key=<HEX> ptr=<HEX>, addr <IP> v<NUM> %d"
+    assert mask("no variables here\n") == "no variables here\n"
+
+
+def test_space_saving():
+    """Test that counts are exact within capacity, and that heavy hitters keep their counters beyond it."""
+    sketch = SpaceSaving(10)
+    for i in range(5):
+        sketch.add(f"key {i}", i + 1, "10:00", f"10:0{i}")
+    assert sketch.top(2) == [("key 4", 5, 0, "10:00", "10:04"), ("key 3", 4, 0, "10:00", "10:03")]
+
+    sketch = SpaceSaving(10)
+    for i in range(10000):
+        sketch.add("heavy" if i % 4 == 0 else "warm" if i % 10 == 1 else f"rare {i}")
+    (heavy, count, error, _, _), (warm, warm_count, _, _, _) = sketch.top(2)
+    assert (heavy, warm) == ("heavy", "warm")
+    assert count - error <= 2500 <= count and warm_count >= 1000
+    assert len(sketch.counters) == 10
+
+    other = SpaceSaving(10)
+    other.add("heavy", 100, "09:00", "09:30")
+    sketch.merge(other)
+    assert sketch.top(1)[0][1:] == (count + 100, error, "09:00", "09:30")
+    assert len(sketch.counters) == 10
+
+
+def test_space_saving_merge_keeps_upper_bound():
+    """Test that merging a key counted on both sides, with an error on one, never understates it."""
+    a = SpaceSaving(10)
+    a.add("x")
+    b = SpaceSaving(1)
+    b.add("y")
+    b.add("x")
+    assert b.top(1) == [("x", 2, 1, None, None)]
+
+    a.merge(b)
+    assert a.top(1) == [("x", 3, 1, None, None)]
+    a.merge(b)
+    assert a.top(1) == [("x", 5, 2, None, None)]
+
+
+def test_space_saving_merge_bounds_counts():
+    """Test that merging parts, some of which dropped a key, keeps every count an upper bound and count - error a lower one."""
+    a = SpaceSaving(10)
+    for key in ["hot"] * 3 + [f"rare {i}" for i in range(20000)]:
+        a.add(key)
+    assert "hot" not in a.counters
+    b = SpaceSaving(10)
+    b.add("hot", 100)
+    b.merge(a)
+    (key, count, error, _, _), *_ = b.top(1)
+    assert key == "hot" and count >= 103 and error > 0
+
+    rng = random.Random(0)
+    stream = [f"key {min(int(rng.paretovariate(1)), 200)}" for _ in range(20000)]
+    parts = [SpaceSaving(rng.randint(5, 20)) for _ in range(8)]
+    for key in stream:
+        rng.choice(parts).add(key)
+    merged = SpaceSaving(10)
+    for part in parts:
+        merged.merge(part)
+    true = Counter(stream)
+    assert len(merged.counters) == 10
+    for key, (count, error, _, _) in merged.counters.items():
+        assert count - error <= true[key] <= count
+    assert {key for key, *_ in merged.top(3)} == {key for key, _ in true.most_common(3)}
+
+
+def test_summary(log_file):
+    """Test that blocks split anywhere add up to the same templates and minutes, and that summaries merge and pickle."""
+    data = log_file.read_bytes()
+    line_filter = LineFilter([])
+    whole = summarize_blocks([data], line_filter, 100)
+    lines = data.splitlines(keepends=True)
+    halves = [summarize_blocks([b"".join(lines[i::2])], line_filter, 100) for i in range(2)]
+    merged = Summary(100)
+    for half in halves:
+        merged.merge(pickle.loads(pickle.dumps(half)))
+
+    for summary in [whole, merged]:
+        assert summary.lines == 4003 and summary.unstamped == 3
+        assert summary.minutes == {"2025-04-20T10:00": 1334, "2025-04-20T10:01": 1333, "2025-04-20T10:02": 1333}
+        assert [row[:3] for row in summary.templates.top(3)] == [
+            ("<TIME> INFO user <NUM> logged in from <IP>", 3000, 0),
+            ("<TIME> ERROR job <HEX> failed after <NUM>ms", 1000, 0),
+            ("Traceback (most recent call last):", 3, 0),
+        ]
+
+    clf = summarize_blocks([b'1.2.3.4 - - [20/Apr/2025:10:00:01 +0000] "GET /a HTTP/1.1" 200 5\n'], line_filter, 100)
+    assert clf.minutes == {"2025-04-20T10:00": 1}
+
+
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_summarize_command(cli_runner, log_file, tmp_path, jobs):
+    result = cli_runner.invoke(log_summarize, [str(log_file), "-k", "2", "-j", jobs])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0] == "4,003 lines, 3 without a timestamp, from 2025-04-20T10:00 to 2025-04-20T10:02"
+    assert lines[3].split() == ["3,000", "74.9%", "2025-04-20T10:00", "2025-04-20T10:02", "<TIME>", "INFO", "user", "<NUM>", "logged", "in", "from", "<IP>"]
+    assert lines[-1].split() == ["2025-04-20T10:02", "1,333", "#" * 40]
+
+    compressed = tmp_path / "app.log.gz"
+    compressed.write_bytes(gzip.compress(log_file.read_bytes()))
+    result = cli_runner.invoke(log_summarize, [str(compressed), "error", "--json", "-j", jobs, "-i", str(log_file)])
+    assert result.exit_code == 0, result.output
+    summary = json.loads(result.output)
+    assert summary["lines"] == 2000 and summary["unstamped"] == 0
+    assert summary["templates"] == [{"template": "<TIME> ERROR job <HEX> failed after <NUM>ms", "count": 2000, "error": 0, "first": "2025-04-20T10:00", "last": "2025-04-20T10:02"}]
+    assert list(summary["minutes"]) == ["2025-04-20T10:00", "2025-04-20T10:01", "2025-04-20T10:02"]
+
+
+def test_summarize_failures(cli_runner, log_file, tmp_path):
+    broken = tmp_path / "broken.log.gz"
+    broken.write_bytes(gzip.compress(b"x\n" * 1000)[:30])
+    result = cli_runner.invoke(log_summarize, [str(log_file), "-i", str(broken), "--since", "2025-04-20T10:02", "--no-histogram"])
+    assert result.exit_code == 1
+    assert "broken.log.gz" in result.output
+    assert "1,333 lines, 0 without a timestamp, from 2025-04-20T10:02 to 2025-04-20T10:02" in result.output
+
+    result = cli_runner.invoke(log_summarize, ["-"], input=b"2025-04-20T10:00:00 a 1\n2025-04-20T10:00:05 a 2\n")
+    assert result.exit_code == 0, result.output
+    assert "2  100.0%  2025-04-20T10:00  2025-04-20T10:00  <TIME> a <NUM>" in result.output
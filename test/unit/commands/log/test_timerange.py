@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from ai_cli.commands.log.timerange import find_time, time_window
+
+
+@pytest.fixture
+def sorted_log(tmp_path):
+    """A time-ordered log with repeated timestamps and unstamped stack trace lines."""
+    rng = random.Random(0)
+    lines, second = [], 0
+    for i in range(30000):
+        second += rng.choice([0, 0, 1, 2])
+        lines.append(f"2025-04-20 {10 + second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d},{i % 1000:03d} INFO request {i}\n")
+        if i % 500 == 0:
+            lines += ["Traceback (most recent call last):\n", '  File "app.py", line 1\n']
+    path = tmp_path / "sorted.log"
+    path.write_text("".join(lines))
+    return path
+
+
+def expected_window(path, since, until):
+    """Offsets found by reading every line: unstamped lines go with the stamped line before them."""
+    start = end = None
+    pos = 0
+    for line in path.read_bytes().splitlines(keepends=True):
+        stamp = find_time(line.decode())
+        if stamp is not None:
+            if start is None and (not since or stamp >= since):
+                start = pos
+            if end is None and until and stamp >= until:
+                end = pos
+        pos += len(line)
+    start = pos if start is None else start
+    return start, max(start, pos if end is None else end)
+
+
+@pytest.mark.parametrize(
+    "since, until",
+    [
+        ("2025-04-20T10:30", "2025-04-20T10:45"),
+        ("2025-04-20T11:00:00.5", None),
+        (None, "2025-04-20T10:00:10"),
+        ("2025-04-20T09", "2025-04-20T10:00:00"),
+        ("2025-04-21", None),
+        ("2025-04-20T11", "2025-04-20T10"),
+        ("2025", "2026"),
+    ],
+)
+def test_time_window_matches_linear_scan(sorted_log, since, until):
+    assert time_window(sorted_log, since, until) == expected_window(sorted_log, since, until)
+
+
+def test_time_window_starts_on_stamped_lines(sorted_log):
+    data = sorted_log.read_bytes()
+    start, end = time_window(sorted_log, "2025-04-20T10:20", "2025-04-20T10:40")
+    assert data[start:end].startswith(b"2025-04-20 10:20")
+    assert data[end:].startswith(b"2025-04-20 10:40")
+
+
+def test_time_window_clf(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_text("".join(f'10.0.0.1 - - [20/Apr/2025:10:{minute:02d}:00 +0000] "GET / HTTP/1.1" 200 5\n' for minute in range(60)))
+    start, end = time_window(path, "2025-04-20T10:10", "2025-04-20T10:20")
+    assert path.read_bytes()[start:end].count(b"\n") == 10
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "no timestamps\nat all\n",
+        "2025-04-20 11:00:00 late\n2025-04-20 10:00:00 early\n",
+    ],
+)
+def test_time_window_needs_time_ordered_file(tmp_path, text):
+    path = tmp_path / "app.log"
+    path.write_text(text)
+    assert time_window(path, "2025-04-20T10:30") is None
+
+
+@pytest.mark.parametrize(
+    "line, stamp",
+    [
+        ("2025-04-20 10:00:01,123 INFO", "2025-04-20T10:00:01.123"),
+        ('{"time": "2025-04-20T10:00:01.5Z"}', "2025-04-20T10:00:01.5"),
+        ('1.2.3.4 - - [20/Apr/2025:10:00:01 +0000] "GET /?d=2024-01-01"', "2025-04-20T10:00:01"),
+        ("released 2025-04-20", "2025-04-20"),
+        ("no time", None),
+    ],
+)
+def test_find_time(line, stamp):
+    assert find_time(line) == stamp
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from ai_cli.commands.log.engine import LineFilter
+from ai_cli.commands.log.matcher import ALL, ANY
+
+# Skipped without NumPy, an optional dependency
+np = pytest.importorskip("numpy")
+vectorized = pytest.importorskip("ai_cli.commands.log.vectorized")
+
+SAMPLES = [
+    b"INFO start\nERROR boom\nerror again\nDEBUG x\n",
+    b"no trailing newline ERROR",
+    b"\n\n\nERROR\n\n",
+    b"errorerror\nerrerror\nrror\n",
+    "café ERROR Été\nplain error\nKelvin İstanbul\n".encode(),
+    b"",
+]
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize("substrings", [("error",), ("ERROR", "b"), ("été",), ("k",), ("error\n",), ("rr", "o"), ("errorerror",)])
+@pytest.mark.parametrize("mode", [ALL, ANY])
+@pytest.mark.parametrize("case_sensitive", [False, True])
+def test_vectorized_filter_matches_engine(data, substrings, mode, case_sensitive):
+    expected = LineFilter(substrings, mode, case_sensitive=case_sensitive)(data)
+    assert LineFilter(substrings, mode, case_sensitive=case_sensitive, vectorized=True)(data) == expected
+
+
+def test_vectorized_filter_large_blocks():
+    """Dense needles are gathered with a byte mask, sparse ones left to the find loop, with the same lines either way."""
+    rng = random.Random(0)
+    words = ["request", "timeout", "user", "deadlock", "retry"]
+    block = "".join(" ".join(rng.choice(words) for _ in range(rng.randint(0, 8))) + "\n" for _ in range(50000)).encode()
+    for substrings, mode in [(["user"], ALL), (["user", "retry"], ALL), (["deadlock", "zzz"], ANY), (["zzz"], ALL), (["timeout", "request"], ANY)]:
+        assert LineFilter(substrings, mode, vectorized=True)(block) == LineFilter(substrings, mode)(block)
+    assert isinstance(LineFilter(["user"], vectorized=True).matcher, vectorized.VectorMatcher)
+
+
+def test_occurrences_overlap():
+    data = np.frombuffer(b"aaaa ab aaa", np.uint8)
+    assert vectorized.occurrences(data, b"aa").tolist() == [0, 1, 2, 8, 9]
+    assert vectorized.occurrences(data, b"aaaaa").tolist() == []
+    assert vectorized.occurrences(data, b"b").tolist() == [6]
@@ -0,0 +1,83 @@
+import io
+import os
+import stat
+
+import pytest
+
+from ai_cli.commands.log import writer
+from ai_cli.commands.log.writer import QueuedWriter, atomic_output
+
+
+def test_queued_writer_order(tmp_path, monkeypatch):
+    """Test that blocks are written in order, gathered into few writev calls, through a file descriptor or a file object."""
+    calls = []
+    writev = os.writev
+
+    def counting_writev(fd, buffers):
+        calls.append(len(buffers))
+        # Short writes make the writer resume in the middle of a buffer
+        return os.write(fd, buffers[0][:3]) if len(calls) % 2 else writev(fd, buffers)
+
+    monkeypatch.setattr(writer.os, "writev", counting_writev)
+    blocks = [b"line %d\n" % i * (i % 5) for i in range(2000)]
+    path = tmp_path / "out.log"
+    with open(path, "wb") as f:
+        f.write(b"buffered\n")
+        with QueuedWriter(f, max_blocks=4) as output_file:
+            for block in blocks:
+                output_file.write(block)
+            output_file.write(memoryview(b"last\n"))
+    assert path.read_bytes() == b"buffered\n" + b"".join(blocks) + b"last\n"
+    assert len(calls) >= 2
+
+    buffer = io.BytesIO()
+    with QueuedWriter(buffer) as output_file:
+        for block in blocks:
+            assert output_file.offer(block) or output_file.write(block) == len(block)
+        output_file.flush()
+        assert buffer.getvalue() == b"".join(blocks)
+
+
+def test_queued_writer_error(tmp_path):
+    """Test that a failed write is raised by the next write or by close, and the writer still drains its queue."""
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    with open(write_fd, "wb") as f:
+        output_file = QueuedWriter(f, max_blocks=1)
+        with pytest.raises(BrokenPipeError):
+            for _ in range(100):
+                output_file.write(b"x\n")
+        with pytest.raises(BrokenPipeError):
+            output_file.close()
+
+    with QueuedWriter(io.BytesIO()) as output_file:
+        pass
+    assert output_file.thread is None
+
+
+def test_atomic_output(tmp_path, monkeypatch):
+    """Test that output appears whole or not at all, with the permissions open would give, without touching the process umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    monkeypatch.setattr(writer.os, "umask", lambda mask: pytest.fail("the umask is shared by every thread"))
+    path = tmp_path / "out.log"
+    with pytest.raises(RuntimeError), atomic_output(path) as f:
+        f.write(b"partial")
+        raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+    with atomic_output(path) as f:
+        f.write(b"first\n")
+        assert not path.exists()
+    assert path.read_bytes() == b"first\n"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~umask
+
+    path.chmod(0o600)
+    with pytest.raises(KeyboardInterrupt), atomic_output(path) as f:
+        f.write(b"second\n")
+        raise KeyboardInterrupt
+    with atomic_output(path) as f:
+        f.write(b"third\n")
+    assert path.read_bytes() == b"third\n"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert list(tmp_path.iterdir()) == [path]
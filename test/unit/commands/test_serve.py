@@ -0,0 +1,142 @@
+import os
+from pathlib import Path
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ai_cli import client as client_module
+from ai_cli.client import SOCKET_ENV, check_private_dir, connect
+
+
+def client(*args, input=None, cwd=None, env=None):
+    return subprocess.run([sys.executable, "-m", "ai_cli.client", *args], input=input, capture_output=True, cwd=cwd, env=env, timeout=30, check=False)
+
+
+@pytest.fixture
+def daemon_env(tmp_path):
+    return {**os.environ, SOCKET_ENV: str(tmp_path / "ai-cli.sock")}
+
+
+@pytest.fixture
+def daemon(daemon_env, tmp_path):
+    """Start ``ai-cli serve`` on a socket in ``tmp_path`` and stop it afterwards."""
+    process = subprocess.Popen([sys.executable, "-m", "ai_cli.main", "serve", "--max-requests", "2", "--grace", "0.5"], env=daemon_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    socket_path = Path(daemon_env[SOCKET_ENV])
+    deadline = time.monotonic() + 10
+    while not socket_path.exists():
+        assert process.poll() is None, process.stdout.read()
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    yield process
+    if process.poll() is None:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("one ERROR\ntwo info\nthree error\n")
+    return path
+
+
+def test_client_runs_command_on_daemon(daemon, daemon_env, log_file, tmp_path):
+    """Output goes to the client's stdout; relative paths resolve against the client's directory."""
+    result = client("log", "line-filter", "app.log", "error", "-o", "-", cwd=tmp_path, env=daemon_env)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == b"one ERROR\nthree error\n"
+
+    result = client("log", "line-filter", "app.log", "error", cwd=tmp_path, env=daemon_env)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "app-filtered.log").read_text() == "one ERROR\nthree error\n"
+
+
+def test_client_forwards_stdin_and_exit_code(daemon, daemon_env, tmp_path):
+    result = client("log", "line-filter", "-", "error", input=b"a error\nb\n", cwd=tmp_path, env=daemon_env)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == b"a error\n"
+
+    result = client("log", "line-filter", "missing.log", "error", cwd=tmp_path, env=daemon_env)
+    assert result.returncode == 2
+    assert b"does not exist" in result.stderr
+
+    result = client("serve", cwd=tmp_path, env=daemon_env)
+    assert result.returncode == 2
+
+
+def test_disconnected_client_cancels_request(daemon, daemon_env, log_file, tmp_path):
+    """A followed file holds a request slot until its client goes away."""
+    followers = [subprocess.Popen([sys.executable, "-m", "ai_cli.client", "log", "line-filter", str(log_file), "error", "-f", "-o", "-"], env=daemon_env, stdout=subprocess.PIPE) for _ in range(2)]
+    for follower in followers:
+        assert follower.stdout.readline() == b"one ERROR\n"
+        follower.kill()
+        follower.wait()
+
+    result = client("log", "line-filter", str(log_file), "two", "-o", "-", env=daemon_env)
+    assert result.stdout == b"two info\n"
+
+
+def test_graceful_shutdown(daemon, daemon_env, log_file):
+    """On SIGTERM running requests get the grace period, then are cancelled; the socket is removed."""
+    follower = subprocess.Popen([sys.executable, "-m", "ai_cli.client", "log", "line-filter", str(log_file), "error", "-f", "-o", "-"], env=daemon_env, stdout=subprocess.PIPE)
+    assert follower.stdout.readline() == b"one ERROR\n"
+
+    daemon.send_signal(signal.SIGTERM)
+
+    assert daemon.wait(timeout=10) == 0
+    assert follower.wait(timeout=10) == 130
+    assert not Path(daemon_env[SOCKET_ENV]).exists()
+    assert connect(daemon_env[SOCKET_ENV]) is None
+
+
+def test_client_runs_locally_without_daemon(daemon_env, log_file):
+    result = client("log", "line-filter", str(log_file), "two", "-o", "-", env=daemon_env)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == b"two info\n"
+
+
+def test_second_daemon_refuses_socket_in_use(daemon, daemon_env):
+    result = subprocess.run([sys.executable, "-m", "ai_cli.main", "serve"], env=daemon_env, capture_output=True, timeout=30, check=False)
+
+    assert result.returncode == 1
+    assert b"already listening" in result.stderr
+
+
+def test_client_refuses_socket_of_another_user(tmp_path, monkeypatch):
+    """The client's streams, arguments and directory only go to a daemon of the same user."""
+    path = tmp_path / "ai-cli.sock"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    listener.listen()
+    try:
+        sock = connect(str(path))
+        assert sock is not None
+        sock.close()
+        monkeypatch.setattr(client_module.os, "getuid", lambda: os.geteuid() + 1)
+        with pytest.raises(PermissionError):
+            connect(str(path))
+    finally:
+        listener.close()
+
+
+def test_private_socket_dir(tmp_path, monkeypatch):
+    private = tmp_path / "ai-cli-private"
+    monkeypatch.setattr(client_module, "private_dir", lambda: str(private))
+    assert connect(str(private / "ai-cli.sock")) is None
+
+    check_private_dir(private, create=True)
+    check_private_dir(private, create=True)
+    assert private.stat().st_mode & 0o777 == 0o700
+    private.chmod(0o755)
+    with pytest.raises(PermissionError):
+        connect(str(private / "ai-cli.sock"))
+    private.chmod(0o700)
+    (tmp_path / "link").symlink_to(private)
+    with pytest.raises(PermissionError):
+        check_private_dir(tmp_path / "link")
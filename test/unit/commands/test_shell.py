@@ -0,0 +1,36 @@
+from ai_cli.commands.shell import shell
+
+
+def run_shell(cli_runner, commands, *args):
+    return cli_runner.invoke(shell, list(args), input="\n".join(commands) + "\n")
+
+
+def test_shell_queries_and_refines(cli_runner, sample_log_path, tmp_path):
+    saved = tmp_path / "saved.log"
+    result = run_shell(cli_runner, ["line-filter error", "refine database", f"save {saved}", "back", "status", "exit", "line-filter never-run"], str(sample_log_path))
+
+    assert result.exit_code == 0, result.output
+    assert "4 matching lines for 'error', searched the whole file" in result.output
+    assert "matching lines for 'database' AND 'error', searched the result of 'error'" in result.output
+    assert saved.read_text().splitlines() == [line for line in sample_log_path.read_text().splitlines() if "error" in line.lower() and "database" in line.lower()]
+    assert "1. 4 lines for 'error'" in result.output
+    assert "never-run" not in result.output
+
+
+def test_shell_reports_errors_and_continues(cli_runner, sample_log_path):
+    result = run_shell(cli_runner, ["line-filter error", "refine", "bogus", 'refine "x', "back", "back", f"open {sample_log_path}", "show"])
+
+    assert result.exit_code == 0
+    assert "No log opened, run open FILE first" in result.output
+    assert "Missing argument" in result.output
+    assert "No such command 'bogus'" in result.output
+    assert "No closing quotation" in result.output
+    assert "No result to go back from" in result.output
+    assert "No result yet" in result.output
+
+
+def test_shell_limits_printed_lines(cli_runner, sample_log_path):
+    result = run_shell(cli_runner, ["line-filter error -n 1", "show -n 0"], str(sample_log_path))
+
+    assert "... 3 more lines, `show -n 0` prints them all" in result.output
+    assert result.output.lower().count("error") >= 5
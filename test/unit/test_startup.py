@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import pytest
+
+from ai_cli.asyn import async_click as click
+
+# Modules that only the commands actually run (or help rendering) may import
+HEAVY_MODULES = ["asyncio", "pydantic_settings", "rich_click.rich_help_rendering", "ai_cli.commands.log.line_filter"]
+
+
+def imported_modules(code):
+    """Return the modules imported by running ``code`` in a fresh interpreter, from ``-X importtime``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    return {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+
+
+@pytest.mark.parametrize("module", HEAVY_MODULES)
+def test_startup_skips_heavy_modules(module):
+    """Starting the CLI up to --version imports none of the heavy modules."""
+    modules = imported_modules("import sys; sys.argv = ['ai-cli', '--version']\nfrom ai_cli.main import main\ntry:\n    main()\nexcept SystemExit:\n    pass")
+
+    assert "ai_cli.main" in modules
+    assert module not in modules
+
+
+def test_lazy_command_is_imported_on_use():
+    @click.group(lazy_commands={"line-filter": "ai_cli.commands.log.line_filter:log_line_filter"})
+    def group():
+        pass
+
+    assert group.list_commands(None) == ["line-filter"]
+    command = group.get_command(None, "line-filter")
+    assert command.name == "line-filter"
+    assert group.get_command(None, "line-filter") is command
+    assert group.get_command(None, "missing") is None
+
+
+@pytest.mark.parametrize("module", ["ai_cli.commands.log.slicing", "ai_cli.commands.log.summarize"])
+def test_log_commands_skip_line_filter(module):
+    """Other log commands share helpers with line-filter without importing its query, cache and sharding stack."""
+    modules = imported_modules(f"import {module}")
+
+    assert module in modules
+    assert not {"ai_cli.commands.log.line_filter", "ai_cli.commands.log.query", "ai_cli.commands.log.results"} & modules
+
+
+def test_client_imports_no_cli_framework():
+    """The daemon client only needs the socket layer to forward a command."""
+    modules = imported_modules("import ai_cli.client")
+
+    assert "socket" in modules
+    assert not {"click", "rich_click", "asyncio"} & modules
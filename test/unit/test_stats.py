@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from ai_cli import stats
+from ai_cli.stats import Stats, instrumented
+
+
+def test_helpers_only_count_while_collecting():
+    block = b"a error\nb\nc error"
+    assert stats.match(lambda b: b"a error\n", block) == b"a error\n"
+
+    collected = Stats()
+    token = stats.current.set(collected)
+    try:
+        assert stats.match(lambda b: b"a error\nc error", block) == b"a error\nc error"
+        assert stats.read(lambda size: b"x" * size, 3) == b"xxx"
+    finally:
+        stats.current.reset(token)
+
+    assert collected.counts["lines_read"] == 3
+    assert collected.counts["lines_matched"] == 2
+    assert collected.counts["reads"] == 1
+    assert collected.counts["bytes_read"] == 3
+    assert collected.seconds["match"] > 0
+
+
+def test_instrumented_reports_on_failure(capsys):
+    def run():
+        stats.count(bytes_read=10, lines_read=2, lines_matched=1)
+        raise SystemExit(1)
+
+    with pytest.raises(SystemExit):
+        instrumented(run, "json", startup=0.25)
+
+    report = json.loads(capsys.readouterr().err)
+    assert report["bytes_read"] == 10
+    assert report["match_rate"] == 0.5
+    assert report["seconds"]["startup"] == 0.25
+    assert report["peak_rss_mb"] > 0
+    assert stats.current.get() is None